@@ -1,62 +1,467 @@
 import asyncio
-import threading
+import logging
+import os
+import re
+import socket
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set
 
+from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError, PyMongoError
 
+logger = logging.getLogger(__name__)
 
-# Company-specific locks to prevent concurrent processing
-COMPANY_LOCKS = {}
+# ====================== LEASE SETTINGS ======================
 
-# Thread-safe lock for creating company locks
-_LOCK_CREATION_LOCK = threading.Lock()
+# A replica that has not renewed its lease on a company for this long
+# (crashed, stuck or partitioned) loses it to the next replica asking
+COMPANY_LOCK_LEASE_SECONDS = int(os.getenv("COMPANY_LOCK_LEASE_SECONDS", "60"))
+# Leases are shared through Mongo when set, otherwise kept in this process
+COMPANY_LOCK_MONGO_URI = os.getenv("COMPANY_LOCK_MONGO_URI")
+COMPANY_LOCK_MONGO_DB = os.getenv("COMPANY_LOCK_MONGO_DB", "policy_extraction")
+# How often a blocking acquire retries a lease held by another replica
+COMPANY_LOCK_POLL_SECONDS = 1.0
+# Unheld locks idle for this long are dropped from the registry
+COMPANY_LOCK_IDLE_SECONDS = int(os.getenv("COMPANY_LOCK_IDLE_SECONDS", "300"))
+# Registry size above which the least recently used unheld locks are dropped
+COMPANY_LOCK_MAX_ENTRIES = int(os.getenv("COMPANY_LOCK_MAX_ENTRIES", "1024"))
 
-async def get_company_lock(company_id: str) -> asyncio.Lock:
+# Identifies this replica in lease documents
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+def _instance_of(owner: str) -> str:
+    """INSTANCE_ID part of a lease owner"""
+    return owner.rsplit(":", 1)[0]
+
+# ====================== LEASE STORES ======================
+
+# Stores let a claim take over an unexpired lease of the claimant's own
+# replica: the local lock already keeps a company to one holder per replica,
+# so such a lease is one whose release is still on its way
+
+class LocalLeaseStore:
+    """In-process lease store, the stand-in for Mongo in tests and single-replica runs"""
+
+    def __init__(self):
+        self._leases: Dict[str, dict] = {}
+
+    async def claim(self, company_id: str, owner: str, lease_seconds: int) -> bool:
+        now = time.time()
+        lease = self._leases.get(company_id)
+        if (
+            lease
+            and lease["expires_at"] > now
+            and _instance_of(lease["owner"]) != _instance_of(owner)
+        ):
+            return False
+        self._leases[company_id] = {
+            "owner": owner,
+            "expires_at": now + lease_seconds,
+            "heartbeat_at": now,
+        }
+        return True
+
+    async def renew(self, company_id: str, owner: str, lease_seconds: int) -> bool:
+        lease = self._leases.get(company_id)
+        if not lease or lease["owner"] != owner:
+            return False
+        now = time.time()
+        lease["expires_at"] = now + lease_seconds
+        lease["heartbeat_at"] = now
+        return True
+
+    async def release(self, company_id: str, owner: str):
+        lease = self._leases.get(company_id)
+        if lease and lease["owner"] == owner:
+            del self._leases[company_id]
+
+    async def holder(self, company_id: str) -> Optional[str]:
+        lease = self._leases.get(company_id)
+        if lease and lease["expires_at"] > time.time():
+            return lease["owner"]
+        return None
+
+class MongoLeaseStore:
+    """
+    Leases as documents of the company_locks collection:
+    {_id: company_id, owner, expires_at, heartbeat_at}.
+    pymongo blocks, so every call runs in a worker thread.
+    """
+
+    def __init__(self, uri: str, database: str):
+        self._collection = MongoClient(uri)[database].company_locks
+        self._indexed = False
+
+    async def claim(self, company_id: str, owner: str, lease_seconds: int) -> bool:
+        return await asyncio.to_thread(self._claim, company_id, owner, lease_seconds)
+
+    async def renew(self, company_id: str, owner: str, lease_seconds: int) -> bool:
+        return await asyncio.to_thread(self._renew, company_id, owner, lease_seconds)
+
+    async def release(self, company_id: str, owner: str):
+        await asyncio.to_thread(
+            self._collection.delete_one, {"_id": company_id, "owner": owner}
+        )
+
+    async def holder(self, company_id: str) -> Optional[str]:
+        lease = await asyncio.to_thread(
+            self._collection.find_one,
+            {"_id": company_id, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+        )
+        return lease["owner"] if lease else None
+
+    def _claim(self, company_id: str, owner: str, lease_seconds: int) -> bool:
+        if not self._indexed:
+            # Mongo drops leases of crashed replicas eventually; they can be
+            # taken over as soon as they expire
+            self._collection.create_index("expires_at", expireAfterSeconds=0)
+            self._indexed = True
+
+        now = datetime.now(timezone.utc)
+        lease = {
+            "owner": owner,
+            "expires_at": now + timedelta(seconds=lease_seconds),
+            "heartbeat_at": now,
+        }
+        try:
+            self._collection.insert_one({"_id": company_id, **lease})
+            return True
+        except DuplicateKeyError:
+            # Take over the lease of a replica that stopped renewing it
+            taken = self._collection.find_one_and_update(
+                {"_id": company_id, "$or": [
+                    {"expires_at": {"$lt": now}},
+                    {"owner": {"$regex": f"^{re.escape(_instance_of(owner))}:"}},
+                ]},
+                {"$set": lease},
+            )
+            return taken is not None
+
+    def _renew(self, company_id: str, owner: str, lease_seconds: int) -> bool:
+        now = datetime.now(timezone.utc)
+        result = self._collection.update_one(
+            {"_id": company_id, "owner": owner},
+            {"$set": {
+                "expires_at": now + timedelta(seconds=lease_seconds),
+                "heartbeat_at": now,
+            }},
+        )
+        return result.matched_count == 1
+
+_lease_store = None
+
+def get_lease_store():
+    """Mongo lease store when COMPANY_LOCK_MONGO_URI is set, else the local one"""
+    global _lease_store
+    if _lease_store is None:
+        if COMPANY_LOCK_MONGO_URI:
+            _lease_store = MongoLeaseStore(COMPANY_LOCK_MONGO_URI, COMPANY_LOCK_MONGO_DB)
+        else:
+            _lease_store = LocalLeaseStore()
+    return _lease_store
+
+async def _claim_lease(company_id: str, owner: str) -> Optional[bool]:
+    """Whether the lease was claimed, None when the lease store is unreachable"""
+    try:
+        return await get_lease_store().claim(company_id, owner, COMPANY_LOCK_LEASE_SECONDS)
+    except PyMongoError as e:
+        logger.warning(f"Could not claim lease on company {company_id}: {str(e)}")
+        return None
+
+# Lease releases still running; the loop only keeps weak references to tasks
+_RELEASE_TASKS: Set[asyncio.Task] = set()
+
+# ====================== COMPANY LOCKS ======================
+
+class CompanyLease:
+    """
+    Lock on a company across all replicas: a local asyncio.Lock plus a lease
+    in the lease store, kept alive by a heartbeat task while held.
+
+    Supports the parts of the asyncio.Lock API the callers use (locked(),
+    release(), async with). If a heartbeat finds the lease taken over,
+    `lost` is set and the holder should stop picking up files.
+
+    Files are still claimed one at a time by Django, so an unreachable lease
+    store does not stop processing: the lock is then held `unowned`, and the
+    heartbeat keeps trying to claim the lease until the store is back.
+    """
+
+    def __init__(self, company_id: str, registry: "CompanyLockRegistry"):
+        self.company_id = company_id
+        self.owner: Optional[str] = None
+        self.lost = False
+        self.unowned = False
+        self.last_used = time.monotonic()
+        self._registry = registry
+        self._lock = asyncio.Lock()
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._waiters = 0
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    def in_use(self) -> bool:
+        """Held, waited for, or still holding a lease; such locks are never evicted"""
+        return self._lock.locked() or self._waiters > 0 or self.owner is not None
+
+    async def try_acquire(self) -> bool:
+        """Acquire without waiting, on this replica or any other"""
+        if self._lock.locked():
+            self._registry.contended += 1
+            return False
+        try:
+            await asyncio.wait_for(self._lock.acquire(), timeout=0.001)
+        except asyncio.TimeoutError:
+            # Lock was acquired by someone else in the tiny window
+            self._registry.contended += 1
+            return False
+
+        owner = f"{INSTANCE_ID}:{uuid.uuid4().hex[:8]}"
+        claimed = await _claim_lease(self.company_id, owner)
+        if claimed is False:
+            self._lock.release()
+            self._registry.contended_remote += 1
+            return False
+        self._hold(owner, unowned=claimed is None)
+        return True
+
+    async def acquire(self) -> bool:
+        """Wait until no replica holds the company"""
+        started = time.monotonic()
+        waited = self._lock.locked()
+        self._waiters += 1
+        try:
+            await self._lock.acquire()
+        finally:
+            self._waiters -= 1
+        owner = f"{INSTANCE_ID}:{uuid.uuid4().hex[:8]}"
+        try:
+            while True:
+                claimed = await _claim_lease(self.company_id, owner)
+                if claimed is not False:
+                    break
+                waited = True
+                await asyncio.sleep(COMPANY_LOCK_POLL_SECONDS)
+        except BaseException:
+            self._lock.release()
+            raise
+        if waited:
+            self._registry.waits += 1
+            self._registry.wait_seconds += time.monotonic() - started
+        self._hold(owner, unowned=claimed is None)
+        return True
+
+    def release(self):
+        """Release the local lock now and the lease in the background"""
+        owner = self._drop()
+        self._lock.release()
+        self.last_used = time.monotonic()
+        if owner:
+            task = asyncio.get_running_loop().create_task(self._release_lease(owner))
+            _RELEASE_TASKS.add(task)
+            task.add_done_callback(_RELEASE_TASKS.discard)
+
+    async def release_lease(self):
+        """Give up the lease and wait for the store, e.g. on shutdown"""
+        owner = self._drop()
+        if owner:
+            await self._release_lease(owner)
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+    def _hold(self, owner: str, unowned: bool = False):
+        self.owner = owner
+        self.lost = False
+        self.unowned = unowned
+        self._heartbeat = asyncio.create_task(self._renew(owner))
+
+    def _drop(self) -> Optional[str]:
+        if self._heartbeat:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        owner, self.owner = self.owner, None
+        self.unowned = False
+        return owner
+
+    async def _renew(self, owner: str):
+        while True:
+            await asyncio.sleep(COMPANY_LOCK_LEASE_SECONDS / 3)
+            if self.unowned:
+                claimed = await _claim_lease(self.company_id, owner)
+                if claimed is None:
+                    continue
+                if claimed:
+                    self.unowned = False
+                    logger.info(f"Claimed lease on company {self.company_id} after the lease store recovered")
+                    continue
+                self.lost = True
+                logger.error(f"Company {self.company_id} was claimed by another replica while its lease store was unreachable")
+                return
+            try:
+                renewed = await get_lease_store().renew(
+                    self.company_id, owner, COMPANY_LOCK_LEASE_SECONDS
+                )
+            except PyMongoError as e:
+                # Retried on the next beat, the lease has time left
+                logger.warning(f"Could not renew lease on company {self.company_id}: {str(e)}")
+                continue
+            if not renewed:
+                self.lost = True
+                logger.error(f"Lost lease on company {self.company_id} to another replica")
+                return
+
+    async def _release_lease(self, owner: str):
+        try:
+            await get_lease_store().release(self.company_id, owner)
+        except PyMongoError as e:
+            # The lease expires on its own
+            logger.warning(f"Could not release lease on company {self.company_id}: {str(e)}")
+
+class CompanyLockRegistry:
     """
-    Thread-safe function to get or create a lock for the specified company.
-    
+    Company locks of this replica, created on first use.
+
+    Locks nobody holds or waits for are dropped once idle for
+    COMPANY_LOCK_IDLE_SECONDS, and least recently used ones first whenever
+    the registry grows past COMPANY_LOCK_MAX_ENTRIES, so memory follows the
+    companies being processed rather than every company ever seen. Only
+    touched from the event loop thread, and get() never yields, so no
+    further locking is needed.
+    """
+
+    SWEEP_INTERVAL_SECONDS = 30
+
+    def __init__(
+        self,
+        idle_seconds: int = COMPANY_LOCK_IDLE_SECONDS,
+        max_entries: int = COMPANY_LOCK_MAX_ENTRIES,
+    ):
+        self.idle_seconds = idle_seconds
+        self.max_entries = max_entries
+        # Least recently used first
+        self._locks: "OrderedDict[str, CompanyLease]" = OrderedDict()
+        self._swept_at = time.monotonic()
+        self.created = 0
+        self.evicted = 0
+        # try_acquire refusals, because of this replica or another one
+        self.contended = 0
+        self.contended_remote = 0
+        # Blocking acquires that had to wait, and for how long in total
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    def get(self, company_id: str) -> CompanyLease:
+        now = time.monotonic()
+        company_lock = self._locks.get(company_id)
+        if company_lock is None:
+            company_lock = self._locks[company_id] = CompanyLease(company_id, self)
+            self.created += 1
+        else:
+            self._locks.move_to_end(company_id)
+        company_lock.last_used = now
+
+        if (
+            len(self._locks) > self.max_entries
+            or now - self._swept_at >= self.SWEEP_INTERVAL_SECONDS
+        ):
+            self._evict(now, keep=company_id)
+        return company_lock
+
+    def peek(self, company_id: str) -> Optional[CompanyLease]:
+        """Lock of the company if it exists, without creating or touching it"""
+        return self._locks.get(company_id)
+
+    def held(self) -> List[CompanyLease]:
+        return [company_lock for company_lock in self._locks.values() if company_lock.owner]
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._locks),
+            "max_entries": self.max_entries,
+            "held": sum(1 for company_lock in self._locks.values() if company_lock.locked()),
+            # Held while the lease store was unreachable, without a lease
+            "unowned": sum(1 for company_lock in self._locks.values() if company_lock.unowned),
+            "created": self.created,
+            "evicted": self.evicted,
+            "contended": self.contended,
+            "contended_remote": self.contended_remote,
+            "waits": self.waits,
+            "wait_seconds": round(self.wait_seconds, 3),
+        }
+
+    def _evict(self, now: float, keep: str):
+        self._swept_at = now
+        overflow = len(self._locks) - self.max_entries
+        for company_id, company_lock in list(self._locks.items()):
+            if company_id == keep or company_lock.in_use():
+                continue
+            if overflow > 0 or now - company_lock.last_used >= self.idle_seconds:
+                del self._locks[company_id]
+                self.evicted += 1
+                overflow -= 1
+
+company_locks = CompanyLockRegistry()
+
+async def get_company_lock(company_id: str) -> CompanyLease:
+    """
+    Get or create the lock for the specified company.
+
     Args:
         company_id (str): The unique identifier for the company
-        
+
     Returns:
-        asyncio.Lock: The lock object for the company
+        CompanyLease: The lock object for the company
     """
-    with _LOCK_CREATION_LOCK:
-        if company_id not in COMPANY_LOCKS:
-            COMPANY_LOCKS[company_id] = asyncio.Lock()
-    return COMPANY_LOCKS[company_id]
+    return company_locks.get(company_id)
 
-async def try_acquire_company_lock_immediately(company_id: str) -> tuple[bool, asyncio.Lock]:
+async def try_acquire_company_lock_immediately(company_id: str) -> tuple[bool, CompanyLease]:
     """
     Atomically try to acquire company lock immediately to prevent race conditions.
-    
+    The company is refused while another replica holds an unexpired lease on it.
+
     Args:
         company_id (str): The unique identifier for the company
-        
+
     Returns:
-        tuple[bool, asyncio.Lock]: (acquired, lock) where acquired indicates if lock was successfully acquired
+        tuple[bool, CompanyLease]: (acquired, lock) where acquired indicates if lock was successfully acquired
     """
     company_lock = await get_company_lock(company_id)
-    
-    # Check if lock is already held
-    if company_lock.locked():
-        return False, company_lock
-    
-    # Try to acquire the lock with a very short timeout
-    try:
-        await asyncio.wait_for(company_lock.acquire(), timeout=0.001)
-        return True, company_lock
-    except asyncio.TimeoutError:
-        # Lock was acquired by someone else in the tiny window
-        return False, company_lock
+    acquired = await company_lock.try_acquire()
+    return acquired, company_lock
 
 async def check_company_processing_status(company_id: str) -> bool:
     """
-    Check if company is currently being processed.
-    
+    Check if company is currently being processed, by this or any other replica.
+
     Args:
         company_id (str): The unique identifier for the company
-        
+
     Returns:
         bool: True if company is currently being processed
     """
-    company_lock = await get_company_lock(company_id)
-    return company_lock.locked()
\ No newline at end of file
+    # Looking a company up must not grow the registry
+    company_lock = company_locks.peek(company_id)
+    if company_lock and company_lock.locked():
+        return True
+    try:
+        return await get_lease_store().holder(company_id) is not None
+    except PyMongoError as e:
+        logger.warning(f"Could not read lease on company {company_id}: {str(e)}")
+        return False
+
+async def release_company_locks():
+    """Give up every lease this replica holds so others can take over at once"""
+    await asyncio.gather(*(company_lock.release_lease() for company_lock in company_locks.held()))
+    await asyncio.gather(*list(_RELEASE_TASKS), return_exceptions=True)
+
+def company_lock_stats() -> dict:
+    """Size and contention of this replica's lock registry"""
+    return company_locks.stats()
@@ -141,6 +141,10 @@ class InsuredType(StrEnum):
     INDIVIDUAL = "Individual"
     CORPORATE = "Corporate"
 
+class ProcessingLane(StrEnum):
+    INTERACTIVE = "interactive" # Single uploads, served first
+    BULK = "bulk" # ZIP and bulk uploads
+
 # ====================== BASE MODELS ======================
 
 class BasePluginResponse(BaseModel):
@@ -153,11 +157,19 @@ class StartCompanyProcessingRequest(BaseModel):
     company_id: str
     django_base_url: str
     jwt_token: Optional[str] = None 
+    # Files of the company processed concurrently, defaults to COMPANY_MAX_WORKERS
+    max_workers: Optional[int] = Field(default=None, ge=1, le=32)
+    # Single uploads go through the interactive lane, ahead of ZIP/bulk jobs
+    lane: ProcessingLane = ProcessingLane.BULK
+    # Share of the workers relative to other companies in the same lane
+    weight: int = Field(default=1, ge=1, le=10)
 
 class PendingFileResponse(BaseModel):
     mongo_id: str
     file_url: str
     file_name: str
+    # Files of the company still pending after this one, when Django reports it
+    remaining: Optional[int] = None
 
 class UpdateFileStatusRequest(BaseModel):
     mongo_id: str
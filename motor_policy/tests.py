@@ -1,3 +1,42 @@
-from django.test import TestCase
+from datetime import datetime, timedelta, timezone
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from motor_policy.views.mixins import FILE_CLAIM_SECONDS, FileProcessingMixin
+
+
+@mock.patch("motor_policy.views.mixins.mongo_indexes")
+@mock.patch("motor_policy.views.mixins.aws_utils")
+@mock.patch("motor_policy.views.mixins.mongodb")
+class NextPendingFileTests(SimpleTestCase):
+    def _next(self, mongodb):
+        mongodb.motor_policy.find_one_and_update.return_value = {
+            "_id": "65f000000000000000000001",
+            "meta": {"file_url": "s3://bucket/policy.pdf", "file_name": "policy.pdf"},
+        }
+        mongodb.motor_policy.count_documents.return_value = 0
+        request = mock.Mock(query_params={"company_id": "c1"})
+        response = FileProcessingMixin().next_pending_file(request)
+        query, update = mongodb.motor_policy.find_one_and_update.call_args.args
+        return response, query, update
+
+    def test_claim_is_timestamped(self, mongodb, *mocks):
+        response, query, update = self._next(mongodb)
+
+        self.assertEqual(response.status_code, 200)
+        claimed_at = update["$set"]["meta.processing_at"]
+        self.assertTrue(update["$set"]["meta.processing"])
+        self.assertLess(datetime.now(timezone.utc) - claimed_at, timedelta(seconds=5))
+
+    def test_abandoned_claims_are_handed_out_again(self, mongodb, *mocks):
+        response, query, update = self._next(mongodb)
+
+        unclaimed, abandoned = query["$or"]
+        self.assertEqual(unclaimed, {"meta.processing": {"$ne": True}})
+        # Missing or older than the claim window, from the time of this claim
+        cutoff = abandoned["meta.processing_at"]["$not"]["$gte"]
+        self.assertEqual(
+            update["$set"]["meta.processing_at"] - cutoff,
+            timedelta(seconds=FILE_CLAIM_SECONDS),
+        )
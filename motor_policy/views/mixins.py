@@ -1,3 +1,5 @@
+from datetime import datetime, timedelta, timezone
+
 from bson import ObjectId
 from rest_framework import status
 from rest_framework.decorators import action, permission_classes
@@ -8,6 +10,7 @@ from django.conf import settings
 from utils import aws_utils
 from utils.nanoid_utils import default_nanoid
 from core.database import mongodb
+from plugin.utils.mongo_indexes import mongo_indexes
 from motor_quote.enums import PluginStatus
 from core.views import module_permission
 from permission.enums import Operation
@@ -27,6 +30,11 @@ from motor_policy.serializers import (
 from plugin.services.policy_extraction import PolicyExtractionObject
 from motor_policy.models import MotorPolicy
 
+# A file claimed for extraction longer ago than this is handed out again: the
+# worker that claimed it crashed or was cancelled. Must exceed the time one
+# file can take (download, extraction and status update).
+FILE_CLAIM_SECONDS = getattr(settings, "POLICY_FILE_CLAIM_SECONDS", 15 * 60)
+
 
 class S3UploadMixin:
     @swagger_auto_schema(
@@ -111,12 +119,27 @@ class FileProcessingMixin:
                 {"detail": "company_id required"}, status=status.HTTP_400_BAD_REQUEST
             )
 
-        pending_file = mongodb.motor_policy.find_one(
+        mongo_indexes.ensure("motor_policy")
+        now = datetime.now(timezone.utc)
+        # Claim the file in the same operation that finds it, so concurrent
+        # extraction workers never get the same file
+        pending_file = mongodb.motor_policy.find_one_and_update(
             {
                 "meta.company_id": company_id,
                 "meta.status": PluginStatus.PENDING.value,
-                "meta.processing": {"$ne": True}
-            }
+                "$or": [
+                    {"meta.processing": {"$ne": True}},
+                    # Abandoned claims, including those made before claims
+                    # were timestamped
+                    {
+                        "meta.processing_at": {
+                            "$not": {"$gte": now - timedelta(seconds=FILE_CLAIM_SECONDS)}
+                        }
+                    },
+                ],
+            },
+            {"$set": {"meta.processing": True, "meta.processing_at": now}},
+            projection={"meta.file_url": 1, "meta.file_name": 1},
         )
 
         if not pending_file:
@@ -124,19 +147,24 @@ class FileProcessingMixin:
                 {"detail": "No more files to process"}, status=status.HTTP_404_NOT_FOUND
             )
 
-        mongodb.motor_policy.update_one(
-            {"_id": pending_file["_id"]}, {"$set": {"meta.processing": True}}
-        )
-
         presigned_url = aws_utils.get_presigned_url_from_s3_url(
             pending_file["meta"]["file_url"]
         )
+        # Queue depth reported by the extraction scheduler
+        remaining = mongodb.motor_policy.count_documents(
+            {
+                "meta.company_id": company_id,
+                "meta.status": PluginStatus.PENDING.value,
+                "meta.processing": {"$ne": True},
+            }
+        )
 
         return Response(
             {
                 "mongo_id": str(pending_file["_id"]),
                 "file_url": presigned_url,
                 "file_name": pending_file["meta"]["file_name"],
+                "remaining": remaining,
             },
             status=status.HTTP_200_OK,
         )
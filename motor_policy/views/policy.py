@@ -15,6 +15,7 @@ from rest_framework.response import Response
 from drf_yasg.utils import swagger_auto_schema
 from motor_policy.models import MotorPolicy
 from core.database import mongodb
+from plugin.utils.mongo_indexes import mongo_indexes
 from core.serializers import LimitOffsetSerializer
 from rest_framework.pagination import LimitOffsetPagination
 from django.db import transaction
@@ -230,6 +231,7 @@ class MotorPolicyViewSet(
 
         now = datetime.now()
 
+        mongo_indexes.ensure("motor_policy")
         inserted_doc = mongodb._insert_one(
             mongodb.motor_policy,
             {
@@ -399,6 +401,7 @@ class MotorPolicyViewSet(
 
         results = []
 
+        mongo_indexes.ensure("motor_policy")
         for file_entry in files:
             file_url = file_entry["url"]
             file_name = file_entry.get("file_name") or f"{default_nanoid()}"
@@ -5,6 +5,7 @@ from uuid import uuid4
 
 import sentry_sdk
 from core.database import mongodb
+from plugin.utils.mongo_indexes import mongo_indexes
 from motor_quote.enums import Insurer, TaskStatus
 import requests
 from requests import adapters
@@ -31,6 +32,7 @@ class AevisUtils:
         quote_request: "MotorQuoteRequest",
         request_serializer: "MotorQuoteRequestCreateSerializer",
     ):
+        mongo_indexes.ensure("quote_tasks")
         insurers: dict = request_serializer.data["insurers"]
         details: dict = request_serializer.data["details"]
 
@@ -17,6 +17,7 @@ from rest_framework.response import Response
 from drf_yasg.utils import swagger_auto_schema
 from motor_quote.models import MotorQuoteRequest
 from core.database import mongodb
+from plugin.utils.mongo_indexes import mongo_indexes
 from motor_quote.utils import AevisUtils
 from core.serializers import LimitOffsetSerializer
 from rest_framework.pagination import LimitOffsetPagination
@@ -114,6 +115,7 @@ class MotorQuoteRequestViewSet(PermissionScopedViewSet):
     def create(self, request, *args, **kwargs):
         serializer = MotorQuoteRequestCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        mongo_indexes.ensure("quote_req")
         inserted_doc = mongodb._insert_one(mongodb.quote_req, serializer.data)
         company, access_location, access_department, access_level = (
             request.user.company,
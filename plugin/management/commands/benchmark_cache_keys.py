@@ -0,0 +1,67 @@
+import hashlib
+import json
+import timeit
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from plugin.services.driving_license.models import DrivingLicenseVerificationRequest
+from plugin.services.policy_extraction.models import PolicyExtractionRequest
+from plugin.services.vechile_rc_validation.models import VehicleRCVerificationRequest
+from plugin.utils import cache_keys
+
+
+def _legacy_request_hash(request, exclude_fields=()):
+    """Key derivation used before cache_keys: dump, copy, trim, sorted JSON, SHA-256"""
+    data = request.model_dump().copy()
+    for field in exclude_fields:
+        data.pop(field, None)
+    serialized = json.dumps(
+        cache_keys.normalize(data), sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+class Command(BaseCommand):
+    help = "Compare cache key derivation before and after the precompiled key builders"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--number", type=int, default=100000)
+
+    def handle(self, *args, **options):
+        number = options["number"]
+        cases = [
+            ("rc", VehicleRCVerificationRequest(rc_number="MH12AB1234"), (), number),
+            (
+                "dl",
+                DrivingLicenseVerificationRequest(
+                    dl_number="MH1220110012345", dob=date(1990, 1, 1)
+                ),
+                ("dob",),
+                number,
+            ),
+            (
+                "policy (1 MB)",
+                PolicyExtractionRequest(
+                    file=("policy.pdf", b"%PDF" * 256 * 1024, "application/pdf")
+                ),
+                (),
+                max(number // 1000, 10),
+            ),
+        ]
+
+        self.stdout.write(
+            f"serializer: {'orjson' if cache_keys.orjson else 'json'}, "
+            f"digest: {'xxh3' if cache_keys.xxhash else 'blake2b'}"
+        )
+        for name, request, exclude_fields, runs in cases:
+            builder = cache_keys.key_builder_for(type(request), exclude_fields)
+            legacy = timeit.timeit(
+                lambda: _legacy_request_hash(request, exclude_fields), number=runs
+            )
+            current = timeit.timeit(lambda: builder.request_hash(request), number=runs)
+            self.stdout.write(
+                f"{name:>14}: legacy {legacy / runs * 1e6:8.2f} us, "
+                f"builder {current / runs * 1e6:8.2f} us, "
+                f"{legacy / current:5.2f}x"
+            )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from plugin.utils.mongo_indexes import mongo_indexes
+
+
+class Command(BaseCommand):
+    help = "Create the MongoDB indexes used by the plugin, motor policy and quote apps"
+
+    def handle(self, *args, **options):
+        failed = []
+        for collection_name, index_names in mongo_indexes.ensure_all(force=True).items():
+            if index_names is None:
+                failed.append(collection_name)
+                self.stderr.write(f"{collection_name}: failed")
+            else:
+                self.stdout.write(
+                    f"{collection_name}: {', '.join(index_names) or 'no secondary indexes'}"
+                )
+
+        if failed:
+            raise CommandError(f"Could not ensure indexes on {', '.join(failed)}")
+        self.stdout.write(self.style.SUCCESS("Mongo indexes ensured"))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from pymongo.errors import OperationFailure
+
+from core.database import mongodb
+
+
+class Command(BaseCommand):
+    help = (
+        "Move plugin_cache to per-document expiry: drop the created_at TTL index "
+        "and the entries written before expires_at existed"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Only count the legacy entries"
+        )
+
+    def handle(self, *args, **options):
+        legacy = {"expires_at": {"$exists": False}}
+        if options["dry_run"]:
+            count = mongodb.plugin_cache.count_documents(legacy)
+            self.stdout.write(f"{count} plugin_cache entries without expires_at")
+            return
+
+        try:
+            # Would otherwise expire new entries by their created_at
+            mongodb.plugin_cache.drop_index("created_at_1")
+            self.stdout.write("Dropped created_at_1")
+        except OperationFailure:
+            self.stdout.write("No created_at_1 index")
+
+        # Entries without expires_at would never expire; delete them in
+        # batches so the command does not hold one long-running operation
+        deleted = 0
+        while True:
+            ids = [
+                doc["_id"]
+                for doc in mongodb.plugin_cache.find(legacy, {"_id": 1}).limit(
+                    options["batch_size"]
+                )
+            ]
+            if not ids:
+                break
+            result = mongodb.plugin_cache.delete_many({"_id": {"$in": ids}})
+            deleted += result.deleted_count
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Deleted {deleted} legacy plugin_cache entries")
+        )
@@ -0,0 +1,59 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from plugin.models import Plugin
+from plugin.utils.cache_warmup import CacheWarmer
+
+
+class Command(BaseCommand):
+    help = (
+        "Preload plugin_cache by running a batch of lookups through a plugin. "
+        "The file holds one JSON request per line, or a JSON list. Use this "
+        "rather than the warm-up endpoint for large batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("plugin_uid")
+        parser.add_argument("path", help="JSON lines file, or - for stdin")
+        parser.add_argument("--workers", type=int, default=CacheWarmer.MAX_WORKERS)
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=CacheWarmer.RATE_PER_SECOND,
+            help="Maximum upstream calls started per second",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            plugin = Plugin.objects.get(uid=options["plugin_uid"])
+        except Plugin.DoesNotExist:
+            raise CommandError("Plugin not found")
+
+        items = self._read_items(options["path"])
+        try:
+            warmer = CacheWarmer(plugin, options["workers"], options["rate"])
+            result = warmer.run(items, self._report_progress)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(json.dumps(result.to_dict(), indent=2))
+
+    def _report_progress(self, result):
+        done = result.already_cached + result.fetched + result.failed
+        self.stderr.write(f"{done} looked up, {result.failed} failed")
+
+    def _read_items(self, path):
+        if path == "-":
+            content = sys.stdin.read()
+        else:
+            with open(path) as f:
+                content = f.read()
+
+        try:
+            if content.lstrip().startswith("["):
+                return json.loads(content)
+            return [json.loads(line) for line in content.splitlines() if line.strip()]
+        except json.JSONDecodeError as e:
+            raise CommandError(f"Invalid JSON: {e}")
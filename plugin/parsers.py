@@ -0,0 +1,28 @@
+import io
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import JSONParser
+
+from .utils.batch_verification import BatchVerifier
+
+
+class RequestBodyTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "Request body too large"
+    default_code = "request_body_too_large"
+
+
+class BatchJSONParser(JSONParser):
+    """
+    JSONParser that reads at most MAX_BODY_BYTES of a batch body, whatever
+    the Content-Length header says, and raises RequestBodyTooLarge beyond.
+    """
+
+    max_bytes = BatchVerifier.MAX_BODY_BYTES
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        body = stream.read(self.max_bytes + 1)
+        if len(body) > self.max_bytes:
+            raise RequestBodyTooLarge(f"Body larger than {self.max_bytes} bytes")
+        return super().parse(io.BytesIO(body), media_type, parser_context)
@@ -1,19 +1,50 @@
+import logging
+
 from plugin.models import Plugin
 from plugin.enums import PluginService
-from plugin.utils.plugin_factory import PluginFactory
+from plugin.utils.cache_decorator import _is_upstream_failure
+from plugin.utils.provider_router import provider_router
 from plugin.services.core.models.base import BasePluginResponse
 
+logger = logging.getLogger(__name__)
+
+
 class ServiceRunner():
     def __init__(self, service: PluginService):
         self.service = service
 
     def run(self, request, payload):
+        """
+        Run the payload through the company's plugins for the service, the
+        healthiest provider first, failing over to the next one when a call
+        fails. The response records the plugin that produced it.
+        """
         company = request.user.company
-        plugin = Plugin.objects.filter(company=company, service=self.service.value).first()
-        if not plugin:
+        plugins = list(Plugin.objects.filter(company=company, service=self.service.value))
+        if not plugins:
             return BasePluginResponse(is_success=False, message="No active plugin found.")
 
-        provider_class = PluginFactory.get_provider_class(plugin.provider, plugin.service)
-        provider = provider_class(plugin)
-        return provider.run(plugin, payload)
+        # plugin_factory imports this module through the policy_extraction package
+        from plugin.utils.plugin_registry import plugin_registry
+
+        plugins = provider_router.rank(plugins)
+        for attempt, plugin in enumerate(plugins, start=1):
+            provider = plugin_registry.get_provider(plugin)
+            is_last = attempt == len(plugins)
+            try:
+                response = provider.run(plugin, payload)
+            except Exception as e:
+                if is_last:
+                    raise
+                logger.warning("%s via %s failed, failing over: %s", self.service, plugin.provider, e)
+                continue
+            if is_last or not _is_upstream_failure(response, plugin.provider):
+                return self._with_plugin(response, plugin)
+            logger.warning("%s via %s failed, failing over", self.service, plugin.provider)
 
+    def _with_plugin(self, response, plugin):
+        fields = getattr(type(response), "model_fields", {})
+        if "plugin_uid" not in fields:
+            return response
+        # Responses may be shared with concurrent callers, never update in place
+        return response.model_copy(update={"plugin_uid": plugin.uid, "provider": plugin.provider})
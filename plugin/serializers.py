@@ -177,6 +177,25 @@ class PluginMaskedSerializer(serializers.ModelSerializer):
         return data
 
 
+class CacheWarmupRequestSerializer(serializers.Serializer):
+    # Request objects are validated one by one by the warm-up job
+    requests = serializers.ListField(allow_empty=False)
+    max_workers = serializers.IntegerField(
+        required=False, allow_null=True, min_value=1, max_value=32
+    )
+    rate_per_second = serializers.FloatField(
+        required=False, allow_null=True, min_value=0.1
+    )
+
+
+class BatchVerificationRequestSerializer(serializers.Serializer):
+    # Invalid request objects are reported per item in the results
+    requests = serializers.ListField(allow_empty=False)
+    max_concurrency = serializers.IntegerField(
+        required=False, allow_null=True, min_value=1, max_value=32
+    )
+
+
 class PANVerificationRequestSerializer(serializers.Serializer):
     pan_number = serializers.CharField(
         min_length=10, max_length=10, help_text="10-character PAN number"
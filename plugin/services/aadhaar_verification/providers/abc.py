@@ -1,3 +1,4 @@
+import asyncio
 from abc import ABC, abstractmethod
 from typing import TYPE_CHECKING
 
@@ -26,3 +27,15 @@ class AbstractAadhaarVerificationProvider(ABC):
     ) -> AadhaarVerificationResponse:
 
         pass
+
+    async def agenerate_otp(
+        self, plugin: "Plugin", request: AadhaarOTPGenerateRequest
+    ) -> AadhaarOTPGenerateResponse:
+        """Non-blocking generate_otp(); providers with an async client override this"""
+        return await asyncio.to_thread(self.generate_otp, plugin, request)
+
+    async def averify_otp(
+        self, plugin: "Plugin", request: AadhaarOTPVerifyRequest
+    ) -> AadhaarVerificationResponse:
+        """Non-blocking verify_otp(); providers with an async client override this"""
+        return await asyncio.to_thread(self.verify_otp, plugin, request)
@@ -3,6 +3,7 @@ from typing import TYPE_CHECKING, Any, Dict
 import httpx
 
 from plugin.utils.cache_decorator import auto_cached_provider_method
+from plugin.utils.http_clients import http_clients
 
 from ..models import (
     AadhaarOTPGenerateRequest,
@@ -37,10 +38,11 @@ class DEEPVUE(AbstractAadhaarVerificationProvider):
             "Content-Type": "application/json",
         }
         try:
-            with httpx.Client(timeout=30) as client:
-                response = client.request(method, url, params=payload, headers=headers)
-                response.raise_for_status()
-                return response.json()
+            response = http_clients.get(url).request(
+                method, url, params=payload, headers=headers
+            )
+            response.raise_for_status()
+            return response.json()
         except httpx.HTTPStatusError as e:
             return {
                 "success": False,
@@ -49,6 +51,7 @@ class DEEPVUE(AbstractAadhaarVerificationProvider):
         except Exception as e:
             return {"success": False, "message": str(e)}
 
+    @auto_cached_provider_method(cache_disabled=True)
     def generate_otp(
         self, plugin: "Plugin", request: AadhaarOTPGenerateRequest
     ) -> AadhaarOTPGenerateResponse:
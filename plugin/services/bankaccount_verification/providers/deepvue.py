@@ -26,27 +26,48 @@ class DEEPVUE(AbstractBankAccountVerificationProvider):
                 "/v1/verification/bankaccount",
                 params=request.model_dump(),
             )
-            response_payload = {
-                "success": True if response.get("code") == 200 else False,
-                "message": response.get("data", {}).get(
-                    "message", "Verification completed"
-                ),
-                "code": response.get("code"),
-                "timestamp": response.get("timestamp"),
-                "transaction_id": response.get("transaction_id"),
-                "account_exists": response.get("data", {}).get("account_exists"),
-                "name_at_bank": response.get("data", {}).get("name_at_bank"),
-                "utr": response.get("data", {}).get("utr"),
-                "amount_deposited": response.get("data", {}).get("amount_deposited"),
-                "name_information": response.get("data", {}).get("name_information"),
-            }
-
-            return BankAccountVerificationResponse(**response_payload)
+            return self._build_response(response)
 
         except Exception as e:
-            error_response = {
-                "success": False,
-                "message": f"Bank verification failed: {str(e)}",
-                "provider": "deepvue",
-            }
-            return BankAccountVerificationResponse(**error_response)
+            return self._failed(e)
+
+    @auto_cached_provider_method()
+    async def arun(
+        self, plugin: "Plugin", request: BankAccountVerificationRequest
+    ) -> BankAccountVerificationResponse:
+        try:
+            response = await self.auth.amake_request(
+                "GET",
+                "/v1/verification/bankaccount",
+                params=request.model_dump(),
+            )
+            return self._build_response(response)
+
+        except Exception as e:
+            return self._failed(e)
+
+    def _build_response(self, response: dict) -> BankAccountVerificationResponse:
+        response_payload = {
+            "success": True if response.get("code") == 200 else False,
+            "message": response.get("data", {}).get(
+                "message", "Verification completed"
+            ),
+            "code": response.get("code"),
+            "timestamp": response.get("timestamp"),
+            "transaction_id": response.get("transaction_id"),
+            "account_exists": response.get("data", {}).get("account_exists"),
+            "name_at_bank": response.get("data", {}).get("name_at_bank"),
+            "utr": response.get("data", {}).get("utr"),
+            "amount_deposited": response.get("data", {}).get("amount_deposited"),
+            "name_information": response.get("data", {}).get("name_information"),
+        }
+
+        return BankAccountVerificationResponse(**response_payload)
+
+    def _failed(self, error: Exception) -> BankAccountVerificationResponse:
+        error_response = {
+            "success": False,
+            "message": f"Bank verification failed: {str(error)}",
+            "provider": "deepvue",
+        }
+        return BankAccountVerificationResponse(**error_response)
@@ -8,3 +8,6 @@ class BasePluginResponse(BaseModel):
     is_success: bool
     message: str
     response: Optional[Any] = None
+    # Plugin that produced the response, set by ServiceRunner
+    plugin_uid: Optional[str] = None
+    provider: Optional[str] = None
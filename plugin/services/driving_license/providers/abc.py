@@ -1,3 +1,4 @@
+import asyncio
 from abc import ABC, abstractmethod
 from typing import TYPE_CHECKING
 
@@ -20,3 +21,9 @@ class AbstractDrivingLicenseVerificationProvider(ABC):
     ) -> DrivingLicenseVerificationResponse:
 
         pass
+
+    async def arun(
+        self, plugin: "Plugin", request: DrivingLicenseVerificationRequest
+    ) -> DrivingLicenseVerificationResponse:
+        """Non-blocking run(); providers with an async client override this"""
+        return await asyncio.to_thread(self.run, plugin, request)
@@ -1,3 +1,4 @@
+import asyncio
 from abc import ABC, abstractmethod
 from typing import TYPE_CHECKING
 from ..models import EmailRequest, EmailResponse
@@ -13,3 +14,7 @@ class AbstractEmailProvider(ABC):
     @abstractmethod
     def run(self, plugin: "Plugin", request: EmailRequest) -> EmailResponse:
         pass
+
+    async def arun(self, plugin: "Plugin", request: EmailRequest) -> EmailResponse:
+        """Non-blocking run(); providers with an async client override this"""
+        return await asyncio.to_thread(self.run, plugin, request)
@@ -1,5 +1,10 @@
-import resend
 from typing import TYPE_CHECKING
+
+import httpx
+
+from plugin.utils.cache_decorator import auto_cached_provider_method
+from plugin.utils.http_clients import http_clients
+
 from ..models import EmailRequest, EmailResponse
 from .abc import AbstractEmailProvider
 
@@ -8,31 +13,46 @@ if TYPE_CHECKING:
 
 
 class RESEND(AbstractEmailProvider):
+    # Called directly rather than through the resend SDK, which reads a
+    # module-global API key; instances are shared between plugins
+    BASE_URL = "https://api.resend.com/emails"
+
     def __init__(self, plugin: "Plugin"):
         super().__init__(plugin)
-        # API Key will be stored in Plugin model (plugin.api_key)
-        resend.api_key = plugin.api_key
 
+    @auto_cached_provider_method(cache_disabled=True)
     def run(self, plugin: "Plugin", request: EmailRequest) -> EmailResponse:
-        try:
-            params = {
-                "from": request.from_email,
-                "to": request.to,
-                "subject": request.subject,
-                "html": request.html,
-            }
-
-            email = resend.Emails.send(params)
+        params = {
+            "from": request.from_email,
+            "to": request.to,
+            "subject": request.subject,
+            "html": request.html,
+        }
 
+        try:
+            resp = http_clients.get(self.BASE_URL).post(
+                self.BASE_URL,
+                # API Key is stored in Plugin model (plugin.api_key)
+                headers={"Authorization": f"Bearer {plugin.api_key}"},
+                json=params,
+            )
+            data = resp.json()
+        except (httpx.RequestError, ValueError) as e:
             return EmailResponse(
-                success=True,
-                message="Email sent successfully",
-                id=email.get("id") if isinstance(email, dict) else str(email),
+                success=False,
+                message=f"Resend email failed: {str(e)}",
+                id=None,
             )
 
-        except Exception as e:
+        if resp.status_code != 200:
             return EmailResponse(
                 success=False,
-                message=f"Resend email failed: {str(e)}",
+                message=f"Resend email failed: {data.get('message') or f'HTTP {resp.status_code}'}",
                 id=None,
             )
+
+        return EmailResponse(
+            success=True,
+            message="Email sent successfully",
+            id=data.get("id"),
+        )
@@ -1,3 +1,4 @@
+import asyncio
 from abc import ABC, abstractmethod
 from typing import TYPE_CHECKING
 
@@ -16,3 +17,9 @@ class AbstractIFSCVerificationProvider(ABC):
         self, plugin: "Plugin", request: IFSCVerificationRequest
     ) -> IFSCVerificationResponse:
         pass
+
+    async def arun(
+        self, plugin: "Plugin", request: IFSCVerificationRequest
+    ) -> IFSCVerificationResponse:
+        """Non-blocking run(); providers with an async client override this"""
+        return await asyncio.to_thread(self.run, plugin, request)
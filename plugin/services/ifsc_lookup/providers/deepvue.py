@@ -30,35 +30,54 @@ class DEEPVUE(AbstractIFSCVerificationProvider):
                 "/v1/verification/ifsc",
                 params={"ifsc": request.ifsc},
             )
+            return self._build_response(result)
 
-            data = result.get("data", {}) or {}
+        except Exception as e:
+            return self._failed(e)
 
-            return IFSCVerificationResponse(
-                message=result.get("message"),
-                code=result.get("code"),
-                sub_code=result.get("sub_code"),
-                transaction_id=result.get("transaction_id"),
-                MICR=data.get("MICR"),
-                BRANCH=data.get("BRANCH"),
-                ADDRESS=data.get("ADDRESS"),
-                STATE=data.get("STATE"),
-                CONTACT=data.get("CONTACT"),
-                UPI=data.get("UPI"),
-                RTGS=data.get("RTGS"),
-                CITY=data.get("CITY"),
-                CENTRE=data.get("CENTRE"),
-                DISTRICT=data.get("DISTRICT"),
-                NEFT=data.get("NEFT"),
-                IMPS=data.get("IMPS"),
-                SWIFT=data.get("SWIFT"),
-                ISO3166=data.get("ISO3166"),
-                BANK=data.get("BANK"),
-                BANKCODE=data.get("BANKCODE"),
-                IFSC=data.get("IFSC"),
+    @auto_cached_provider_method()
+    async def arun(
+        self, plugin: "Plugin", request: IFSCVerificationRequest
+    ) -> IFSCVerificationResponse:
+        try:
+            result = await self.auth.amake_request(
+                "GET",
+                "/v1/verification/ifsc",
+                params={"ifsc": request.ifsc},
             )
-
-        except httpx.HTTPError as e:
-            return IFSCVerificationResponse(message=str(e), code=400)
+            return self._build_response(result)
 
         except Exception as e:
-            return IFSCVerificationResponse(message=str(e), code=500)
+            return self._failed(e)
+
+    def _build_response(self, result: dict) -> IFSCVerificationResponse:
+        data = result.get("data", {}) or {}
+
+        return IFSCVerificationResponse(
+            message=result.get("message"),
+            code=result.get("code"),
+            sub_code=result.get("sub_code"),
+            transaction_id=result.get("transaction_id"),
+            MICR=data.get("MICR"),
+            BRANCH=data.get("BRANCH"),
+            ADDRESS=data.get("ADDRESS"),
+            STATE=data.get("STATE"),
+            CONTACT=data.get("CONTACT"),
+            UPI=data.get("UPI"),
+            RTGS=data.get("RTGS"),
+            CITY=data.get("CITY"),
+            CENTRE=data.get("CENTRE"),
+            DISTRICT=data.get("DISTRICT"),
+            NEFT=data.get("NEFT"),
+            IMPS=data.get("IMPS"),
+            SWIFT=data.get("SWIFT"),
+            ISO3166=data.get("ISO3166"),
+            BANK=data.get("BANK"),
+            BANKCODE=data.get("BANKCODE"),
+            IFSC=data.get("IFSC"),
+        )
+
+    def _failed(self, error: Exception) -> IFSCVerificationResponse:
+        if isinstance(error, httpx.HTTPError):
+            return IFSCVerificationResponse(message=str(error), code=400)
+        return IFSCVerificationResponse(message=str(error), code=500)
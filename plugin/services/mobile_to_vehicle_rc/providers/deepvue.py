@@ -23,30 +23,48 @@ class DEEPVUE(AbstractMobileToVehicleRCProvider):
         self, plugin: "Plugin", request: MobileToVehicleRCRequest
     ) -> MobileToVehicleRCResponse:
         try:
-            mobile_number = request.mobile_number
-
             response_data = self.auth.make_request(
                 "GET",
                 "/v1/mobile-intelligence/mobile-to-vehicle-rc",
-                params={"mobile_number": mobile_number},
+                params={"mobile_number": request.mobile_number},
             )
+            return self._build_response(response_data)
 
-            response_payload = {
-                "success": response_data.get("code") == 200,
-                "message": response_data.get("message", ""),
-                "provider": "deepvue",
-                "code": response_data.get("code"),
-                "timestamp": response_data.get("timestamp"),
-                "transaction_id": response_data.get("transaction_id"),
-                "sub_code": response_data.get("sub_code"),
-                "data": response_data.get("data"),
-            }
+        except Exception as e:
+            return self._failed(e)
 
-            return MobileToVehicleRCResponse(**response_payload)
+    @auto_cached_provider_method()
+    async def arun(
+        self, plugin: "Plugin", request: MobileToVehicleRCRequest
+    ) -> MobileToVehicleRCResponse:
+        try:
+            response_data = await self.auth.amake_request(
+                "GET",
+                "/v1/mobile-intelligence/mobile-to-vehicle-rc",
+                params={"mobile_number": request.mobile_number},
+            )
+            return self._build_response(response_data)
 
         except Exception as e:
-            return MobileToVehicleRCResponse(
-                success=False,
-                message=f"Mobile-to-RC fetch failed: {str(e)}",
-                provider="deepvue",
-            )
+            return self._failed(e)
+
+    def _build_response(self, response_data: dict) -> MobileToVehicleRCResponse:
+        response_payload = {
+            "success": response_data.get("code") == 200,
+            "message": response_data.get("message", ""),
+            "provider": "deepvue",
+            "code": response_data.get("code"),
+            "timestamp": response_data.get("timestamp"),
+            "transaction_id": response_data.get("transaction_id"),
+            "sub_code": response_data.get("sub_code"),
+            "data": response_data.get("data"),
+        }
+
+        return MobileToVehicleRCResponse(**response_payload)
+
+    def _failed(self, error: Exception) -> MobileToVehicleRCResponse:
+        return MobileToVehicleRCResponse(
+            success=False,
+            message=f"Mobile-to-RC fetch failed: {str(error)}",
+            provider="deepvue",
+        )
@@ -1,3 +1,4 @@
+import asyncio
 from abc import ABC, abstractmethod
 from typing import TYPE_CHECKING
 from ..models import PANEligibilityRequest, PANEligibilityResponse
@@ -11,3 +12,10 @@ class AbstractPANEligibilityProvider(ABC):
     @abstractmethod
     def run(self, request: PANEligibilityRequest) -> PANEligibilityResponse:
         pass
+
+    async def arun(
+        self, plugin: "Plugin", request: PANEligibilityRequest
+    ) -> PANEligibilityResponse:
+        """Non-blocking run(); providers with an async client override this"""
+        # Providers implement run(plugin, request), as the cache decorator expects
+        return await asyncio.to_thread(self.run, plugin, request)
@@ -4,6 +4,7 @@ from ..models import PANEligibilityRequest, PANEligibilityResponse
 from .abc import AbstractPANEligibilityProvider
 
 from plugin.utils.cache_decorator import auto_cached_provider_method
+from plugin.utils.http_clients import http_clients
 
 if TYPE_CHECKING:
     from plugin.models import Plugin
@@ -21,15 +22,14 @@ class UNISEN(AbstractPANEligibilityProvider):
         payload = request.model_dump()
 
         try:
-            with httpx.Client(timeout=30.0) as client:
-                resp = client.post(
-                    self.BASE_URL,
-                    headers={
-                        "Content-Type": "application/json",
-                        "Authorization": f"Token {self.api_key}",
-                    },
-                    json=payload,
-                )
+            resp = http_clients.get(self.BASE_URL).post(
+                self.BASE_URL,
+                headers={
+                    "Content-Type": "application/json",
+                    "Authorization": f"Token {self.api_key}",
+                },
+                json=payload,
+            )
         except httpx.RequestError as e:
             return PANEligibilityResponse(
                 success=False,
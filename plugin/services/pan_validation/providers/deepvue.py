@@ -23,34 +23,51 @@ class DEEPVUE(AbstractPANValidationProvider):
         self, plugin: "Plugin", request: PANVerificationRequest
     ) -> PANVerificationResponse:
         try:
-            # Extract pan_number directly from Pydantic model
-            pan_number = request.pan_number
-
             result = self.auth.make_request(
                 "GET",
                 "/v2/verification/pan-plus",
-                params={"pan_number": pan_number},
+                params={"pan_number": request.pan_number},
             )
+            return self._build_response(result)
+
+        except Exception as e:
+            return self._failed(e)
 
-            data = result.get("data", {}) or {}
-
-            return PANVerificationResponse(
-                success=(result.get("sub_code") == "SUCCESS"),
-                message=result.get("message"),
-                request_id=result.get("transaction_id"),
-                transaction_id=result.get("transaction_id"),
-                sub_code=result.get("sub_code"),
-                pan_number=data.get("pan_number"),
-                full_name=data.get("full_name"),
-                full_name_split=data.get("full_name_split"),
-                category=data.get("category"),
-                gender=data.get("gender"),
-                dob=data.get("dob"),
-                masked_aadhaar=data.get("masked_aadhaar"),
-                aadhaar_linked=data.get("aadhaar_linked"),
+    @auto_cached_provider_method()
+    async def arun(
+        self, plugin: "Plugin", request: PANVerificationRequest
+    ) -> PANVerificationResponse:
+        try:
+            result = await self.auth.amake_request(
+                "GET",
+                "/v2/verification/pan-plus",
+                params={"pan_number": request.pan_number},
             )
+            return self._build_response(result)
 
         except Exception as e:
-            return PANVerificationResponse(
-                success=False, message=f"PAN validation failed: {str(e)}"
-            )
+            return self._failed(e)
+
+    def _build_response(self, result: dict) -> PANVerificationResponse:
+        data = result.get("data", {}) or {}
+
+        return PANVerificationResponse(
+            success=(result.get("sub_code") == "SUCCESS"),
+            message=result.get("message"),
+            request_id=result.get("transaction_id"),
+            transaction_id=result.get("transaction_id"),
+            sub_code=result.get("sub_code"),
+            pan_number=data.get("pan_number"),
+            full_name=data.get("full_name"),
+            full_name_split=data.get("full_name_split"),
+            category=data.get("category"),
+            gender=data.get("gender"),
+            dob=data.get("dob"),
+            masked_aadhaar=data.get("masked_aadhaar"),
+            aadhaar_linked=data.get("aadhaar_linked"),
+        )
+
+    def _failed(self, error: Exception) -> PANVerificationResponse:
+        return PANVerificationResponse(
+            success=False, message=f"PAN validation failed: {str(error)}"
+        )
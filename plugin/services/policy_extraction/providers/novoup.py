@@ -1,10 +1,10 @@
 from datetime import date
 from typing import TYPE_CHECKING, Optional
 
-import httpx
 from pydantic import BaseModel, ConfigDict, EmailStr
 
 from plugin.utils.cache_decorator import auto_cached_provider_method
+from plugin.utils.http_clients import http_clients
 
 from ...core.models.policy import (
     FuelType,
@@ -355,12 +355,11 @@ class Novoup(AbstractPolicyExtractionProvider):
     def run(
         self, plugin: "Plugin", request: PolicyExtractionRequest
     ) -> PolicyExtractionResponse:
-        with httpx.Client(timeout=30.0) as client:
-            response = client.post(
-                self.URL,
-                files={"pdf": request.file},
-            )
-            response.raise_for_status()
+        response = http_clients.get(self.URL).post(
+            self.URL,
+            files={"pdf": request.file},
+        )
+        response.raise_for_status()
 
         provider_id = response.json()["providerID"]
         extracted_data = response.json().get("extractedData", {})
@@ -1,3 +1,4 @@
+import asyncio
 from abc import ABC, abstractmethod
 from typing import TYPE_CHECKING
 
@@ -14,3 +15,7 @@ class AbstractSMSProvider(ABC):
     @abstractmethod
     def run(self, plugin: "Plugin", request: SMSRequest) -> SMSResponse:
         pass
+
+    async def arun(self, plugin: "Plugin", request: SMSRequest) -> SMSResponse:
+        """Non-blocking run(); providers with an async client override this"""
+        return await asyncio.to_thread(self.run, plugin, request)
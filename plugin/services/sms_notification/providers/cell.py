@@ -2,6 +2,9 @@ from typing import TYPE_CHECKING
 
 import httpx
 
+from plugin.utils.cache_decorator import auto_cached_provider_method
+from plugin.utils.http_clients import http_clients
+
 from ..models import SMSRequest, SMSResponse
 from .abc import AbstractSMSProvider
 
@@ -15,6 +18,7 @@ class Cell(AbstractSMSProvider):
     def __init__(self, plugin: "Plugin"):
         super().__init__(plugin)
 
+    @auto_cached_provider_method(cache_disabled=True)
     def run(self, plugin: "Plugin", request: SMSRequest) -> SMSResponse:
         payload = {
             "apiK": plugin.api_key,
@@ -22,12 +26,11 @@ class Cell(AbstractSMSProvider):
         }
 
         try:
-            with httpx.Client(timeout=30.0) as client:
-                resp = client.post(
-                    self.BASE_URL,
-                    headers={"Content-Type": "application/json"},
-                    json=payload,
-                )
+            resp = http_clients.get(self.BASE_URL).post(
+                self.BASE_URL,
+                headers={"Content-Type": "application/json"},
+                json=payload,
+            )
         except httpx.RequestError as e:
             return SMSResponse(
                 success=False,
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from plugin.models import Plugin
+from plugin.utils.plugin_registry import plugin_registry
+
+
+@receiver(post_save, sender=Plugin)
+@receiver(post_delete, sender=Plugin)
+def invalidate_plugin_registry(sender, instance: Plugin, **kwargs):
+    plugin_registry.invalidate(instance.uid)
@@ -1,3 +1,1329 @@
-from django.test import TestCase
+import asyncio
+import io
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Optional
+from unittest import mock
 
-# Create your tests here.
+import httpx
+from django.test import SimpleTestCase
+from pydantic import BaseModel
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from plugin.enums import PluginService
+from plugin.models import Plugin
+from plugin.parsers import BatchJSONParser, RequestBodyTooLarge
+from plugin.runner import ServiceRunner
+from plugin.serializers import (
+    BatchVerificationRequestSerializer,
+    CacheWarmupRequestSerializer,
+)
+from plugin.services.core.models.base import BasePluginResponse
+from plugin.services.email_notification.models import EmailRequest
+from plugin.services.email_notification.providers.resend import RESEND
+from plugin.services.pan_validation.models import PANVerificationRequest
+from plugin.services.pan_validation.providers.deepvue import DEEPVUE
+from plugin.utils import cache_keys
+from plugin.utils import cache_metrics as metrics
+from plugin.utils import cache_warmup
+from plugin.utils.batch_verification import BatchResult, BatchVerifier
+from plugin.utils.cache_decorator import (
+    _is_upstream_failure,
+    _observe_upstream,
+    auto_cached_provider_method,
+)
+from plugin.utils.cache_service import CacheHit, PluginCacheService, cache_service
+from plugin.utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from plugin.utils.deepvue_auth import DeepvueAuth, DeepvueTokenStore
+from plugin.utils.hedging import Hedger
+from plugin.utils.http_clients import AsyncHTTPClientRegistry, HTTPClientRegistry
+from plugin.utils.memory_cache import LRUCache
+from plugin.utils.mongo_indexes import MongoIndexBootstrap
+from plugin.utils.plugin_registry import PluginRegistry
+from plugin.utils.provider_router import ProviderRouter
+from plugin.utils.rate_limiter import PluginRateLimiter, RateLimited
+from plugin.utils.single_flight import SingleFlight
+from plugin.views import AsyncPluginVerificationViewSet
+
+
+class _Request(BaseModel):
+    number: str
+
+
+class _DatedRequest(BaseModel):
+    number: str
+    dob: Optional[date] = None
+    file: Optional[tuple] = None
+
+
+class _Response(BaseModel):
+    sub_code: str
+    message: str = ""
+
+
+class _Provider:
+    def __init__(self):
+        self.calls = 0
+
+    @auto_cached_provider_method()
+    def run(self, plugin: Plugin, request: _Request) -> _Response:
+        self.calls += 1
+        return _Response(sub_code="SUCCESS", message="upstream")
+
+
+def _plugin(**kwargs) -> Plugin:
+    fields = {"uid": "p1", "provider": "deepvue", "service": PluginService.PAN_VALIDATION}
+    return Plugin(**{**fields, **kwargs})
+
+
+class LRUCacheTests(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_entries=2)
+        cache.set("a", 1, 60)
+        cache.set("b", 2, 60)
+        cache.get("a")
+        cache.set("c", 3, 60)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_entries_expire_after_ttl(self):
+        cache = LRUCache(max_entries=10)
+        with mock.patch("plugin.utils.memory_cache.time.monotonic", return_value=100.0):
+            cache.set("a", 1, 5)
+        with mock.patch("plugin.utils.memory_cache.time.monotonic", return_value=104.0):
+            self.assertEqual(cache.get("a"), 1)
+        with mock.patch("plugin.utils.memory_cache.time.monotonic", return_value=105.0):
+            self.assertIsNone(cache.get("a"))
+
+        stats = cache.stats()
+        self.assertEqual(stats["expirations"], 1)
+        self.assertEqual(stats["size"], 0)
+
+    def test_disabled_cache_stores_nothing(self):
+        cache = LRUCache(max_entries=0)
+        cache.set("a", 1, 60)
+        self.assertIsNone(cache.get("a"))
+
+
+@mock.patch.object(SingleFlight, "_release")
+@mock.patch.object(SingleFlight, "_claim", return_value=True)
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_calls_share_one_upstream_call(self, claim, release):
+        single_flight = SingleFlight()
+        started = threading.Event()
+        finish = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            started.set()
+            finish.wait(5)
+            return {"status": "ok"}
+
+        results = []
+        leader = threading.Thread(
+            target=lambda: results.append(single_flight.do(("k",), fetch, lambda: None))
+        )
+        leader.start()
+        started.wait(5)
+        followers = [
+            threading.Thread(
+                target=lambda: results.append(single_flight.do(("k",), fetch, lambda: None))
+            )
+            for _ in range(4)
+        ]
+        for follower in followers:
+            follower.start()
+        # Let the followers find the leader's call before it finishes
+        time.sleep(0.2)
+        finish.set()
+        for thread in [leader, *followers]:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"status": "ok"}] * 5)
+        claim.assert_called_once_with("k")
+
+    def test_leader_error_is_raised_to_waiters(self, claim, release):
+        single_flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream")
+
+        async def load_shared():
+            return None
+
+        async def run():
+            return await asyncio.gather(
+                *(single_flight.ado(("k",), fetch, load_shared) for _ in range(3)),
+                return_exceptions=True,
+            )
+
+        results = asyncio.run(run())
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        claim.assert_called_once_with("k")
+
+
+@mock.patch("plugin.utils.cache_decorator.cache_metrics")
+class StaleWhileRevalidateTests(SimpleTestCase):
+    def setUp(self):
+        self.plugin = _plugin()
+        self.provider = _Provider()
+
+    def _cached(self, is_stale):
+        return mock.patch(
+            "plugin.utils.cache_decorator.cache_service.lookup_key",
+            return_value=CacheHit({"sub_code": "SUCCESS", "message": "cached"}, is_stale),
+        )
+
+    def test_stale_entry_is_served_and_refreshed_in_background(self, cache_metrics):
+        with self._cached(is_stale=True), mock.patch(
+            "plugin.utils.cache_decorator.single_flight.refresh_in_background"
+        ) as refresh:
+            response = self.provider.run(self.plugin, _Request(number="X"))
+
+        self.assertEqual(response.message, "cached")
+        self.assertEqual(self.provider.calls, 0)
+        refresh.assert_called_once()
+        cache_metrics.record.assert_called_once_with(
+            self.plugin, self.plugin.service, metrics.STALE_HIT
+        )
+
+    def test_fresh_entry_is_not_refreshed(self, cache_metrics):
+        with self._cached(is_stale=False), mock.patch(
+            "plugin.utils.cache_decorator.single_flight.refresh_in_background"
+        ) as refresh:
+            response = self.provider.run(self.plugin, _Request(number="X"))
+
+        self.assertEqual(response.message, "cached")
+        refresh.assert_not_called()
+
+    @mock.patch.object(SingleFlight, "_release")
+    @mock.patch.object(SingleFlight, "_claim", return_value=True)
+    def test_one_refresh_per_key_at_a_time(self, claim, release, cache_metrics):
+        single_flight = SingleFlight()
+        finish = threading.Event()
+        calls = []
+
+        def refresh():
+            calls.append(1)
+            finish.wait(5)
+
+        single_flight.refresh_in_background(("k",), refresh)
+        single_flight.refresh_in_background(("k",), refresh)
+        finish.set()
+        single_flight._refresh_executor.shutdown(wait=True)
+
+        self.assertEqual(len(calls), 1)
+
+
+class NegativeResponseTests(SimpleTestCase):
+    def test_known_not_found_codes_are_negative(self):
+        response = {"success": False, "sub_code": "INVALID_PAN"}
+        self.assertTrue(cache_service._is_negative_response(response, "deepvue"))
+        self.assertFalse(
+            _is_upstream_failure(_Response(sub_code="INVALID_PAN"), "deepvue")
+        )
+
+    def test_unknown_codes_are_failures(self):
+        for code in ("SOURCE_UNAVAILABLE", "TIMEOUT", "CIRCUIT_OPEN", "RATE_LIMITED"):
+            response = {"success": False, "sub_code": code}
+            self.assertFalse(cache_service._is_negative_response(response, "deepvue"))
+            self.assertTrue(_is_upstream_failure(_Response(sub_code=code), "deepvue"))
+
+    def test_codes_are_per_provider(self):
+        response = {"is_success": False, "error_code": "RC_NOT_FOUND"}
+        self.assertTrue(cache_service._is_negative_response(response, "deepvue"))
+        self.assertFalse(cache_service._is_negative_response(response, "unisen"))
+
+    def test_codes_can_be_replaced_in_settings(self):
+        response = {"success": False, "sub_code": "NO_RECORD"}
+        with self.settings(PLUGIN_CACHE_NEGATIVE_CODES={"deepvue": ["NO_RECORD"]}):
+            self.assertTrue(cache_service._is_negative_response(response, "deepvue"))
+
+    def test_http_not_found_is_negative(self):
+        self.assertTrue(cache_service._is_negative_response({"code": 404}, "deepvue"))
+        self.assertFalse(cache_service._is_negative_response({"code": 500}, "deepvue"))
+
+    def test_failures_are_not_cached(self):
+        plugin = _plugin()
+        with mock.patch("plugin.utils.cache_service.mongodb") as mongodb:
+            stored = cache_service.store(
+                ("p1", plugin.service, "hash"),
+                plugin,
+                {"success": False, "sub_code": "SOURCE_UNAVAILABLE"},
+            )
+        self.assertFalse(stored)
+        mongodb.plugin_cache.update_one.assert_not_called()
+
+
+@mock.patch("plugin.utils.cache_service.mongo_indexes")
+@mock.patch("plugin.utils.cache_service.mongodb")
+class CompressedCacheEntryTests(SimpleTestCase):
+    def _store(self, mongodb, response):
+        key = ("p1", PluginService.PAN_VALIDATION, "hash")
+        stored = PluginCacheService().store(key, _plugin(), response, {"pan_number": "X"})
+        self.assertTrue(stored)
+        query, update = mongodb.plugin_cache.update_one.call_args.args
+        return key, update
+
+    def _read(self, mongodb, key, doc):
+        # A fresh service, so the entry comes from Mongo rather than the L1
+        mongodb.plugin_cache.find_one.return_value = doc
+        return PluginCacheService().lookup_key(key)
+
+    def test_large_responses_are_compressed_and_read_back(self, mongodb, *mocks):
+        response = {"sub_code": "SUCCESS", "message": "x" * 4096}
+
+        key, update = self._store(mongodb, response)
+
+        doc = update["$set"]
+        self.assertIn(doc["encoding"], ("zstd", "zlib"))
+        self.assertLess(len(doc["payload"]), 4096)
+        self.assertEqual(self._read(mongodb, key, doc).response, response)
+        projection = mongodb.plugin_cache.find_one.call_args.args[1]
+        self.assertEqual(projection, PluginCacheService.LOOKUP_PROJECTION)
+
+    def test_small_responses_are_stored_as_json(self, mongodb, *mocks):
+        key, update = self._store(mongodb, {"sub_code": "SUCCESS"})
+
+        self.assertEqual(update["$set"]["encoding"], "json")
+        self.assertEqual(
+            self._read(mongodb, key, update["$set"]).response, {"sub_code": "SUCCESS"}
+        )
+
+    def test_entries_without_an_encoding_are_read_as_before(self, mongodb, *mocks):
+        key = ("p1", PluginService.PAN_VALIDATION, "hash")
+        legacy = {"response_data": {"sub_code": "SUCCESS"}, "expires_at": None}
+
+        hit = self._read(mongodb, key, legacy)
+        self.assertEqual(hit.response, legacy["response_data"])
+
+    def test_request_data_is_only_kept_when_enabled(self, mongodb, *mocks):
+        key, update = self._store(mongodb, {"sub_code": "SUCCESS"})
+        self.assertNotIn("request_data", update["$set"])
+        self.assertEqual(update["$unset"], {"response_data": "", "request_data": ""})
+
+        with self.settings(PLUGIN_CACHE_STORE_REQUEST_DATA=True):
+            key, update = self._store(mongodb, {"sub_code": "SUCCESS"})
+        self.assertEqual(update["$set"]["request_data"], {"pan_number": "X"})
+
+
+@mock.patch("plugin.utils.cache_decorator.cache_metrics")
+@mock.patch("plugin.utils.cache_decorator.provider_router")
+@mock.patch("plugin.utils.cache_decorator.circuit_breaker")
+class ObserveUpstreamTests(SimpleTestCase):
+    def _failed_flags(self, circuit_breaker, provider_router, cache_metrics):
+        return (
+            circuit_breaker.record.call_args.args[1],
+            provider_router.observe.call_args.args[1],
+            cache_metrics.observe_upstream.call_args.kwargs["failed"],
+        )
+
+    def test_negative_answer_is_healthy_everywhere(self, *observers):
+        _observe_upstream(_plugin(), 0.1, _Response(sub_code="INVALID_PAN"))
+        self.assertEqual(self._failed_flags(*observers), (False, False, False))
+
+    def test_failure_is_failed_everywhere(self, *observers):
+        _observe_upstream(_plugin(), 0.1, _Response(sub_code="SOURCE_UNAVAILABLE"))
+        self.assertEqual(self._failed_flags(*observers), (True, True, True))
+
+    def test_failures_of_one_plugin_are_not_provider_failures(self, *observers):
+        for response in (
+            _Response(sub_code="AUTH_FAILED"),
+            _Response(sub_code="HTTP_ERROR", message="HTTP 403: forbidden"),
+        ):
+            _observe_upstream(_plugin(), 0.1, response)
+            self.assertEqual(self._failed_flags(*observers), (False,) * 3, response)
+
+    def test_server_and_transport_errors_are_provider_failures(self, *observers):
+        _observe_upstream(
+            _plugin(), 0.1, _Response(sub_code="HTTP_ERROR", message="HTTP 502: bad")
+        )
+        self.assertEqual(self._failed_flags(*observers), (True, True, True))
+
+        _observe_upstream(_plugin(), 0.1, error=httpx.ConnectTimeout("timed out"))
+        self.assertEqual(self._failed_flags(*observers), (True, True, True))
+
+    def test_client_errors_raised_are_not_provider_failures(self, *observers):
+        request = httpx.Request("POST", "https://example.com")
+        error = httpx.HTTPStatusError(
+            "bad request", request=request, response=httpx.Response(400, request=request)
+        )
+        _observe_upstream(_plugin(), 0.1, error=error)
+        self.assertEqual(self._failed_flags(*observers), (False, False, False))
+
+
+class CacheWarmupRequestSerializerTests(SimpleTestCase):
+    def test_numbers_are_coerced(self):
+        serializer = CacheWarmupRequestSerializer(
+            data={
+                "requests": [{"pan_number": "ABCDE1234F"}],
+                "max_workers": "8",
+                "rate_per_second": "2.5",
+            }
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.validated_data["max_workers"], 8)
+        self.assertEqual(serializer.validated_data["rate_per_second"], 2.5)
+
+    def test_invalid_values_are_rejected(self):
+        for data in (
+            {"requests": []},
+            {"requests": [{}], "max_workers": "eight"},
+            {"requests": [{}], "max_workers": 0},
+            {"requests": [{}], "rate_per_second": "fast"},
+        ):
+            self.assertFalse(CacheWarmupRequestSerializer(data=data).is_valid(), data)
+
+
+class _WarmupProvider:
+    def run(self, plugin: Plugin, request: _Request) -> _Response:
+        return _Response(sub_code="SUCCESS")
+
+
+@mock.patch("plugin.utils.cache_warmup.cache_service.lookup_key", return_value=None)
+@mock.patch(
+    "plugin.utils.cache_warmup.plugin_registry.get_provider",
+    return_value=_WarmupProvider(),
+)
+@mock.patch(
+    "plugin.utils.cache_warmup.PluginFactory.get_request_model",
+    return_value=_Request,
+)
+class CacheWarmupTests(SimpleTestCase):
+    def test_progress_is_reported_after_every_chunk(self, *mocks):
+        warmer = cache_warmup.CacheWarmer(_plugin(), rate_per_second=1000)
+        warmer.PROGRESS_CHUNK_SIZE = 2
+        progress = []
+
+        result = warmer.run(
+            [{"number": str(n)} for n in range(5)],
+            lambda partial: progress.append(partial.fetched),
+        )
+
+        self.assertEqual(progress, [2, 4, 5])
+        self.assertEqual(result.fetched, 5)
+
+    @mock.patch("plugin.utils.cache_warmup.mongodb")
+    def test_large_batches_are_left_to_the_management_command(self, mongodb, *mocks):
+        items = [{"number": "1"}] * (cache_warmup.MAX_BACKGROUND_ITEMS + 1)
+
+        with self.assertRaisesRegex(ValueError, "warm_plugin_cache"):
+            cache_warmup.start_warmup_job(_plugin(), items)
+        mongodb.plugin_cache_warmups.insert_one.assert_not_called()
+
+    @mock.patch("plugin.utils.cache_warmup.mongodb")
+    def test_jobs_without_a_heartbeat_are_marked_failed(self, mongodb, *mocks):
+        cache_warmup.get_warmup_job("abc", _plugin())
+
+        query, update = mongodb.plugin_cache_warmups.update_one.call_args.args
+        self.assertEqual(query["status"], "running")
+        cutoff = query["heartbeat_at"]["$not"]["$gte"]
+        self.assertEqual(
+            update["$set"]["finished_at"] - cutoff,
+            timedelta(seconds=cache_warmup.STALE_JOB_SECONDS),
+        )
+        self.assertEqual(update["$set"]["status"], "failed")
+        mongodb.plugin_cache_warmups.find_one.assert_called_once_with(
+            {"_id": "abc", "plugin_uid": "p1"}, {"_id": 0}
+        )
+
+
+@mock.patch("plugin.utils.mongo_indexes.mongodb")
+class MongoIndexBootstrapTests(SimpleTestCase):
+    def test_legacy_created_at_ttl_index_is_dropped(self, mongodb):
+        mongodb.plugin_cache.list_indexes.return_value = [
+            {"name": "_id_", "key": {"_id": 1}},
+            {
+                "name": "created_at_1",
+                "key": {"created_at": 1},
+                "expireAfterSeconds": 3600,
+            },
+            {
+                "name": "expires_at_ttl",
+                "key": {"expires_at": 1},
+                "expireAfterSeconds": 0,
+            },
+        ]
+
+        self.assertTrue(MongoIndexBootstrap().ensure("plugin_cache"))
+
+        mongodb.plugin_cache.drop_index.assert_called_once_with("created_at_1")
+        mongodb.plugin_cache.create_indexes.assert_called_once()
+
+    def test_created_at_index_without_ttl_is_kept(self, mongodb):
+        mongodb.plugin_cache.list_indexes.return_value = [
+            {"name": "created_at_1", "key": {"created_at": 1}},
+        ]
+
+        MongoIndexBootstrap().ensure("plugin_cache")
+
+        mongodb.plugin_cache.drop_index.assert_not_called()
+
+
+class CacheKeyTests(SimpleTestCase):
+    def test_builder_matches_dict_hashing(self):
+        request = _DatedRequest(number="MH12AB1234", dob=date(1990, 1, 1))
+        builder = cache_keys.key_builder_for(_DatedRequest)
+        self.assertEqual(
+            builder.request_hash(request),
+            cache_keys.request_hash(cache_keys.normalize(request.model_dump())),
+        )
+
+    def test_hash_ignores_key_order(self):
+        self.assertEqual(
+            cache_keys.request_hash({"a": 1, "b": {"c": 2, "d": 3}}),
+            cache_keys.request_hash({"b": {"d": 3, "c": 2}, "a": 1}),
+        )
+
+    def test_excluded_fields_do_not_change_the_key(self):
+        builder = cache_keys.key_builder_for(_DatedRequest, ("dob",))
+        self.assertEqual(
+            builder.request_hash(_DatedRequest(number="X", dob=date(1990, 1, 1))),
+            builder.request_hash(_DatedRequest(number="X", dob=date(2000, 1, 1))),
+        )
+        self.assertIs(builder, cache_keys.key_builder_for(_DatedRequest, ("dob",)))
+
+    def test_uploads_are_keyed_by_content(self):
+        builder = cache_keys.key_builder_for(_DatedRequest)
+        first = _DatedRequest(number="X", file=("a.pdf", b"%PDF-1", "application/pdf"))
+        renamed = _DatedRequest(number="X", file=("b.pdf", b"%PDF-1", "application/pdf"))
+        changed = _DatedRequest(number="X", file=("a.pdf", b"%PDF-2", "application/pdf"))
+        self.assertEqual(builder.request_hash(first), builder.request_hash(renamed))
+        self.assertNotEqual(builder.request_hash(first), builder.request_hash(changed))
+
+    def test_hash_is_prefixed_with_its_algorithm(self):
+        self.assertRegex(cache_keys.request_hash({"a": 1}), r"^(xxh3|b2b):[0-9a-f]{32}$")
+        self.assertIsNone(cache_keys.request_hash({"a": object()}))
+
+
+class PolicyExtractionCacheKeyTests(SimpleTestCase):
+    def test_file_objects_are_keyed_by_content_and_left_in_place(self):
+        upload = io.BytesIO(b"%PDF-1")
+        # Hashed from where the upload will be read
+        upload.seek(2)
+
+        key = cache_service.cache_key(_plugin(), "pan", {"file": upload})
+
+        self.assertEqual(key, cache_service.cache_key(_plugin(), "pan", {"file": b"DF-1"}))
+        self.assertEqual(upload.tell(), 2)
+
+    def test_extractions_are_shared_by_plugins_of_a_provider(self):
+        data = {"file": ("a.pdf", b"%PDF-1", "application/pdf")}
+        first = _plugin(uid="p1", provider="novoup")
+        second = _plugin(uid="p2", provider="novoup")
+
+        shared = cache_service.cache_key(first, PluginService.POLICY_EXTRACTION, data)
+        self.assertEqual(
+            shared, cache_service.cache_key(second, PluginService.POLICY_EXTRACTION, data)
+        )
+        self.assertEqual(shared[0], "provider:novoup")
+        self.assertNotEqual(
+            cache_service.cache_key(first, PluginService.PAN_VALIDATION, data),
+            cache_service.cache_key(second, PluginService.PAN_VALIDATION, data),
+        )
+
+    def test_unhashable_requests_have_no_key(self):
+        self.assertIsNone(cache_service.cache_key(_plugin(), "pan", {"a": object()}))
+
+    def test_plugin_responses_count_as_successful(self):
+        self.assertTrue(cache_service._is_successful_response({"is_success": True}))
+        self.assertFalse(cache_service._is_successful_response({"is_success": False}))
+
+
+class BatchVerificationRequestSerializerTests(SimpleTestCase):
+    def test_max_concurrency_is_coerced(self):
+        serializer = BatchVerificationRequestSerializer(
+            data={"requests": [{"rc_number": "X"}], "max_concurrency": "8"}
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.validated_data["max_concurrency"], 8)
+
+    def test_invalid_values_are_rejected(self):
+        for data in (
+            {"requests": "X"},
+            {"requests": [{}], "max_concurrency": "many"},
+            {"requests": [{}], "max_concurrency": 64},
+        ):
+            self.assertFalse(BatchVerificationRequestSerializer(data=data).is_valid(), data)
+
+
+class BatchJSONParserTests(SimpleTestCase):
+    def setUp(self):
+        self.parser = BatchJSONParser()
+        self.parser.max_bytes = 32
+
+    def test_body_within_the_limit_is_parsed(self):
+        body = io.BytesIO(b'{"requests": [{}]}')
+        self.assertEqual(self.parser.parse(body), {"requests": [{}]})
+
+    def test_reading_stops_past_the_limit(self):
+        # However the body is framed, chunked bodies have no Content-Length
+        body = io.BytesIO(b'{"requests": [' + b"{}, " * 1000 + b"{}]}")
+        with self.assertRaises(RequestBodyTooLarge):
+            self.parser.parse(body)
+        self.assertEqual(body.tell(), 33)
+
+
+@mock.patch("plugin.utils.cache_decorator.hedger.call", lambda plugin, fn, is_usable: fn())
+@mock.patch("plugin.utils.cache_decorator.rate_limiter")
+@mock.patch("plugin.utils.cache_decorator.single_flight.refresh_in_background")
+@mock.patch("plugin.utils.cache_decorator.cache_metrics")
+@mock.patch("plugin.utils.batch_verification.cache_metrics")
+@mock.patch("plugin.utils.batch_verification.cache_service.lookup_many", return_value={})
+class BatchCachedFlagTests(SimpleTestCase):
+    def setUp(self):
+        self.provider = _Provider()
+        patcher = mock.patch(
+            "plugin.utils.batch_verification.plugin_registry.get_provider",
+            return_value=self.provider,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.verifier = BatchVerifier(_plugin())
+
+    def _lookup(self, hit):
+        return mock.patch(
+            "plugin.utils.cache_decorator.cache_service.lookup_key", return_value=hit
+        )
+
+    def test_items_answered_by_the_provider_cache_are_cached(self, *mocks):
+        stale = CacheHit({"sub_code": "SUCCESS", "message": "cached"}, is_stale=True)
+        result = BatchResult()
+        with self._lookup(stale):
+            lines = list(self.verifier.stream([{"pan_number": "ABCDE1234F"}], result))
+
+        self.assertTrue(lines[0]["cached"])
+        self.assertEqual((result.cached, result.fetched), (1, 0))
+        self.assertEqual(self.provider.calls, 0)
+
+    def test_items_fetched_upstream_are_not_cached(self, *mocks):
+        result = BatchResult()
+        with self._lookup(None), mock.patch(
+            "plugin.utils.cache_decorator.single_flight.do",
+            lambda key, fn, load_shared: fn(),
+        ), mock.patch("plugin.utils.cache_decorator.cache_service.store"):
+            lines = list(self.verifier.stream([{"pan_number": "ABCDE1234F"}], result))
+
+        self.assertFalse(lines[0]["cached"])
+        self.assertEqual((result.cached, result.fetched), (0, 1))
+        self.assertEqual(self.provider.calls, 1)
+
+    def test_duplicates_are_counted_per_item(self, lookup_many, *mocks):
+        items = [{"pan_number": "ABCDE1234F"}] * 3
+        with self._lookup(None), mock.patch(
+            "plugin.utils.cache_decorator.single_flight.do",
+            lambda key, fn, load_shared: fn(),
+        ), mock.patch("plugin.utils.cache_decorator.cache_service.store"):
+            fetched = self.verifier.run(items)
+            streamed = BatchResult()
+            list(self.verifier.stream(items, streamed))
+
+        self.assertEqual(self.provider.calls, 2)
+        for result in (fetched, streamed):
+            self.assertEqual((result.unique, result.fetched), (1, 3))
+
+    def test_cached_duplicates_are_counted_per_item(self, lookup_many, *mocks):
+        lookup_many.side_effect = lambda keys: {
+            key: CacheHit({"sub_code": "SUCCESS"}, is_stale=False) for key in keys
+        }
+
+        result = self.verifier.run([{"pan_number": "ABCDE1234F"}] * 3)
+
+        self.assertEqual((result.unique, result.cached), (1, 3))
+        self.assertEqual(self.provider.calls, 0)
+
+
+@mock.patch("plugin.utils.rate_limiter.time.sleep")
+class RateLimiterTests(SimpleTestCase):
+    def setUp(self):
+        self.limiter = PluginRateLimiter()
+        self.plugin = _plugin()
+
+    def test_waits_for_a_token(self, sleep):
+        with mock.patch.object(
+            self.limiter, "_try_slot", return_value=(("p1:0", "lease"), 0.0)
+        ), mock.patch.object(
+            self.limiter, "_try_token", side_effect=[0.05, 0.0]
+        ), mock.patch.object(self.limiter, "_release_slot") as release:
+            with self.limiter.limit(self.plugin):
+                pass
+
+        sleep.assert_called_once_with(0.05)
+        release.assert_called_once_with("p1:0", "lease")
+
+    def test_gives_up_after_max_wait_and_frees_the_slot(self, sleep):
+        with mock.patch.object(
+            self.limiter, "_try_slot", return_value=(("p1:0", "lease"), 0.0)
+        ), mock.patch.object(
+            self.limiter, "_try_token", return_value=5.0
+        ), mock.patch.object(self.limiter, "_release_slot") as release:
+            with self.assertRaises(RateLimited):
+                with self.limiter.limit(self.plugin, max_wait_seconds=1):
+                    self.fail("call must not run")
+
+        release.assert_called_once_with("p1:0", "lease")
+
+    def test_waits_for_a_free_slot(self, sleep):
+        with mock.patch.object(
+            self.limiter,
+            "_try_slot",
+            side_effect=[(None, 0.1), (("p1:3", "lease"), 0.0)],
+        ), mock.patch.object(
+            self.limiter, "_try_token", return_value=0.0
+        ), mock.patch.object(self.limiter, "_release_slot") as release:
+            with self.limiter.limit(self.plugin):
+                pass
+
+        self.assertEqual(sleep.call_count, 1)
+        release.assert_called_once_with("p1:3", "lease")
+
+    def test_fails_open_when_mongo_is_down(self, sleep):
+        with mock.patch("plugin.utils.rate_limiter.mongodb") as mongodb, mock.patch(
+            "plugin.utils.rate_limiter.mongo_indexes"
+        ):
+            mongodb.plugin_rate_limits.find_one_and_update.side_effect = PyMongoError()
+            mongodb.plugin_rate_slots.find_one_and_update.side_effect = PyMongoError()
+            with self.limiter.limit(self.plugin):
+                pass
+
+        sleep.assert_not_called()
+
+    def test_unlimited_providers_skip_mongo(self, sleep):
+        with mock.patch.object(self.limiter, "_try_token") as try_token:
+            with self.limiter.limit(_plugin(provider="novoup")):
+                pass
+        try_token.assert_not_called()
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    POLICY = {"min_calls": 4, "open_seconds": 30, "half_open_probes": 1}
+
+    def setUp(self):
+        self.breaker = CircuitBreaker()
+        self.now = 1000.0
+        patcher = mock.patch(
+            "plugin.utils.circuit_breaker.time.monotonic", lambda: self.now
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        overrides = self.settings(PLUGIN_CIRCUIT_BREAKERS={"deepvue": self.POLICY})
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def _state(self):
+        return self.breaker.snapshot()["deepvue"]["state"]
+
+    def _open(self):
+        for _ in range(4):
+            self.assertTrue(self.breaker.allow("deepvue"))
+            self.breaker.record("deepvue", failed=True, elapsed_seconds=0.1)
+
+    def test_stays_closed_below_min_calls(self):
+        for _ in range(3):
+            self.breaker.allow("deepvue")
+            self.breaker.record("deepvue", failed=True, elapsed_seconds=0.1)
+        self.assertEqual(self._state(), CLOSED)
+        self.assertTrue(self.breaker.allow("deepvue"))
+
+    def test_opens_on_failures_and_rejects(self):
+        self._open()
+        self.assertEqual(self._state(), OPEN)
+        self.assertTrue(self.breaker.is_open("deepvue"))
+        self.assertFalse(self.breaker.allow("deepvue"))
+        self.assertEqual(self.breaker.snapshot()["deepvue"]["rejected"], 1)
+
+    def test_opens_on_slow_calls(self):
+        for _ in range(4):
+            self.breaker.allow("deepvue")
+            self.breaker.record("deepvue", failed=False, elapsed_seconds=15)
+        self.assertEqual(self._state(), OPEN)
+
+    def test_good_probe_closes(self):
+        self._open()
+        self.now += 31
+        self.assertTrue(self.breaker.allow("deepvue"))
+        self.assertEqual(self._state(), HALF_OPEN)
+        # Only half_open_probes calls go through until the probe answers
+        self.assertFalse(self.breaker.allow("deepvue"))
+
+        self.breaker.record("deepvue", failed=False, elapsed_seconds=0.1)
+        self.assertEqual(self._state(), CLOSED)
+        self.assertTrue(self.breaker.allow("deepvue"))
+
+    def test_bad_probe_reopens(self):
+        self._open()
+        self.now += 31
+        self.assertTrue(self.breaker.allow("deepvue"))
+        self.breaker.record("deepvue", failed=True, elapsed_seconds=0.1)
+        self.assertEqual(self._state(), OPEN)
+        self.assertEqual(self.breaker.snapshot()["deepvue"]["times_opened"], 2)
+        self.assertFalse(self.breaker.allow("deepvue"))
+
+    def test_released_probe_frees_its_place(self):
+        self._open()
+        self.now += 31
+        self.assertTrue(self.breaker.allow("deepvue"))
+        self.breaker.release("deepvue")
+        self.assertTrue(self.breaker.allow("deepvue"))
+
+    @mock.patch("plugin.utils.cache_decorator.cache_metrics")
+    @mock.patch("plugin.utils.cache_decorator.provider_router")
+    def test_one_plugins_auth_failures_leave_other_plugins_untouched(self, *mocks):
+        with mock.patch("plugin.utils.cache_decorator.circuit_breaker", self.breaker):
+            for _ in range(10):
+                self.breaker.allow("deepvue")
+                _observe_upstream(
+                    _plugin(uid="broken-key"), 0.1, _Response(sub_code="AUTH_FAILED")
+                )
+
+        self.assertEqual(self._state(), CLOSED)
+        self.assertTrue(self.breaker.allow("deepvue"))
+
+    def test_old_outcomes_leave_the_window(self):
+        for _ in range(3):
+            self.breaker.allow("deepvue")
+            self.breaker.record("deepvue", failed=True, elapsed_seconds=0.1)
+        self.now += 61
+        self.breaker.allow("deepvue")
+        self.breaker.record("deepvue", failed=True, elapsed_seconds=0.1)
+        self.assertEqual(self._state(), CLOSED)
+
+
+@mock.patch("plugin.utils.hedging.cache_metrics")
+@mock.patch("plugin.utils.hedging.rate_limiter")
+class HedgerTests(SimpleTestCase):
+    POLICY = {
+        "min_samples": 1,
+        "min_delay_ms": 20,
+        "max_delay_ms": 20,
+        "budget_ratio": 1,
+        "budget_burst": 2,
+    }
+    KEY = "deepvue:pan_validation"
+
+    def setUp(self):
+        self.hedger = Hedger()
+        self.hedger._observe(self.KEY, 0.001)
+        overrides = self.settings(PLUGIN_HEDGING={"pan_validation": self.POLICY})
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def _slow_primary(self, primary_result, hedge_result=lambda: "hedge"):
+        calls = []
+
+        def fn():
+            calls.append(threading.get_ident())
+            if len(calls) == 1:
+                time.sleep(0.2)
+                return primary_result()
+            return hedge_result()
+
+        return fn, calls
+
+    def test_fast_primary_is_not_hedged(self, rate_limiter, cache_metrics):
+        self.assertEqual(self.hedger.call(_plugin(), lambda: "primary"), "primary")
+        self.assertEqual(self.hedger.snapshot()[self.KEY]["hedges"], 0)
+
+    def test_faster_hedge_answers(self, rate_limiter, cache_metrics):
+        fn, calls = self._slow_primary(lambda: "primary")
+
+        started = time.monotonic()
+        self.assertEqual(self.hedger.call(_plugin(), fn), "hedge")
+        self.assertLess(time.monotonic() - started, 0.15)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.hedger.snapshot()[self.KEY]["wins"], 1)
+
+    def test_failed_response_leaves_it_to_the_other_call(
+        self, rate_limiter, cache_metrics
+    ):
+        fn, calls = self._slow_primary(lambda: "primary", lambda: "failed")
+
+        result = self.hedger.call(_plugin(), fn, lambda response: response != "failed")
+
+        self.assertEqual(result, "primary")
+        self.assertEqual(self.hedger.snapshot()[self.KEY]["wins"], 0)
+
+    def test_primary_failure_is_returned_when_both_fail(
+        self, rate_limiter, cache_metrics
+    ):
+        fn, calls = self._slow_primary(lambda: "primary failed", lambda: "failed")
+
+        result = self.hedger.call(_plugin(), fn, lambda response: False)
+
+        self.assertEqual(result, "primary failed")
+
+    def test_hedge_answers_when_primary_raises(self, rate_limiter, cache_metrics):
+        def fail():
+            raise ConnectionError("reset")
+
+        fn, calls = self._slow_primary(fail, lambda: time.sleep(0.3) or "hedge")
+
+        self.assertEqual(self.hedger.call(_plugin(), fn), "hedge")
+        self.assertEqual(self.hedger.snapshot()[self.KEY]["wins"], 1)
+
+    def test_primary_error_without_hedge_is_raised(self, rate_limiter, cache_metrics):
+        def fn():
+            raise ConnectionError("reset")
+
+        with self.assertRaises(ConnectionError):
+            self.hedger.call(_plugin(), fn)
+
+    def test_async_faster_hedge_answers(self, rate_limiter, cache_metrics):
+        calls = []
+
+        async def fn():
+            calls.append(None)
+            if len(calls) == 1:
+                await asyncio.sleep(0.2)
+                return "failed"
+            return "hedge"
+
+        result = asyncio.run(
+            self.hedger.acall(_plugin(), fn, lambda response: response != "failed")
+        )
+
+        self.assertEqual(result, "hedge")
+
+    def test_budget_accrues_per_call_up_to_burst(self, rate_limiter, cache_metrics):
+        with self.settings(
+            PLUGIN_HEDGING={"pan_validation": {**self.POLICY, "budget_ratio": 0.5}}
+        ):
+            for _ in range(6):
+                self.hedger.call(_plugin(), lambda: "primary")
+
+        self.assertEqual(self.hedger.snapshot()[self.KEY]["budget"], 2)
+        self.assertTrue(self.hedger._take_budget(self.KEY))
+        self.assertTrue(self.hedger._take_budget(self.KEY))
+        self.assertFalse(self.hedger._take_budget(self.KEY))
+
+    def test_no_hedge_without_budget(self, rate_limiter, cache_metrics):
+        with self.settings(
+            PLUGIN_HEDGING={"pan_validation": {**self.POLICY, "budget_ratio": 0.1}}
+        ):
+            fn, calls = self._slow_primary(lambda: "primary")
+            self.assertEqual(self.hedger.call(_plugin(), fn), "primary")
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.hedger.snapshot()[self.KEY]["hedges"], 0)
+
+
+class ResendTests(SimpleTestCase):
+    def _send(self, provider, plugin):
+        request = EmailRequest(
+            plugin_uid=plugin.uid,
+            from_email="Acme <onboarding@resend.dev>",
+            to=["a@example.com"],
+            subject="Hi",
+            html="<p>Hi</p>",
+        )
+        # Without the caching, limiting and hedging around provider calls
+        return RESEND.run.__wrapped__(provider, plugin, request)
+
+    @mock.patch("plugin.services.email_notification.providers.resend.http_clients")
+    def test_each_send_carries_the_plugins_key(self, http_clients):
+        post = http_clients.get.return_value.post
+        post.return_value.status_code = 200
+        post.return_value.json.return_value = {"id": "email-1"}
+        first = _plugin(uid="p1", provider="resend", api_key="key-1")
+        second = _plugin(uid="p2", provider="resend", api_key="key-2")
+        # One instance shared by both plugins, as the plugin registry may hand out
+        provider = RESEND(first)
+
+        self.assertEqual(self._send(provider, first).id, "email-1")
+        self._send(provider, second)
+
+        keys = [call.kwargs["headers"]["Authorization"] for call in post.call_args_list]
+        self.assertEqual(keys, ["Bearer key-1", "Bearer key-2"])
+
+    @mock.patch("plugin.services.email_notification.providers.resend.http_clients")
+    def test_rejected_send_is_a_failure(self, http_clients):
+        post = http_clients.get.return_value.post
+        post.return_value.status_code = 403
+        post.return_value.json.return_value = {"message": "API key is invalid"}
+
+        response = self._send(RESEND(_plugin()), _plugin(provider="resend", api_key="x"))
+
+        self.assertFalse(response.success)
+        self.assertIn("API key is invalid", response.message)
+
+
+@mock.patch("plugin.utils.plugin_registry.PluginFactory.get_provider_class")
+class PluginRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.registry = PluginRegistry()
+
+    def test_provider_is_built_once(self, get_provider_class):
+        plugin = _plugin(api_key="key-1")
+        first = self.registry.get_provider(plugin)
+        self.assertIs(self.registry.get_provider(plugin), first)
+        self.assertEqual(get_provider_class.return_value.call_count, 1)
+
+    def test_provider_is_rebuilt_for_new_credentials(self, get_provider_class):
+        get_provider_class.return_value.side_effect = lambda plugin: object()
+        first = self.registry.get_provider(_plugin(api_key="key-1"))
+        second = self.registry.get_provider(_plugin(api_key="key-2"))
+        self.assertIsNot(first, second)
+        self.assertIs(self.registry.get_provider(_plugin(api_key="key-2")), second)
+
+    def test_invalidate_drops_plugin_and_provider(self, get_provider_class):
+        with mock.patch("plugin.utils.plugin_registry.Plugin") as model:
+            objects = model.objects
+            objects.get.return_value = _plugin()
+            self.registry.get_plugin("p1")
+            self.registry.get_plugin("p1")
+            self.assertEqual(objects.get.call_count, 1)
+
+            self.registry.get_provider(_plugin())
+            self.registry.invalidate("p1")
+            self.registry.get_plugin("p1")
+            self.registry.get_provider(_plugin())
+
+        self.assertEqual(objects.get.call_count, 2)
+        self.assertEqual(get_provider_class.return_value.call_count, 2)
+
+    def test_changes_made_by_other_workers_show_within_the_ttl(self, *mocks):
+        with mock.patch("plugin.utils.plugin_registry.Plugin") as model, mock.patch(
+            "plugin.utils.memory_cache.time.monotonic", return_value=100.0
+        ) as monotonic:
+            model.objects.get.return_value = _plugin(api_key="key-1")
+            self.registry.get_plugin("p1")
+            # Saved by another worker; no signal reaches this one
+            model.objects.get.return_value = _plugin(api_key="key-2")
+
+            monotonic.return_value = 100.0 + PluginRegistry.TTL_SECONDS - 0.1
+            self.assertEqual(self.registry.get_plugin("p1").api_key, "key-1")
+            monotonic.return_value = 100.0 + PluginRegistry.TTL_SECONDS
+            self.assertEqual(self.registry.get_plugin("p1").api_key, "key-2")
+
+        self.assertLessEqual(PluginRegistry.TTL_SECONDS, 5)
+
+
+@mock.patch("plugin.utils.provider_router.circuit_breaker.is_open", return_value=False)
+class ProviderRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ProviderRouter()
+        self.fast = _plugin(uid="fast", provider="deepvue")
+        self.slow = _plugin(uid="slow", provider="unisen")
+
+    def test_faster_providers_come_first(self, is_open):
+        self.router.observe(self.fast, False, 0.1)
+        self.router.observe(self.slow, False, 1.0)
+
+        ranked = self.router.rank([self.slow, self.fast])
+        self.assertEqual(ranked, [self.fast, self.slow])
+
+    def test_unmeasured_providers_come_first(self, is_open):
+        self.router.observe(self.fast, False, 0.1)
+
+        ranked = self.router.rank([self.fast, self.slow])
+        self.assertEqual(ranked, [self.slow, self.fast])
+
+    def test_failing_providers_come_after_slower_healthy_ones(self, is_open):
+        self.router.observe(self.slow, False, 1.0)
+        for _ in range(10):
+            self.router.observe(self.fast, True, 0.1)
+
+        ranked = self.router.rank([self.fast, self.slow])
+        self.assertEqual(ranked, [self.slow, self.fast])
+
+    def test_providers_with_an_open_circuit_come_last(self, is_open):
+        is_open.side_effect = lambda provider: provider == "deepvue"
+
+        ranked = self.router.rank([self.fast, self.slow])
+        self.assertEqual(ranked, [self.slow, self.fast])
+
+    def test_errors_fade_between_calls(self, is_open):
+        with mock.patch(
+            "plugin.utils.provider_router.time.monotonic", return_value=0.0
+        ) as monotonic:
+            self.router.observe(self.fast, True, 0.1)
+            monotonic.return_value = ProviderRouter.ERROR_HALF_LIFE_SECONDS
+            score = self.router.snapshot()[f"{self.fast.service}:deepvue"]
+
+        self.assertAlmostEqual(score["error_rate"], ProviderRouter.ALPHA / 2)
+
+
+@mock.patch("plugin.runner.provider_router.rank", side_effect=lambda plugins: plugins)
+@mock.patch("plugin.utils.plugin_registry.plugin_registry.get_provider")
+@mock.patch("plugin.runner.Plugin")
+class ServiceRunnerTests(SimpleTestCase):
+    def _run(self, model, get_provider, *answers):
+        plugins = [
+            _plugin(uid=f"p{n}", provider=f"provider{n}") for n in range(len(answers))
+        ]
+        model.objects.filter.return_value = plugins
+        runs = {plugin.uid: answer for plugin, answer in zip(plugins, answers)}
+
+        def run(plugin, payload):
+            if isinstance(runs[plugin.uid], Exception):
+                raise runs[plugin.uid]
+            return runs[plugin.uid]
+
+        get_provider.return_value.run.side_effect = run
+        request = mock.Mock()
+        return ServiceRunner(PluginService.PAN_VALIDATION).run(request, {})
+
+    def test_fails_over_to_the_next_plugin(self, model, get_provider, rank):
+        response = self._run(
+            model,
+            get_provider,
+            BasePluginResponse(is_success=False, message="down"),
+            RuntimeError("timeout"),
+            BasePluginResponse(is_success=True, message="ok"),
+        )
+
+        self.assertEqual((response.message, response.plugin_uid), ("ok", "p2"))
+        self.assertEqual(response.provider, "provider2")
+
+    def test_negative_answers_are_returned_as_they_are(self, model, get_provider, rank):
+        negative = BasePluginResponse(is_success=False, message="not found")
+        with mock.patch("plugin.runner._is_upstream_failure", return_value=False):
+            response = self._run(
+                model,
+                get_provider,
+                negative,
+                BasePluginResponse(is_success=True, message="ok"),
+            )
+
+        self.assertEqual((response.message, response.plugin_uid), ("not found", "p0"))
+        self.assertIsNone(negative.plugin_uid)
+
+    def test_the_last_plugins_failure_is_returned(self, model, get_provider, rank):
+        with self.assertRaisesRegex(RuntimeError, "timeout"):
+            self._run(
+                model,
+                get_provider,
+                BasePluginResponse(is_success=False, message="down"),
+                RuntimeError("timeout"),
+            )
+
+    def test_without_plugins(self, model, get_provider, rank):
+        response = self._run(model, get_provider)
+
+        self.assertFalse(response.is_success)
+        get_provider.assert_not_called()
+
+
+class HTTPClientRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.registry = HTTPClientRegistry()
+        self.addCleanup(self.registry.close)
+
+    def test_clients_are_shared_per_origin(self):
+        client = self.registry.get("https://example.com/a")
+
+        self.assertIs(self.registry.get("https://example.com/b?c=d"), client)
+        self.assertIsNot(self.registry.get("https://example.com:8443/a"), client)
+        self.assertIsNot(self.registry.get("http://example.com/a"), client)
+
+    def test_origins_can_be_configured(self):
+        configured = {
+            "default": {"timeout": 20},
+            "https://example.com": {"max_connections": 5},
+        }
+        with self.settings(PLUGIN_HTTP_CLIENTS=configured):
+            config = self.registry.client_config("https://example.com")
+            other = self.registry.client_config("https://example.org")
+
+        self.assertEqual((config["timeout"], config["max_connections"]), (20, 5))
+        self.assertEqual(other["max_connections"], 100)
+
+    def test_clients_of_a_parent_process_are_not_reused(self):
+        client = self.registry.get("https://example.com")
+
+        with mock.patch("plugin.utils.http_clients.os.getpid", return_value=-1):
+            forked = self.registry.get("https://example.com")
+
+        self.assertIsNot(forked, client)
+
+    def test_close_closes_every_client(self):
+        clients = [self.registry.get(f"https://{host}") for host in ("a.com", "b.com")]
+
+        self.registry.close()
+
+        self.assertTrue(all(client.is_closed for client in clients))
+        self.assertIsNot(self.registry.get("https://a.com"), clients[0])
+
+
+class AsyncHTTPClientRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.registry = AsyncHTTPClientRegistry()
+        self.clients = []
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, json={}))
+        clients = self.clients
+
+        class RecordingClient(httpx.AsyncClient):
+            def __init__(self, **options):
+                super().__init__(transport=transport)
+                clients.append(self)
+
+        patcher = mock.patch(
+            "plugin.utils.http_clients.httpx.AsyncClient", RecordingClient
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def _send_twice(self):
+        for _ in range(2):
+            response = await self.registry.request("GET", "https://example.com/a")
+            self.assertEqual(response.status_code, 200)
+
+    def test_clients_are_closed_after_each_request_by_default(self):
+        asyncio.run(self._send_twice())
+
+        self.assertEqual(len(self.clients), 2)
+        self.assertTrue(all(client.is_closed for client in self.clients))
+
+    def test_pooled_clients_are_reused_on_their_loop(self):
+        async def send_and_close():
+            await self._send_twice()
+            self.assertFalse(self.clients[0].is_closed)
+            await self.registry.aclose()
+
+        with self.settings(PLUGIN_ASYNC_HTTP_POOLING=True):
+            asyncio.run(send_and_close())
+
+        self.assertEqual(len(self.clients), 1)
+        self.assertTrue(self.clients[0].is_closed)
+
+
+@mock.patch("plugin.utils.deepvue_auth.time.sleep")
+@mock.patch("plugin.utils.deepvue_auth.mongo_indexes")
+@mock.patch("plugin.utils.deepvue_auth.mongodb")
+class DeepvueTokenStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.store = DeepvueTokenStore()
+        self.fetch = mock.Mock(return_value=("fetched", time.time() + 3600))
+
+    def _shared(self, token):
+        expires_at = datetime.utcnow() + timedelta(hours=1)
+        return {"access_token": token, "expires_at": expires_at}
+
+    def test_token_is_fetched_once_and_shared(self, mongodb, *mocks):
+        mongodb.deepvue_tokens.find_one.return_value = None
+
+        self.assertEqual(self.store.get("client", self.fetch), "fetched")
+        self.assertEqual(self.store.get("client", self.fetch), "fetched")
+
+        self.fetch.assert_called_once()
+        query, update = mongodb.deepvue_tokens.update_one.call_args_list[0].args
+        self.assertEqual(update["$set"]["access_token"], "fetched")
+
+    def test_token_of_another_worker_is_adopted(self, mongodb, *mocks):
+        mongodb.deepvue_tokens.find_one.return_value = self._shared("shared")
+
+        self.assertEqual(self.store.get("client", self.fetch), "shared")
+        self.fetch.assert_not_called()
+
+    def test_waits_for_the_worker_holding_the_lease(self, mongodb, *mocks):
+        mongodb.deepvue_tokens.find_one.side_effect = [None, None, self._shared("new")]
+        mongodb.deepvue_tokens.find_one_and_update.side_effect = DuplicateKeyError("")
+
+        self.assertEqual(self.store.get("client", self.fetch), "new")
+        self.fetch.assert_not_called()
+
+    def test_fetches_its_own_token_without_mongo(self, mongodb, *mocks):
+        mongodb.deepvue_tokens.find_one.side_effect = PyMongoError("down")
+
+        self.assertEqual(self.store.get("client", self.fetch), "fetched")
+
+    def test_rejected_token_is_replaced_once(self, mongodb, *mocks):
+        mongodb.deepvue_tokens.find_one.return_value = None
+        tokens = iter(["revoked", "renewed"])
+        url = "https://production.deepvue.tech/v1/verification"
+        request = httpx.Request("GET", url)
+        client = mock.Mock()
+        client.request.side_effect = [
+            httpx.Response(401, request=request),
+            httpx.Response(200, json={"sub_code": "SUCCESS"}, request=request),
+        ]
+        auth = DeepvueAuth("client", "secret")
+
+        fetch_token = lambda: (next(tokens), time.time() + 3600)  # noqa: E731
+        with mock.patch(
+            "plugin.utils.deepvue_auth.token_store", self.store
+        ), mock.patch(
+            "plugin.utils.deepvue_auth.http_clients.get", return_value=client
+        ), mock.patch.object(auth, "_fetch_token", fetch_token):
+            result = auth.make_request("GET", "/v1/verification")
+
+        self.assertEqual(result, {"sub_code": "SUCCESS"})
+        headers = [call.kwargs["headers"] for call in client.request.call_args_list]
+        self.assertEqual(
+            [h["Authorization"] for h in headers], ["Bearer revoked", "Bearer renewed"]
+        )
+
+
+class AsyncProviderTests(SimpleTestCase):
+    @mock.patch("plugin.utils.deepvue_auth.token_store.peek", return_value="token")
+    @mock.patch("plugin.utils.deepvue_auth.async_http_clients.request")
+    def test_arun_awaits_the_provider(self, send, peek):
+        request = httpx.Request("GET", "https://production.deepvue.tech")
+        send.return_value = httpx.Response(
+            200,
+            json={"sub_code": "SUCCESS", "data": {"full_name": "A B"}},
+            request=request,
+        )
+        plugin = _plugin()
+        provider = DEEPVUE(plugin)
+
+        # Without the caching, limiting and hedging around provider calls
+        response = asyncio.run(
+            DEEPVUE.arun.__wrapped__(
+                provider, plugin, PANVerificationRequest(pan_number="ABCDE1234F")
+            )
+        )
+
+        self.assertTrue(response.success)
+        self.assertEqual(response.full_name, "A B")
+        self.assertEqual(send.call_args.kwargs["params"], {"pan_number": "ABCDE1234F"})
+
+
+class AsyncPluginVerificationViewSetTests(SimpleTestCase):
+    def setUp(self):
+        self.view = AsyncPluginVerificationViewSet()
+        self.plugin = _plugin()
+        self.view.get_object = lambda: self.plugin
+        self.provider = mock.Mock()
+        self.provider.arun = mock.AsyncMock(
+            return_value=_Response(sub_code="SUCCESS", message="ok")
+        )
+        patcher = mock.patch(
+            "plugin.views.plugin_registry.get_provider", return_value=self.provider
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _verify(self, data):
+        request = mock.Mock(data=data)
+        return asyncio.run(self.view._verify(request, PANVerificationRequest))
+
+    def test_provider_is_awaited(self):
+        response = self._verify({"pan_number": "ABCDE1234F"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["sub_code"], "SUCCESS")
+        plugin, request = self.provider.arun.await_args.args
+        self.assertIs(plugin, self.plugin)
+        self.assertEqual(request.pan_number, "ABCDE1234F")
+
+    def test_invalid_request_is_rejected(self):
+        response = self._verify({"pan_number": "short"})
+
+        self.assertEqual(response.status_code, 400)
+        self.provider.arun.assert_not_awaited()
+
+    def test_unknown_plugin_is_not_found(self):
+        def missing():
+            raise Plugin.DoesNotExist()
+
+        self.view.get_object = missing
+
+        self.assertEqual(self._verify({"pan_number": "ABCDE1234F"}).status_code, 404)
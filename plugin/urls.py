@@ -2,6 +2,7 @@ from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 from .views import (
+    AsyncPluginVerificationViewSet,
     AadhaarVerificationViewSet,
     BankAccountVerificationViewSet,
     DrivingLicenseVerificationViewSet,
@@ -16,6 +17,7 @@ from .views import (
 
 
 router = DefaultRouter()
+router.register(r"async", AsyncPluginVerificationViewSet, basename="async-plugin")
 router.register(r"", PluginViewSet, basename="plugin")
 # router.register(r'services', PluginServiceListViewSet, basename='plugin-services')
 
@@ -0,0 +1,269 @@
+import logging
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from itertools import islice
+from dataclasses import asdict, dataclass, field
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from django.conf import settings
+from pydantic import ValidationError
+
+from . import cache_metrics as metrics
+from .cache_decorator import last_cache_outcome, served_from_cache
+from .cache_keys import key_builder_for
+from .cache_metrics import cache_metrics
+from .cache_service import cache_service
+from .plugin_factory import PluginFactory
+from .plugin_registry import plugin_registry
+
+if TYPE_CHECKING:
+    from plugin.models import Plugin
+
+logger = logging.getLogger(__name__)
+
+# Requests are grouped by cache key, or by index when they have none
+Group = Union[str, int]
+
+
+def _chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+@dataclass
+class BatchResult:
+    total: int = 0
+    unique: int = 0
+    invalid: int = 0
+    cached: int = 0
+    fetched: int = 0
+    failed: int = 0
+    results: List[Optional[Dict[str, Any]]] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class BatchVerifier:
+    """
+    Verifies a batch of requests with one plugin. Identical requests are
+    looked up once, fresh cache entries are read with a single $in query and
+    the remaining requests go to the provider from a bounded thread pool.
+    Results come back in input order.
+    """
+
+    MAX_BATCH_SIZE = 500
+    # Results of streamed batches are written as they complete, but the
+    # request list is parsed as a whole first, so its body size is capped
+    STREAM_MAX_BATCH_SIZE = 20000
+    MAX_BODY_BYTES = 16 * 1024 * 1024
+    STREAM_CHUNK_SIZE = 100
+    MAX_CONCURRENCY = 8
+    CONCURRENCY_LIMIT = 32
+
+    def __init__(self, plugin: "Plugin", max_concurrency: Optional[int] = None):
+        self.plugin = plugin
+        self.request_model = PluginFactory.get_request_model(plugin.service)
+        self.provider = plugin_registry.get_provider(plugin)
+        self.response_model = self.provider.run.__annotations__.get("return")
+        self.key_builder = key_builder_for(
+            self.request_model,
+            getattr(self.provider.run, "cache_exclude_fields", ()),
+        )
+        max_concurrency = max_concurrency or getattr(
+            settings, "PLUGIN_BATCH_MAX_CONCURRENCY", self.MAX_CONCURRENCY
+        )
+        self.max_concurrency = max(1, min(max_concurrency, self.CONCURRENCY_LIMIT))
+
+    def run(self, items: List[Dict[str, Any]]) -> BatchResult:
+        if len(items) > self.MAX_BATCH_SIZE:
+            raise ValueError(f"At most {self.MAX_BATCH_SIZE} requests per batch")
+
+        result = BatchResult(total=len(items), results=[None] * len(items))
+        # request hash (or the index of an unhashable request) -> its indexes
+        groups: Dict[Group, List[int]] = {}
+        requests: Dict[Group, Any] = {}
+
+        for index, item in enumerate(items):
+            group, request = self._parse(index, item, result)
+            if group is None:
+                result.results[index] = request
+                continue
+            if group not in groups:
+                groups[group] = []
+                requests[group] = request
+            groups[group].append(index)
+        result.unique = len(groups)
+
+        responses = self._load_cached(groups, result)
+        misses = [group for group in groups if group not in responses]
+        if misses:
+            with ThreadPoolExecutor(
+                max_workers=min(self.max_concurrency, len(misses)),
+                thread_name_prefix="plugin-batch",
+            ) as executor:
+                fetched = executor.map(lambda g: self._fetch(requests[g]), misses)
+                for group, response in zip(misses, fetched):
+                    responses[group] = response
+                    self._count(result, response, len(groups[group]))
+
+        for group, indexes in groups.items():
+            for index in indexes:
+                result.results[index] = {"index": index, **responses[group]}
+        return result
+
+    def stream(
+        self, items: Iterable[Dict[str, Any]], result: Optional[BatchResult] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yield one result per item as soon as it is known, in completion order.
+        Items are read STREAM_CHUNK_SIZE at a time and at most
+        2 * max_concurrency provider calls are queued, so the work in flight
+        stays bounded whatever the batch size. Counters are kept in `result`.
+        """
+        result = result if result is not None else BatchResult()
+        window = 2 * self.max_concurrency
+        # provider call -> group, and group -> indexes waiting for it
+        pending: Dict[Future, Group] = {}
+        waiting: Dict[Group, List[int]] = {}
+
+        def drain(return_when):
+            done, _ = wait(pending, return_when=return_when)
+            for future in done:
+                group = pending.pop(future)
+                response = future.result()
+                indexes = waiting.pop(group)
+                self._count(result, response, len(indexes))
+                for index in indexes:
+                    yield {"index": index, **response}
+
+        executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix="plugin-batch"
+        )
+        try:
+            for chunk in _chunked(enumerate(items), self.STREAM_CHUNK_SIZE):
+                result.total += len(chunk)
+                if result.total > self.STREAM_MAX_BATCH_SIZE:
+                    raise ValueError(
+                        f"At most {self.STREAM_MAX_BATCH_SIZE} requests per batch"
+                    )
+
+                groups: Dict[Group, List[int]] = {}
+                requests: Dict[Group, Any] = {}
+                for index, item in chunk:
+                    group, request = self._parse(index, item, result)
+                    if group is None:
+                        yield request
+                        continue
+                    groups.setdefault(group, []).append(index)
+                    requests.setdefault(group, request)
+
+                cached = self._load_cached(groups, result)
+                for group, indexes in groups.items():
+                    if group in cached:
+                        result.unique += 1
+                        for index in indexes:
+                            yield {"index": index, **cached[group]}
+                    elif group in waiting:
+                        # Same request as one already in flight
+                        waiting[group].extend(indexes)
+                    else:
+                        result.unique += 1
+                        waiting[group] = list(indexes)
+                        future = executor.submit(self._fetch, requests[group])
+                        pending[future] = group
+                        if len(pending) >= window:
+                            yield from drain(FIRST_COMPLETED)
+
+            while pending:
+                yield from drain(FIRST_COMPLETED)
+        finally:
+            # The client may go away mid-stream: drop the calls not started yet
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _parse(
+        self, index: int, item: Any, result: BatchResult
+    ) -> Tuple[Optional[Group], Any]:
+        """(group, request), or (None, error result) for an invalid item"""
+        try:
+            request = self.request_model(**item)
+        except (TypeError, ValidationError) as e:
+            result.invalid += 1
+            return None, {"index": index, "success": False, "error": str(e)}
+        return self.key_builder.request_hash(request) or index, request
+
+    def _count(
+        self, result: BatchResult, response: Dict[str, Any], items: int
+    ) -> None:
+        """Count a response for each of the `items` request items it answers"""
+        if response["cached"]:
+            result.cached += items
+        elif response["success"]:
+            result.fetched += items
+        else:
+            result.failed += items
+
+    def _load_cached(
+        self, groups: Dict[Group, List[int]], result: BatchResult
+    ) -> Dict[Group, Dict[str, Any]]:
+        """Responses of the groups with a fresh cache entry"""
+        keys = {
+            group: cache_service.make_key(self.plugin, self.plugin.service, group)
+            for group in groups
+            if isinstance(group, str)
+        }
+        hits = cache_service.lookup_many(key for key in keys.values() if key)
+
+        responses = {}
+        for group, key in keys.items():
+            hit = hits.get(key)
+            # Stale entries go through the provider, which serves and refreshes them
+            if not hit or hit.is_stale:
+                continue
+            response = self._rebuild(hit.response)
+            if response is None:
+                continue
+            for _ in groups[group]:
+                cache_metrics.record(self.plugin, self.plugin.service, metrics.HIT)
+            responses[group] = {**self._result(response), "cached": True}
+            result.cached += len(groups[group])
+        return responses
+
+    def _fetch(self, request: Any) -> Dict[str, Any]:
+        try:
+            last_cache_outcome.set(None)
+            response = self.provider.run(self.plugin, request)
+            # Requests missing from the bulk lookup may still be answered by
+            # the provider's own cache lookup, e.g. stale entries
+            return {**self._result(response), "cached": served_from_cache()}
+        except Exception as e:
+            logger.warning("Batch verification with %s failed: %s", self.plugin.uid, e)
+            return {"success": False, "cached": False, "error": str(e)}
+
+    def _rebuild(self, cached_response: Dict[str, Any]) -> Optional[Any]:
+        if not self.response_model:
+            return None
+        try:
+            return self.response_model(**cached_response)
+        except Exception:
+            cache_metrics.record(
+                self.plugin, self.plugin.service, metrics.DECODE_ERROR
+            )
+            return None
+
+    def _result(self, response: Any) -> Dict[str, Any]:
+        data = response.model_dump(mode="json")
+        return {
+            "success": cache_service._is_successful_response(data),
+            "response": data,
+        }
@@ -1,68 +1,340 @@
+import asyncio
+import inspect
+import logging
+import re
+import time
+from contextvars import ContextVar
 from functools import wraps
-from typing import TYPE_CHECKING, Any, Callable, List, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
 
+import httpx
 from pydantic import BaseModel
 
+from . import cache_metrics as metrics
+from .cache_metrics import cache_metrics
+from .cache_keys import key_builder_for
+from .cache_policy import get_cache_policy
 from .cache_service import cache_service
+from .circuit_breaker import PROVIDER_FAILURE_CODES, CircuitOpen, circuit_breaker
+from .hedging import hedger
+from .provider_router import provider_router
+from .rate_limiter import RateLimited, rate_limiter
+from .single_flight import single_flight
 
 if TYPE_CHECKING:
     from plugin.models import Plugin
 
+logger = logging.getLogger(__name__)
+
+# How the last cached call of the current thread or task was answered: HIT,
+# STALE_HIT, MISS or BYPASS of cache_metrics
+last_cache_outcome: ContextVar[Optional[str]] = ContextVar(
+    "last_cache_outcome", default=None
+)
+
+
+def _record_lookup(plugin: "Plugin", outcome: str) -> None:
+    last_cache_outcome.set(outcome)
+    cache_metrics.record(plugin, plugin.service, outcome)
+
+
+def served_from_cache() -> bool:
+    """Whether the last cached call of the current thread or task was a cache hit"""
+    return last_cache_outcome.get() in (metrics.HIT, metrics.STALE_HIT)
+
+
+def _is_successful(response: Any) -> bool:
+    # Providers report failures in the response rather than raising
+    return (
+        getattr(response, "sub_code", None) == "SUCCESS"
+        or getattr(response, "code", None) == 200
+        or getattr(response, "success", None) is True
+        or getattr(response, "is_success", None) is True
+    )
+
+
+def _is_upstream_failure(response: Any, provider: str) -> bool:
+    """A failed call, as opposed to a definitive negative answer of the provider"""
+    if _is_successful(response):
+        return False
+    return not cache_service._is_negative_response(_dump(response), provider)
+
+
+# Status in the message of DeepvueAuth's HTTP_ERROR responses
+_HTTP_STATUS = re.compile(r"^HTTP (\d{3})\b")
+
+
+def _is_provider_failure(response: Any = None, error: Exception = None) -> bool:
+    """
+    A failed call that says the provider is unhealthy: transport errors,
+    timeouts and 5xx. Failures caused by one plugin's credentials or input
+    (AUTH_FAILED, 4xx, insufficient balance) say nothing about the provider.
+    """
+    if error is not None:
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code >= 500
+        return isinstance(error, (httpx.HTTPError, OSError, TimeoutError))
+    if _is_successful(response):
+        return False
+    data = _dump(response)
+    error_code = data.get("sub_code") or data.get("error_code")
+    if error_code == "HTTP_ERROR":
+        match = _HTTP_STATUS.match(data.get("message") or "")
+        return match is not None and int(match.group(1)) >= 500
+    if error_code:
+        return error_code in PROVIDER_FAILURE_CODES
+    status = data.get("code")
+    return isinstance(status, int) and status >= 500
+
+
+def _observe_upstream(
+    plugin: "Plugin", elapsed: float, response: Any = None, error: Exception = None
+) -> None:
+    """Feed a finished upstream call to metrics, circuit breaker and router"""
+    failed = _is_provider_failure(response, error)
+    circuit_breaker.record(plugin.provider, failed, elapsed)
+    provider_router.observe(plugin, failed, elapsed)
+    cache_metrics.observe_upstream(plugin, plugin.service, elapsed, failed=failed)
+
+
+def _failure_response(func: Callable, error: Exception, sub_code: str) -> Any:
+    """
+    Failed response of the provider's model for a call that never reached the
+    provider; re-raises `error` when the model cannot express a failure.
+    """
+    return_annotation = func.__annotations__.get("return")
+    fields = getattr(return_annotation, "model_fields", {})
+    failure = {
+        "success": False,
+        "is_success": False,
+        "message": str(error),
+        "sub_code": sub_code,
+        "error_code": sub_code,
+        "verification_status": "FAILED",
+    }
+    try:
+        return return_annotation(**{k: v for k, v in failure.items() if k in fields})
+    except Exception:
+        raise error
+
+
+def _dump(response: Any) -> Dict[str, Any]:
+    # JSON mode keeps dates/enums BSON-encodable, dropping None fields keeps
+    # wide models such as policy extractions compact
+    if hasattr(response, "model_dump"):
+        return response.model_dump(mode="json", exclude_none=True)
+    return response.dict(exclude_none=True)
+
+
+def _rebuild(func: Callable, plugin: "Plugin", cached_response: Optional[Dict]) -> Any:
+    return_annotation = func.__annotations__.get("return")
+    if cached_response and return_annotation:
+        try:
+            return return_annotation(**cached_response)
+        except Exception as e:
+            # Usually a response model changed shape since caching
+            cache_metrics.record(plugin, plugin.service, metrics.DECODE_ERROR)
+            logger.warning(
+                "Could not rebuild cached %s for %s: %s",
+                getattr(return_annotation, "__name__", return_annotation),
+                plugin.service,
+                e,
+            )
+    return None
+
+
+def _cache_key(
+    plugin: "Plugin",
+    request: BaseModel,
+    exclude_fields: Optional[List[str]],
+    cache_disabled: bool,
+):
+    """(key builder, cache key); no key means the call bypasses the cache"""
+    if cache_disabled or not get_cache_policy(plugin.service).enabled:
+        return None, None
+    key_builder = key_builder_for(type(request), exclude_fields or ())
+    return key_builder, cache_service.make_key(
+        plugin, plugin.service, key_builder.request_hash(request)
+    )
+
 
 def auto_cached_provider_method(
     exclude_fields: Optional[List[str]] = None, cache_disabled: bool = False
 ):
+    """
+    Cache a provider's run() in plugin_cache. Calls that reach the provider
+    go through the provider's circuit breaker and the plugin's rate limiter,
+    also with cache_disabled, and are hedged for the services of HEDGE_POLICIES.
+    Coroutine methods (arun) get the same behaviour, with Mongo I/O moved
+    off the event loop.
+    """
 
     def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            return _async_cached(func, exclude_fields, cache_disabled)
+
         @wraps(func)
         def wrapper(self, plugin: "Plugin", request: BaseModel, *args, **kwargs):
 
-            if cache_disabled:
-                return func(self, plugin, request, *args, **kwargs)
-
             service_name = plugin.service
 
-            request_data = (
-                request.model_dump()
-                if hasattr(request, "model_dump")
-                else request.dict()
-            )
+            def call_upstream():
+                if not circuit_breaker.allow(plugin.provider):
+                    cache_metrics.record(plugin, service_name, metrics.SHORT_CIRCUIT)
+                    return _failure_response(
+                        func, CircuitOpen(plugin.provider), "CIRCUIT_OPEN"
+                    )
+                try:
+                    with rate_limiter.limit(plugin):
+                        return timed_call()
+                except RateLimited as e:
+                    circuit_breaker.release(plugin.provider)
+                    logger.warning("%s", e)
+                    return _failure_response(func, e, "RATE_LIMITED")
 
-            cache_key_data = request_data.copy()
-            if exclude_fields:
-                for field in exclude_fields:
-                    cache_key_data.pop(field, None)
+            def timed_call():
+                started = time.monotonic()
+                try:
+                    response = hedger.call(
+                        plugin,
+                        lambda: func(self, plugin, request, *args, **kwargs),
+                        lambda response: not _is_upstream_failure(
+                            response, plugin.provider
+                        ),
+                    )
+                except Exception as e:
+                    _observe_upstream(plugin, time.monotonic() - started, error=e)
+                    raise
+                _observe_upstream(plugin, time.monotonic() - started, response)
+                return response
 
-            cached_response = cache_service.get_cached_response(
-                plugin, service_name, cache_key_data
+            key_builder, cache_key = _cache_key(
+                plugin, request, exclude_fields, cache_disabled
             )
+            if not cache_key:
+                _record_lookup(plugin, metrics.BYPASS)
+                return call_upstream()
 
-            if cached_response:
-                return_annotation = func.__annotations__.get("return")
-                if return_annotation:
-                    try:
-                        return return_annotation(**cached_response)
-                    except Exception:
-                        pass
-
-            response = func(self, plugin, request, *args, **kwargs)
+            def load_cached():
+                hit = cache_service.lookup_key(cache_key)
+                return _rebuild(func, plugin, hit.response) if hit else None
 
-            raw_response_data = (
-                response.model_dump()
-                if hasattr(response, "model_dump")
-                else response.dict()
-            )
+            def call_provider():
+                response = call_upstream()
+                cache_service.store(
+                    cache_key,
+                    plugin,
+                    _dump(response),
+                    (
+                        key_builder.key_data(request)
+                        if cache_service.store_request_data
+                        else None
+                    ),
+                )
+                return response
 
-            cache_service.cache_response(
-                plugin, service_name, cache_key_data, raw_response_data
-            )
+            hit = cache_service.lookup_key(cache_key)
+            cached = _rebuild(func, plugin, hit.response) if hit else None
+            if cached is not None:
+                # Serve stale entries immediately, refresh them off the request path
+                if hit.is_stale:
+                    _record_lookup(plugin, metrics.STALE_HIT)
+                    single_flight.refresh_in_background(cache_key, call_provider)
+                else:
+                    _record_lookup(plugin, metrics.HIT)
+                return cached
 
-            return response
+            _record_lookup(plugin, metrics.MISS)
+            # Identical concurrent misses share a single upstream call
+            return single_flight.do(cache_key, call_provider, load_cached)
 
+        # Lets callers such as the cache warmer build the same cache key
+        wrapper.cache_exclude_fields = tuple(exclude_fields or ())
         return wrapper
 
     return decorator
 
 
+def _async_cached(
+    func: Callable, exclude_fields: Optional[List[str]], cache_disabled: bool
+) -> Callable:
+    @wraps(func)
+    async def wrapper(self, plugin: "Plugin", request: BaseModel, *args, **kwargs):
+
+        service_name = plugin.service
+
+        async def call_upstream():
+            if not circuit_breaker.allow(plugin.provider):
+                cache_metrics.record(plugin, service_name, metrics.SHORT_CIRCUIT)
+                return _failure_response(
+                    func, CircuitOpen(plugin.provider), "CIRCUIT_OPEN"
+                )
+            try:
+                async with rate_limiter.alimit(plugin):
+                    return await timed_call()
+            except RateLimited as e:
+                circuit_breaker.release(plugin.provider)
+                logger.warning("%s", e)
+                return _failure_response(func, e, "RATE_LIMITED")
+
+        async def timed_call():
+            started = time.monotonic()
+            try:
+                response = await hedger.acall(
+                    plugin,
+                    lambda: func(self, plugin, request, *args, **kwargs),
+                    lambda response: not _is_upstream_failure(
+                        response, plugin.provider
+                    ),
+                )
+            except Exception as e:
+                _observe_upstream(plugin, time.monotonic() - started, error=e)
+                raise
+            _observe_upstream(plugin, time.monotonic() - started, response)
+            return response
+
+        key_builder, cache_key = _cache_key(
+            plugin, request, exclude_fields, cache_disabled
+        )
+        if not cache_key:
+            _record_lookup(plugin, metrics.BYPASS)
+            return await call_upstream()
+
+        async def load_cached():
+            hit = await cache_service.alookup_key(cache_key)
+            return _rebuild(func, plugin, hit.response) if hit else None
+
+        async def call_provider():
+            response = await call_upstream()
+            await asyncio.to_thread(
+                cache_service.store,
+                cache_key,
+                plugin,
+                _dump(response),
+                (
+                    key_builder.key_data(request)
+                    if cache_service.store_request_data
+                    else None
+                ),
+            )
+            return response
+
+        hit = await cache_service.alookup_key(cache_key)
+        cached = _rebuild(func, plugin, hit.response) if hit else None
+        if cached is not None:
+            if hit.is_stale:
+                _record_lookup(plugin, metrics.STALE_HIT)
+                single_flight.arefresh_in_background(cache_key, call_provider)
+            else:
+                _record_lookup(plugin, metrics.HIT)
+            return cached
+
+        _record_lookup(plugin, metrics.MISS)
+        return await single_flight.ado(cache_key, call_provider, load_cached)
+
+    wrapper.cache_exclude_fields = tuple(exclude_fields or ())
+    return wrapper
+
+
 def simple_cached_provider_method(func: Callable) -> Callable:
     return auto_cached_provider_method()(func)
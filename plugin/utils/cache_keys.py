@@ -0,0 +1,129 @@
+import hashlib
+import json
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # optional, json is used otherwise
+    orjson = None
+
+try:
+    import xxhash
+except ImportError:  # optional, blake2b is used otherwise
+    xxhash = None
+
+# Read file payloads in bounded chunks while hashing
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def is_file_content(value: Any) -> bool:
+    return isinstance(value, (bytes, bytearray, memoryview)) or (
+        hasattr(value, "read") and hasattr(value, "seek")
+    )
+
+
+def hash_file_content(content: Any) -> str:
+    # File contents stay on SHA-256: the digest doubles as a content identifier
+    digest = hashlib.sha256()
+    if hasattr(content, "read"):
+        position = content.tell()
+        for chunk in iter(lambda: content.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+        content.seek(position)
+    else:
+        view = memoryview(content)
+        for offset in range(0, len(view), HASH_CHUNK_SIZE):
+            digest.update(view[offset : offset + HASH_CHUNK_SIZE])
+    return digest.hexdigest()
+
+
+def normalize(value: Any) -> Any:
+    """Replace file payloads by their content hash so keys stay small and stable"""
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if isinstance(value, dict):
+        return {k: normalize(v) for k, v in value.items()}
+    if isinstance(value, BaseModel):
+        return {name: normalize(getattr(value, name)) for name in type(value).model_fields}
+    if is_file_content(value):
+        return {"sha256": hash_file_content(value)}
+    if isinstance(value, (list, tuple)):
+        # (filename, content, content_type) upload tuples: only the bytes matter
+        if len(value) == 3 and is_file_content(value[1]):
+            return {"sha256": hash_file_content(value[1])}
+        return [normalize(v) for v in value]
+    return value
+
+
+def _json_default(value: Any) -> Any:
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def canonical_bytes(data: Dict[str, Any]) -> bytes:
+    """Compact JSON with sorted keys; raises TypeError/ValueError if not serializable"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(
+        data,
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=_json_default,
+    ).encode("utf-8")
+
+
+def digest(payload: bytes) -> str:
+    # Prefixed so keys written with another algorithm never collide
+    if xxhash is not None:
+        return "xxh3:" + xxhash.xxh3_128_hexdigest(payload)
+    return "b2b:" + hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def request_hash(data: Dict[str, Any]) -> Optional[str]:
+    """Hash of an already normalized request dict, None if it cannot be serialized"""
+    try:
+        return digest(canonical_bytes(data))
+    except (TypeError, ValueError):
+        return None
+
+
+class RequestKeyBuilder:
+    """
+    Cache key builder for one request model. The key fields are resolved once
+    per model class, so building a key reads attributes directly instead of
+    dumping, copying and trimming the whole request.
+    """
+
+    def __init__(self, model_cls: Type[BaseModel], exclude_fields: Iterable[str] = ()):
+        excluded = set(exclude_fields)
+        self.fields: Tuple[str, ...] = tuple(
+            sorted(name for name in model_cls.model_fields if name not in excluded)
+        )
+
+    def key_data(self, request: BaseModel) -> Dict[str, Any]:
+        return {name: normalize(getattr(request, name)) for name in self.fields}
+
+    def request_hash(self, request: BaseModel) -> Optional[str]:
+        return request_hash(self.key_data(request))
+
+
+_builders: Dict[Tuple[type, Tuple[str, ...]], RequestKeyBuilder] = {}
+_builders_lock = threading.Lock()
+
+
+def key_builder_for(
+    model_cls: Type[BaseModel], exclude_fields: Iterable[str] = ()
+) -> RequestKeyBuilder:
+    cache_key = (model_cls, tuple(exclude_fields))
+    builder = _builders.get(cache_key)
+    if builder is None:
+        with _builders_lock:
+            builder = _builders.setdefault(
+                cache_key, RequestKeyBuilder(model_cls, exclude_fields)
+            )
+    return builder
@@ -0,0 +1,252 @@
+import atexit
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from core.database import mongodb
+
+from .mongo_indexes import mongo_indexes
+
+if TYPE_CHECKING:
+    from plugin.models import Plugin
+
+logger = logging.getLogger(__name__)
+
+HIT = "hits"
+STALE_HIT = "stale_hits"
+MISS = "misses"
+BYPASS = "bypasses"
+DECODE_ERROR = "decode_errors"
+UPSTREAM_CALL = "upstream_calls"
+UPSTREAM_ERROR = "upstream_errors"
+# Calls rejected while the provider's circuit breaker was open
+SHORT_CIRCUIT = "short_circuits"
+# Hedged second requests sent, and those answering before the first one
+HEDGE = "hedges"
+HEDGE_WIN = "hedge_wins"
+
+COUNTERS = (
+    HIT,
+    STALE_HIT,
+    MISS,
+    BYPASS,
+    DECODE_ERROR,
+    UPSTREAM_CALL,
+    UPSTREAM_ERROR,
+    SHORT_CIRCUIT,
+    HEDGE,
+    HEDGE_WIN,
+)
+
+# Upper bounds (ms) of the upstream latency histogram, the last bucket is open
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+MetricsKey = Tuple[str, str, str]
+
+
+def _bucket_labels() -> List[str]:
+    return [f"le_{bound}" for bound in LATENCY_BUCKETS_MS] + ["gt_max"]
+
+
+class _Series:
+    def __init__(self):
+        self.counters: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+        self.upstream_ms_sum = 0.0
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, other: "_Series") -> None:
+        for counter, n in other.counters.items():
+            self.counters[counter] += n
+        self.upstream_ms_sum += other.upstream_ms_sum
+        for i, n in enumerate(other.latency_buckets):
+            self.latency_buckets[i] += n
+
+    def is_empty(self) -> bool:
+        return not any(self.counters.values())
+
+
+class CacheMetrics:
+    """
+    Per (company, provider, service) cache counters and upstream latency.
+
+    Counters are kept in process and periodically added to the
+    `plugin_cache_metrics_daily` collection, one document per day and key.
+    """
+
+    FLUSH_INTERVAL_SECONDS = 60
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Totals since the process started
+        self._totals: Dict[MetricsKey, _Series] = defaultdict(_Series)
+        # Deltas not yet written to the daily rollup
+        self._pending: Dict[MetricsKey, _Series] = defaultdict(_Series)
+        self._last_flush = time.monotonic()
+        self._flushing = False
+        atexit.register(self.flush)
+
+    def _key(self, plugin: "Plugin", service: str) -> MetricsKey:
+        return (str(getattr(plugin, "company_id", "")), plugin.provider, str(service))
+
+    def record(self, plugin: "Plugin", service: str, counter: str) -> None:
+        key = self._key(plugin, service)
+        with self._lock:
+            self._totals[key].counters[counter] += 1
+            self._pending[key].counters[counter] += 1
+        self._maybe_flush()
+
+    def observe_upstream(
+        self, plugin: "Plugin", service: str, seconds: float, failed: bool = False
+    ) -> None:
+        key = self._key(plugin, service)
+        elapsed_ms = seconds * 1000
+        bucket = bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)
+        with self._lock:
+            for series in (self._totals[key], self._pending[key]):
+                series.counters[UPSTREAM_CALL] += 1
+                if failed:
+                    series.counters[UPSTREAM_ERROR] += 1
+                series.upstream_ms_sum += elapsed_ms
+                series.latency_buckets[bucket] += 1
+        self._maybe_flush()
+
+    def snapshot(self, company_id: Optional[Any] = None) -> List[Dict[str, Any]]:
+        """Totals of this process, optionally limited to one company"""
+        with self._lock:
+            return [
+                {
+                    "company_id": key[0],
+                    "provider": key[1],
+                    "service": key[2],
+                    **self._summarize(key[1], key[2], series),
+                }
+                for key, series in self._totals.items()
+                if company_id is None or key[0] == str(company_id)
+            ]
+
+    def daily(self, company_id: Any, days: int = 7) -> List[Dict[str, Any]]:
+        """Daily rollups of all workers for a company, newest first"""
+        since = (datetime.utcnow() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        with mongodb.plugin_cache_metrics_daily.find(
+            {"company_id": str(company_id), "date": {"$gte": since}},
+            {"_id": 0},
+        ).sort("date", -1) as cursor:
+            docs = cursor.to_list()
+
+        results = []
+        for doc in docs:
+            series = _Series()
+            series.counters.update({c: doc.get(c, 0) for c in COUNTERS})
+            series.upstream_ms_sum = doc.get("upstream_ms_sum", 0.0)
+            buckets = doc.get("latency_buckets", {})
+            series.latency_buckets = [buckets.get(label, 0) for label in _bucket_labels()]
+            results.append(
+                {
+                    "date": doc["date"],
+                    "company_id": doc["company_id"],
+                    "provider": doc["provider"],
+                    "service": doc["service"],
+                    **self._summarize(doc["provider"], doc["service"], series),
+                }
+            )
+        return results
+
+    def _summarize(
+        self, provider: str, service: str, series: _Series
+    ) -> Dict[str, Any]:
+        counters = series.counters
+        served_from_cache = counters[HIT] + counters[STALE_HIT]
+        lookups = served_from_cache + counters[MISS]
+        calls = counters[UPSTREAM_CALL]
+        avg_upstream_ms = series.upstream_ms_sum / calls if calls else None
+        cost = self._call_cost(provider, service)
+        return {
+            **counters,
+            "hit_ratio": round(served_from_cache / lookups, 4) if lookups else None,
+            "avg_upstream_ms": round(avg_upstream_ms, 1) if calls else None,
+            # Every hit saved roughly one average upstream round trip
+            "latency_saved_ms": (
+                round(served_from_cache * avg_upstream_ms) if calls else None
+            ),
+            "upstream_spend": round(calls * cost, 2),
+            "spend_saved": round(served_from_cache * cost, 2),
+            "latency_histogram_ms": dict(zip(_bucket_labels(), series.latency_buckets)),
+        }
+
+    def _call_cost(self, provider: str, service: str) -> float:
+        """
+        Price of one upstream call from settings.PLUGIN_PROVIDER_CALL_COST, either
+        {"deepvue": 1.5} or {"deepvue": {"vehicle_rc_verification": 3, ...}}
+        """
+        cost = getattr(settings, "PLUGIN_PROVIDER_CALL_COST", {}).get(provider, 0)
+        if isinstance(cost, dict):
+            cost = cost.get(service, 0)
+        return float(cost or 0)
+
+    def _maybe_flush(self) -> None:
+        if time.monotonic() - self._last_flush < self.FLUSH_INTERVAL_SECONDS:
+            return
+        with self._lock:
+            if self._flushing:
+                return
+            self._flushing = True
+            self._last_flush = time.monotonic()
+        threading.Thread(target=self._flush_in_background, daemon=True).start()
+
+    def _flush_in_background(self) -> None:
+        try:
+            self.flush()
+        finally:
+            self._flushing = False
+
+    def flush(self) -> None:
+        """Add pending deltas to today's rollup documents"""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(_Series)
+
+        date = datetime.utcnow().strftime("%Y-%m-%d")
+        operations = []
+        for (company_id, provider, service), series in pending.items():
+            if series.is_empty():
+                continue
+            inc = {c: n for c, n in series.counters.items() if n}
+            if series.upstream_ms_sum:
+                inc["upstream_ms_sum"] = series.upstream_ms_sum
+            for label, n in zip(_bucket_labels(), series.latency_buckets):
+                if n:
+                    inc[f"latency_buckets.{label}"] = n
+            operations.append(
+                UpdateOne(
+                    {
+                        "date": date,
+                        "company_id": company_id,
+                        "provider": provider,
+                        "service": service,
+                    },
+                    {"$inc": inc},
+                    upsert=True,
+                )
+            )
+
+        if not operations:
+            return
+        try:
+            mongo_indexes.ensure("plugin_cache_metrics_daily")
+            mongodb.plugin_cache_metrics_daily.bulk_write(operations, ordered=False)
+        except PyMongoError as e:
+            logger.warning("Could not write plugin cache metrics rollup: %s", e)
+            # Keep the deltas for the next flush
+            with self._lock:
+                for key, series in pending.items():
+                    self._pending[key].add(series)
+
+
+cache_metrics = CacheMetrics()
@@ -0,0 +1,93 @@
+from dataclasses import dataclass, replace
+from typing import Dict, FrozenSet
+
+from django.conf import settings
+
+from plugin.enums import PluginProvider, PluginService
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    # Entries younger than ttl are fresh. Between ttl and stale_ttl they are
+    # served immediately while a background refresh replaces them.
+    ttl_seconds: int = HOUR
+    stale_ttl_seconds: int = HOUR
+    enabled: bool = True
+    # Definitive "not found"/"invalid" answers from the provider
+    cache_negative: bool = False
+    negative_ttl_seconds: int = 15 * MINUTE
+    # Responses larger than this are not cached
+    max_entry_bytes: int = 256 * 1024
+
+
+DEFAULT_CACHE_POLICY = CachePolicy()
+
+CACHE_POLICIES: Dict[str, CachePolicy] = {
+    PluginService.PAN_VALIDATION: CachePolicy(
+        stale_ttl_seconds=DAY, cache_negative=True
+    ),
+    PluginService.VEHICLE_RC_VERIFICATION: CachePolicy(
+        stale_ttl_seconds=DAY, cache_negative=True
+    ),
+    PluginService.DRIVING_LICENSE_VERIFICATION: CachePolicy(
+        stale_ttl_seconds=DAY, cache_negative=True
+    ),
+    PluginService.IFSC_LOOKUP: CachePolicy(
+        ttl_seconds=DAY,
+        stale_ttl_seconds=7 * DAY,
+        cache_negative=True,
+        negative_ttl_seconds=HOUR,
+    ),
+    PluginService.POLICY_EXTRACTION: CachePolicy(
+        ttl_seconds=7 * DAY, stale_ttl_seconds=7 * DAY, max_entry_bytes=1024 * 1024
+    ),
+    # OTP flows and notifications must always reach the provider
+    PluginService.AADHAAR_VERIFICATION: CachePolicy(enabled=False),
+    PluginService.SMS_NOTIFICATION: CachePolicy(enabled=False),
+    PluginService.EMAIL_NOTIFICATION: CachePolicy(enabled=False),
+}
+
+
+def get_cache_policy(service: str) -> CachePolicy:
+    """
+    Policy for a service, with optional per-field overrides from
+    settings.PLUGIN_CACHE_POLICIES, e.g. {"ifsc_lookup": {"ttl_seconds": 3600}}
+    """
+    policy = CACHE_POLICIES.get(service, DEFAULT_CACHE_POLICY)
+    overrides = getattr(settings, "PLUGIN_CACHE_POLICIES", {}).get(str(service))
+    return replace(policy, **overrides) if overrides else policy
+
+
+# Error codes meaning the provider looked the input up and found it missing or
+# invalid. Any other code is a failed call: it is never cached and counts
+# against the provider's health, so unknown codes err on the side of retrying.
+NEGATIVE_ERROR_CODES: Dict[str, FrozenSet[str]] = {
+    PluginProvider.DEEPVUE: frozenset(
+        {
+            "INVALID_PAN",
+            "PAN_NOT_FOUND",
+            "INVALID_RC_NUMBER",
+            "RC_NOT_FOUND",
+            "INVALID_IFSC",
+            "IFSC_NOT_FOUND",
+            "INVALID_DL_NUMBER",
+            "DL_NOT_FOUND",
+        }
+    ),
+    PluginProvider.UNISEN: frozenset({"INVALID_PAN", "PAN_NOT_FOUND"}),
+}
+
+
+def get_negative_error_codes(provider: str) -> FrozenSet[str]:
+    """
+    Negative error codes of a provider, replaced by the provider's entry in
+    settings.PLUGIN_CACHE_NEGATIVE_CODES when set, e.g. {"deepvue": ["INVALID_PAN"]}
+    """
+    codes = getattr(settings, "PLUGIN_CACHE_NEGATIVE_CODES", {}).get(str(provider))
+    if codes is not None:
+        return frozenset(codes)
+    return NEGATIVE_ERROR_CODES.get(provider, frozenset())
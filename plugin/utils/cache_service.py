@@ -1,58 +1,206 @@
 # plugin/utils/cache_service.py
-import hashlib
+import asyncio
 import json
-from datetime import datetime
-from typing import TYPE_CHECKING, Any, Dict, Optional
+import zlib
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, NamedTuple, Optional
 
+from bson import Binary
 from django.conf import settings
 
 from core.database import mongodb
+from plugin.enums import PluginService
+
+from . import cache_keys
+from .cache_policy import CachePolicy, get_cache_policy, get_negative_error_codes
+from .memory_cache import LRUCache
+from .mongo_indexes import mongo_indexes
+
+try:
+    import zstandard
+except ImportError:  # optional, zlib is used otherwise
+    zstandard = None
+
+_DECODE_ERRORS = (ValueError, zlib.error) + (
+    (zstandard.ZstdError,) if zstandard is not None else ()
+)
 
 if TYPE_CHECKING:
     from plugin.models import Plugin
 
 
+class CacheHit(NamedTuple):
+    response: Dict[str, Any]
+    is_stale: bool
+
+
 class PluginCacheService:
-    CACHE_EXPIRY_MINUTES = 60
+    # HTTP codes meaning the provider looked the input up and found nothing
+    NEGATIVE_HTTP_CODES = {404, 422}
+    # In-process tier checked before Mongo, sized per worker
+    L1_MAX_ENTRIES = 1024
+    # Responses of these services depend only on the request, not on the
+    # company's credentials, so every plugin of the same provider shares them
+    PROVIDER_SHARED_SERVICES = {PluginService.POLICY_EXTRACTION}
+    # Payloads below this size are stored uncompressed
+    COMPRESS_MIN_BYTES = 512
+    # Only what lookups need; request_data and bookkeeping fields stay on the server
+    LOOKUP_PROJECTION = {
+        "_id": 0,
+        "payload": 1,
+        "encoding": 1,
+        "response_data": 1,
+        "created_at": 1,
+        "fresh_until": 1,
+        "expires_at": 1,
+    }
+    # Request hashes per $in query of lookup_many
+    LOOKUP_MANY_CHUNK = 500
 
     def __init__(self):
-        self._ensure_indexes()
-
-    def _ensure_indexes(self):
-        mongodb.plugin_cache.create_index(
-            "created_at", expireAfterSeconds=self.CACHE_EXPIRY_MINUTES * 60
+        self.l1 = LRUCache(
+            getattr(settings, "PLUGIN_CACHE_L1_MAX_ENTRIES", self.L1_MAX_ENTRIES)
         )
-        mongodb.plugin_cache.create_index(
-            [("plugin_uid", 1), ("service", 1), ("request_hash", 1)],
-            name="plugin_service_request_hash",
-            unique=True,
+        # Normalized request bodies are only kept for debugging
+        self.store_request_data = getattr(
+            settings, "PLUGIN_CACHE_STORE_REQUEST_DATA", False
         )
 
-    def _generate_request_hash(self, request_data: Dict[str, Any]) -> str:
-        try:
-            sorted_data = json.dumps(request_data, sort_keys=True, separators=(",", ":"))
-            return hashlib.sha256(sorted_data.encode("utf-8")).hexdigest()
-        except Exception as e: # TODO handle for file inputs
+    def _cache_owner(self, plugin: "Plugin", service: str) -> str:
+        if service in self.PROVIDER_SHARED_SERVICES:
+            return f"provider:{plugin.provider}"
+        return plugin.uid
+
+    def cache_key(
+        self, plugin: "Plugin", service: str, request_data: Dict[str, Any]
+    ) -> Optional[tuple]:
+        request_hash = cache_keys.request_hash(cache_keys.normalize(request_data))
+        return self.make_key(plugin, service, request_hash)
+
+    def make_key(
+        self, plugin: "Plugin", service: str, request_hash: Optional[str]
+    ) -> Optional[tuple]:
+        if not request_hash:
             return None
+        return (self._cache_owner(plugin, service), service, request_hash)
 
-    def get_cached_response(
+    def lookup(
         self, plugin: "Plugin", service: str, request_data: Dict[str, Any]
-    ) -> Optional[Dict[str, Any]]:
+    ) -> Optional[CacheHit]:
+        return self.lookup_key(self.cache_key(plugin, service, request_data))
+
+    def lookup_key(self, key: Optional[tuple]) -> Optional[CacheHit]:
         try:
-            request_hash = self._generate_request_hash(request_data)
-            if not request_hash:
+            if not key:
+                return None
+            policy = get_cache_policy(key[1])
+            if not policy.enabled:
                 return None
-            query = {
-                "plugin_uid": plugin.uid,
-                "service": service,
-                "request_hash": request_hash,
-            }
-            doc = mongodb.plugin_cache.find_one(query)
-            return doc.get("response_data") if doc else None
+
+            entry = self.l1.get(key)
+            if entry is None:
+                entry = self._load_entry(key, policy)
+                if entry is None:
+                    return None
+            return self._hit(entry)
 
         except MemoryError:
             return None
 
+    async def alookup_key(self, key: Optional[tuple]) -> Optional[CacheHit]:
+        """lookup_key for coroutines: L1 hits inline, Mongo reads in a thread"""
+        try:
+            if not key:
+                return None
+            policy = get_cache_policy(key[1])
+            if not policy.enabled:
+                return None
+
+            entry = self.l1.get(key)
+            if entry is None:
+                entry = await asyncio.to_thread(self._load_entry, key, policy)
+                if entry is None:
+                    return None
+            return self._hit(entry)
+
+        except MemoryError:
+            return None
+
+    def lookup_many(self, keys: Iterable[Optional[tuple]]) -> Dict[tuple, CacheHit]:
+        """
+        lookup_key for many keys at once: L1 first, then a single $in query
+        per cache owner and service for the rest. Misses are left out.
+        """
+        hits: Dict[tuple, CacheHit] = {}
+        missing: Dict[tuple, List[str]] = {}
+        try:
+            for key in keys:
+                if not key or not get_cache_policy(key[1]).enabled:
+                    continue
+                entry = self.l1.get(key)
+                if entry is not None:
+                    hits[key] = self._hit(entry)
+                else:
+                    missing.setdefault(key[:2], []).append(key[2])
+
+            if missing:
+                mongo_indexes.ensure("plugin_cache")
+            for (owner, service), hashes in missing.items():
+                policy = get_cache_policy(service)
+                for start in range(0, len(hashes), self.LOOKUP_MANY_CHUNK):
+                    docs = mongodb.plugin_cache.find(
+                        {
+                            "plugin_uid": owner,
+                            "service": service,
+                            "request_hash": {
+                                "$in": hashes[start : start + self.LOOKUP_MANY_CHUNK]
+                            },
+                        },
+                        {**self.LOOKUP_PROJECTION, "request_hash": 1},
+                    )
+                    for doc in docs:
+                        key = (owner, service, doc["request_hash"])
+                        entry = self._entry_from_doc(key, doc, policy)
+                        if entry is not None:
+                            hits[key] = self._hit(entry)
+        except MemoryError:
+            pass
+        return hits
+
+    def _load_entry(self, key: tuple, policy: CachePolicy) -> Optional[tuple]:
+        """Read an entry from Mongo into the L1, None if missing or expired"""
+        mongo_indexes.ensure("plugin_cache")
+        doc = mongodb.plugin_cache.find_one(
+            self._key_query(key), self.LOOKUP_PROJECTION
+        )
+        return self._entry_from_doc(key, doc, policy) if doc else None
+
+    def _entry_from_doc(
+        self, key: tuple, doc: Dict[str, Any], policy: CachePolicy
+    ) -> Optional[tuple]:
+        response_data = self._decode_payload(doc)
+        if not response_data:
+            return None
+        fresh_until, expires_at = self._entry_window(doc, policy)
+        entry = (response_data, fresh_until)
+        # Mongo's TTL monitor only runs once a minute
+        if not self._fill_l1(key, entry, expires_at):
+            return None
+        return entry
+
+    def _hit(self, entry: tuple) -> CacheHit:
+        response_data, fresh_until = entry
+        return CacheHit(
+            response=response_data,
+            is_stale=datetime.utcnow() >= fresh_until,
+        )
+
+    def get_cached_response(
+        self, plugin: "Plugin", service: str, request_data: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        hit = self.lookup(plugin, service, request_data)
+        return hit.response if hit else None
+
     def cache_response(
         self,
         plugin: "Plugin",
@@ -60,41 +208,148 @@ class PluginCacheService:
         request_data: Dict[str, Any],
         raw_response: Dict[str, Any],
     ) -> bool:
-        """Cache successful response"""
+        # Normalize once so file payloads are hashed a single time
+        normalized_data = cache_keys.normalize(request_data)
+        key = self.make_key(plugin, service, cache_keys.request_hash(normalized_data))
+        return self.store(key, plugin, raw_response, normalized_data)
+
+    def store(
+        self,
+        key: Optional[tuple],
+        plugin: "Plugin",
+        raw_response: Dict[str, Any],
+        request_data: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        """Cache successful and, where the service policy allows, negative responses"""
         try:
-            if not self._is_successful_response(raw_response):
+            if not key:
+                return False
+            policy = get_cache_policy(key[1])
+            if not policy.enabled:
+                return False
+
+            if self._is_successful_response(raw_response):
+                is_negative = False
+            elif policy.cache_negative and self._is_negative_response(
+                raw_response, plugin.provider
+            ):
+                is_negative = True
+            else:
+                return False
+
+            serialized = json.dumps(raw_response, separators=(",", ":")).encode("utf-8")
+            if len(serialized) > policy.max_entry_bytes:
                 return False
+            encoding, payload = self._encode_payload(serialized)
+
+            created_at = datetime.utcnow()
+            if is_negative:
+                fresh_until = expires_at = created_at + timedelta(
+                    seconds=policy.negative_ttl_seconds
+                )
+            else:
+                fresh_until = created_at + timedelta(seconds=policy.ttl_seconds)
+                expires_at = created_at + timedelta(seconds=policy.stale_ttl_seconds)
 
-            request_hash = self._generate_request_hash(request_data)
             doc = {
-                "plugin_uid": plugin.uid,
-                "service": service,
+                **self._key_query(key),
                 "provider": plugin.provider,
-                "request_hash": request_hash,
-                "request_data": request_data,
-                "response_data": raw_response,
-                "created_at": datetime.utcnow(),
+                "encoding": encoding,
+                "payload": Binary(payload),
+                "is_negative": is_negative,
+                "created_at": created_at,
+                "fresh_until": fresh_until,
+                "expires_at": expires_at,
             }
+            # Drop the uncompressed response_data of entries written before
+            unset = {"response_data": ""}
+            if self.store_request_data and request_data is not None:
+                doc["request_data"] = request_data
+            else:
+                unset["request_data"] = ""
 
+            mongo_indexes.ensure("plugin_cache")
             mongodb.plugin_cache.update_one(
-                {
-                    "plugin_uid": plugin.uid,
-                    "service": service,
-                    "request_hash": request_hash,
-                },
-                {"$set": doc},
-                upsert=True,
+                self._key_query(key), {"$set": doc, "$unset": unset}, upsert=True
             )
+            self._fill_l1(key, (raw_response, fresh_until), expires_at)
             return True
-        except MemoryError:
+        except (TypeError, ValueError, MemoryError):
+            return False
+
+    def _key_query(self, key: tuple) -> Dict[str, str]:
+        # plugin_uid holds the cache owner: the plugin uid, or the provider
+        # for PROVIDER_SHARED_SERVICES
+        owner, service, request_hash = key
+        return {"plugin_uid": owner, "service": service, "request_hash": request_hash}
+
+    def _entry_window(self, doc: Dict[str, Any], policy: CachePolicy) -> tuple:
+        """(fresh_until, expires_at) of a stored entry"""
+        if isinstance(doc.get("expires_at"), datetime):
+            return doc.get("fresh_until") or doc["expires_at"], doc["expires_at"]
+        # Entries written before per-document expiry
+        created_at = doc.get("created_at")
+        if not isinstance(created_at, datetime):
+            created_at = datetime.utcnow()
+        return (
+            created_at + timedelta(seconds=policy.ttl_seconds),
+            created_at + timedelta(seconds=policy.stale_ttl_seconds),
+        )
+
+    def _fill_l1(self, key: tuple, entry: tuple, expires_at: datetime) -> bool:
+        """Keep the L1 entry no longer than the stored one; False once expired"""
+        remaining = (expires_at - datetime.utcnow()).total_seconds()
+        if remaining <= 0:
             return False
+        self.l1.set(key, entry, remaining)
+        return True
+
+    def _encode_payload(self, serialized: bytes) -> tuple:
+        """(encoding, bytes) for a JSON-serialized response"""
+        if len(serialized) < self.COMPRESS_MIN_BYTES:
+            return "json", serialized
+        if zstandard is not None:
+            # zstandard contexts are not thread-safe, they are cheap to create
+            return "zstd", zstandard.ZstdCompressor().compress(serialized)
+        return "zlib", zlib.compress(serialized)
+
+    def _decode_payload(self, doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        encoding = doc.get("encoding")
+        if encoding is None:
+            # Entries written before compressed payloads
+            return doc.get("response_data")
+
+        payload = bytes(doc.get("payload") or b"")
+        try:
+            if encoding == "zstd":
+                if zstandard is None:
+                    return None
+                payload = zstandard.ZstdDecompressor().decompress(payload)
+            elif encoding == "zlib":
+                payload = zlib.decompress(payload)
+            elif encoding != "json":
+                return None
+            return json.loads(payload)
+        except _DECODE_ERRORS:
+            return None
+
+    def l1_stats(self) -> Dict[str, int]:
+        return self.l1.stats()
 
     def _is_successful_response(self, response: Dict[str, Any]) -> bool:
         return (
             response.get("sub_code") == "SUCCESS"  # Deepvue
             or response.get("code") == 200  # HTTP success
             or response.get("success") is True  # General success flag
+            or response.get("is_success") is True  # BasePluginResponse
         )
 
+    def _is_negative_response(self, response: Dict[str, Any], provider: str) -> bool:
+        """Definitive "not found"/"invalid input" answers from the provider"""
+        error_code = response.get("sub_code") or response.get("error_code")
+        if error_code:
+            return error_code in get_negative_error_codes(provider)
+        return response.get("code") in self.NEGATIVE_HTTP_CODES
+
 
 cache_service = PluginCacheService()
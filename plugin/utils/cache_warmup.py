@@ -0,0 +1,290 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from pydantic import ValidationError
+
+from core.database import mongodb
+from plugin.enums import PluginService
+
+from .cache_keys import key_builder_for
+from .cache_service import cache_service
+from .mongo_indexes import mongo_indexes
+from .plugin_factory import PluginFactory
+from .plugin_registry import plugin_registry
+
+if TYPE_CHECKING:
+    from plugin.models import Plugin
+
+logger = logging.getLogger(__name__)
+
+WARMABLE_SERVICES = {
+    PluginService.VEHICLE_RC_VERIFICATION,
+    PluginService.PAN_VALIDATION,
+    PluginService.DRIVING_LICENSE_VERIFICATION,
+    PluginService.IFSC_LOOKUP,
+}
+
+# Jobs started from a request run in a thread of the web worker and die with
+# it; larger batches belong to the warm_plugin_cache management command
+MAX_BACKGROUND_ITEMS = getattr(
+    settings, "PLUGIN_CACHE_WARMUP_MAX_BACKGROUND_ITEMS", 1000
+)
+HEARTBEAT_SECONDS = 30
+# A running job without a heartbeat for this long lost its worker
+STALE_JOB_SECONDS = 5 * HEARTBEAT_SECONDS
+
+
+class _Throttle:
+    """Spaces calls evenly so that at most `rate_per_second` start per second"""
+
+    def __init__(self, rate_per_second: float):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._next_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(self._next_at, now)
+            self._next_at = start_at + self.interval
+        if start_at > now:
+            time.sleep(start_at - now)
+
+
+@dataclass
+class WarmupResult:
+    total: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    already_cached: int = 0
+    fetched: int = 0
+    failed: int = 0
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class CacheWarmer:
+    """
+    Runs a batch of lookups for one plugin through its provider so the
+    responses land in plugin_cache under the same keys the views use.
+    Entries that are already fresh are skipped.
+    """
+
+    MAX_WORKERS = 4
+    RATE_PER_SECOND = 5.0
+    MAX_BATCH_SIZE = 10000
+    MAX_REPORTED_ERRORS = 50
+    PROGRESS_CHUNK_SIZE = 100
+
+    def __init__(
+        self,
+        plugin: "Plugin",
+        max_workers: Optional[int] = None,
+        rate_per_second: Optional[float] = None,
+    ):
+        if plugin.service not in WARMABLE_SERVICES:
+            raise ValueError(f"Cache warm-up is not supported for {plugin.service}")
+
+        self.plugin = plugin
+        self.max_workers = max(1, min(max_workers or self.MAX_WORKERS, 32))
+        self.rate_per_second = rate_per_second or self.RATE_PER_SECOND
+        self.request_model = PluginFactory.get_request_model(plugin.service)
+        self.provider = plugin_registry.get_provider(plugin)
+        self.key_builder = key_builder_for(
+            self.request_model,
+            getattr(self.provider.run, "cache_exclude_fields", ()),
+        )
+        self._lock = threading.Lock()
+
+    def run(
+        self,
+        items: Iterable[Dict[str, Any]],
+        on_progress: Optional[Callable[[WarmupResult], None]] = None,
+    ) -> WarmupResult:
+        """
+        Lookups are sent in chunks of `PROGRESS_CHUNK_SIZE`; `on_progress` is
+        called with the totals so far after each one.
+        """
+        result = WarmupResult()
+        requests = []
+        seen = set()
+
+        for index, item in enumerate(items):
+            result.total += 1
+            if result.total > self.MAX_BATCH_SIZE:
+                raise ValueError(f"At most {self.MAX_BATCH_SIZE} requests per warm-up")
+            try:
+                request = self.request_model(**item)
+            except (TypeError, ValidationError) as e:
+                result.invalid += 1
+                self._add_error(result, index, str(e))
+                continue
+
+            request_hash = self.key_builder.request_hash(request)
+            if request_hash in seen:
+                result.duplicates += 1
+                continue
+            seen.add(request_hash)
+            requests.append((index, request, request_hash))
+
+        throttle = _Throttle(self.rate_per_second)
+        with ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="plugin-cache-warmup"
+        ) as executor:
+            for start in range(0, len(requests), self.PROGRESS_CHUNK_SIZE):
+                chunk = requests[start : start + self.PROGRESS_CHUNK_SIZE]
+                futures = [
+                    executor.submit(self._warm_one, result, throttle, *args)
+                    for args in chunk
+                ]
+                wait(futures)
+                if on_progress:
+                    with self._lock:
+                        progress = WarmupResult(**result.to_dict())
+                    on_progress(progress)
+
+        return result
+
+    def _warm_one(
+        self,
+        result: WarmupResult,
+        throttle: _Throttle,
+        index: int,
+        request: Any,
+        request_hash: Optional[str],
+    ) -> None:
+        try:
+            hit = cache_service.lookup_key(
+                cache_service.make_key(self.plugin, self.plugin.service, request_hash)
+            )
+            if hit and not hit.is_stale:
+                with self._lock:
+                    result.already_cached += 1
+                return
+
+            throttle.wait()
+            response = self.provider.run(self.plugin, request)
+            data = response.model_dump(mode="json", exclude_none=True)
+            if cache_service._is_successful_response(data):
+                with self._lock:
+                    result.fetched += 1
+            else:
+                with self._lock:
+                    result.failed += 1
+                    message = data.get("message") or "Lookup failed"
+                    self._add_error(result, index, message)
+        except Exception as e:
+            logger.warning("Cache warm-up of %s failed: %s", self.plugin.uid, e)
+            with self._lock:
+                result.failed += 1
+                self._add_error(result, index, str(e))
+
+    def _add_error(self, result: WarmupResult, index: int, error: str) -> None:
+        if len(result.errors) < self.MAX_REPORTED_ERRORS:
+            result.errors.append({"index": index, "error": error})
+
+
+def start_warmup_job(
+    plugin: "Plugin",
+    items: List[Dict[str, Any]],
+    max_workers: Optional[int] = None,
+    rate_per_second: Optional[float] = None,
+) -> str:
+    """
+    Warm the cache in a background thread. Progress is kept in
+    `plugin_cache_warmups` under the returned job id, updated after every
+    chunk, and the job is marked failed once its heartbeat stops.
+    """
+    warmer = CacheWarmer(plugin, max_workers, rate_per_second)
+    if len(items) > MAX_BACKGROUND_ITEMS:
+        raise ValueError(
+            f"At most {MAX_BACKGROUND_ITEMS} requests per background warm-up; "
+            "run larger batches with the warm_plugin_cache management command"
+        )
+
+    job_id = uuid.uuid4().hex
+    now = datetime.utcnow()
+    mongo_indexes.ensure("plugin_cache_warmups")
+    mongodb.plugin_cache_warmups.insert_one(
+        {
+            "_id": job_id,
+            "plugin_uid": plugin.uid,
+            "status": "running",
+            "total": len(items),
+            "created_at": now,
+            "heartbeat_at": now,
+        }
+    )
+    finished = threading.Event()
+
+    def save_progress(result: WarmupResult):
+        mongodb.plugin_cache_warmups.update_one(
+            {"_id": job_id},
+            {"$set": {"result": result.to_dict(), "heartbeat_at": datetime.utcnow()}},
+        )
+
+    def heartbeat():
+        while not finished.wait(HEARTBEAT_SECONDS):
+            try:
+                mongodb.plugin_cache_warmups.update_one(
+                    {"_id": job_id}, {"$set": {"heartbeat_at": datetime.utcnow()}}
+                )
+            except Exception as e:
+                logger.warning(
+                    "Heartbeat of cache warm-up job %s failed: %s", job_id, e
+                )
+
+    def run():
+        update = {}
+        try:
+            update["result"] = warmer.run(items, save_progress).to_dict()
+            update["status"] = "completed"
+        except Exception as e:
+            logger.exception("Cache warm-up job %s failed", job_id)
+            update.update(status="failed", error=str(e))
+        finally:
+            finished.set()
+        update["finished_at"] = datetime.utcnow()
+        mongodb.plugin_cache_warmups.update_one({"_id": job_id}, {"$set": update})
+
+    threading.Thread(
+        target=heartbeat, name=f"plugin-cache-warmup-heartbeat-{job_id}", daemon=True
+    ).start()
+    threading.Thread(
+        target=run, name=f"plugin-cache-warmup-{job_id}", daemon=True
+    ).start()
+    return job_id
+
+
+def get_warmup_job(job_id: str, plugin: "Plugin") -> Optional[Dict[str, Any]]:
+    query = {"_id": job_id, "plugin_uid": plugin.uid}
+    now = datetime.utcnow()
+    # The worker running the job was recycled or crashed
+    mongodb.plugin_cache_warmups.update_one(
+        {
+            **query,
+            "status": "running",
+            "heartbeat_at": {
+                "$not": {"$gte": now - timedelta(seconds=STALE_JOB_SECONDS)}
+            },
+        },
+        {
+            "$set": {
+                "status": "failed",
+                "error": "Warm-up job was abandoned by its worker",
+                "finished_at": now,
+            }
+        },
+    )
+    return mongodb.plugin_cache_warmups.find_one(query, {"_id": 0})
@@ -0,0 +1,206 @@
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, replace
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from django.conf import settings
+
+from plugin.enums import PluginProvider
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+@dataclass(frozen=True)
+class CircuitPolicy:
+    enabled: bool = True
+    # Outcomes of the last window_seconds decide whether the circuit opens,
+    # once at least min_calls were made
+    window_seconds: int = 60
+    min_calls: int = 10
+    failure_rate_threshold: float = 0.5
+    # Calls slower than slow_call_ms count towards slow_call_rate_threshold
+    slow_call_ms: int = 10000
+    slow_call_rate_threshold: float = 0.8
+    # How long calls fail fast before probe calls are let through
+    open_seconds: int = 30
+    half_open_probes: int = 2
+
+
+DEFAULT_CIRCUIT_POLICY = CircuitPolicy()
+
+# Error codes of failed responses that count against the provider, next to
+# transport errors, timeouts and 5xx; codes about one plugin's credentials or
+# input must not open the circuit for every plugin of the provider
+PROVIDER_FAILURE_CODES = frozenset(
+    {
+        "REQUEST_FAILED",  # DeepvueAuth: connection error or timeout
+        "SOURCE_UNAVAILABLE",  # Deepvue: government source down
+        "NETWORK_ERROR",  # UNISEN
+        "INVALID_RESPONSE",  # UNISEN: body is not JSON, e.g. a gateway error page
+    }
+)
+
+CIRCUIT_POLICIES: Dict[str, CircuitPolicy] = {
+    # Policy extraction legitimately takes tens of seconds per document
+    PluginProvider.NOVOUP: CircuitPolicy(min_calls=5, slow_call_ms=120000),
+}
+
+
+def get_circuit_policy(provider: str) -> CircuitPolicy:
+    """
+    Policy for a provider, with optional per-field overrides from
+    settings.PLUGIN_CIRCUIT_BREAKERS, e.g. {"deepvue": {"open_seconds": 60}}
+    """
+    policy = CIRCUIT_POLICIES.get(provider, DEFAULT_CIRCUIT_POLICY)
+    overrides = getattr(settings, "PLUGIN_CIRCUIT_BREAKERS", {}).get(str(provider))
+    if overrides:
+        policy = replace(policy, **overrides)
+    return policy
+
+
+class CircuitOpen(Exception):
+    def __init__(self, provider: str):
+        super().__init__(f"{provider} is unavailable, failing fast")
+        self.provider = provider
+
+
+class _Circuit:
+    def __init__(self):
+        self.state = CLOSED
+        # (finished at, failed, slow) of recent calls
+        self.outcomes: Deque[Tuple[float, bool, bool]] = deque()
+        self.opened_at: Optional[float] = None
+        self.probes = 0
+        self.times_opened = 0
+        self.rejected = 0
+
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker, kept per worker process.
+
+    A provider's circuit opens when, over the recent window, too many calls
+    failed (transport errors, timeouts, 5xx and PROVIDER_FAILURE_CODES) or
+    were too slow. While open, calls are rejected immediately instead of
+    waiting out upstream timeouts. After open_seconds a few probe calls are
+    let through: a good probe closes the circuit, a bad one opens it again.
+    """
+
+    def __init__(self):
+        self._circuits: Dict[str, _Circuit] = defaultdict(_Circuit)
+        self._lock = threading.Lock()
+
+    def allow(self, provider: str) -> bool:
+        policy = get_circuit_policy(provider)
+        if not policy.enabled:
+            return True
+
+        with self._lock:
+            circuit = self._circuits[provider]
+            if circuit.state == OPEN:
+                if time.monotonic() - circuit.opened_at < policy.open_seconds:
+                    circuit.rejected += 1
+                    return False
+                circuit.state = HALF_OPEN
+                circuit.probes = 0
+            if circuit.state == HALF_OPEN:
+                if circuit.probes >= policy.half_open_probes:
+                    circuit.rejected += 1
+                    return False
+                circuit.probes += 1
+            return True
+
+    def is_open(self, provider: str) -> bool:
+        """Whether calls are rejected without a probe being due, without side effects"""
+        policy = get_circuit_policy(provider)
+        with self._lock:
+            circuit = self._circuits.get(provider)
+            return (
+                circuit is not None
+                and circuit.state == OPEN
+                and time.monotonic() - circuit.opened_at < policy.open_seconds
+            )
+
+    def record(self, provider: str, failed: bool, elapsed_seconds: float) -> None:
+        """Outcome of a call admitted by allow()"""
+        policy = get_circuit_policy(provider)
+        if not policy.enabled:
+            return
+        slow = elapsed_seconds * 1000 >= policy.slow_call_ms
+        now = time.monotonic()
+
+        with self._lock:
+            circuit = self._circuits[provider]
+            if circuit.state == HALF_OPEN:
+                circuit.probes = max(circuit.probes - 1, 0)
+                if failed or slow:
+                    self._open(circuit, now)
+                else:
+                    circuit.state = CLOSED
+                    circuit.outcomes.clear()
+                return
+            if circuit.state == OPEN:
+                # Calls started before the circuit opened
+                return
+
+            circuit.outcomes.append((now, failed, slow))
+            self._prune(circuit, now, policy)
+            calls = len(circuit.outcomes)
+            if calls < policy.min_calls:
+                return
+            failures = sum(1 for _, f, _ in circuit.outcomes if f)
+            slow_calls = sum(1 for _, _, s in circuit.outcomes if s)
+            if (
+                failures / calls >= policy.failure_rate_threshold
+                or slow_calls / calls >= policy.slow_call_rate_threshold
+            ):
+                self._open(circuit, now)
+
+    def release(self, provider: str) -> None:
+        """Give back an admitted call that never reached the provider"""
+        with self._lock:
+            circuit = self._circuits.get(provider)
+            if circuit and circuit.state == HALF_OPEN:
+                circuit.probes = max(circuit.probes - 1, 0)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        result = {}
+        with self._lock:
+            for provider, circuit in self._circuits.items():
+                policy = get_circuit_policy(provider)
+                self._prune(circuit, now, policy)
+                calls = len(circuit.outcomes)
+                failures = sum(1 for _, f, _ in circuit.outcomes if f)
+                slow_calls = sum(1 for _, _, s in circuit.outcomes if s)
+                result[provider] = {
+                    "state": circuit.state,
+                    "recent_calls": calls,
+                    "failure_rate": round(failures / calls, 4) if calls else None,
+                    "slow_call_rate": round(slow_calls / calls, 4) if calls else None,
+                    "open_for_seconds": (
+                        round(now - circuit.opened_at, 1)
+                        if circuit.state != CLOSED
+                        else None
+                    ),
+                    "times_opened": circuit.times_opened,
+                    "rejected": circuit.rejected,
+                }
+        return result
+
+    def _open(self, circuit: _Circuit, now: float) -> None:
+        circuit.state = OPEN
+        circuit.opened_at = now
+        circuit.probes = 0
+        circuit.times_opened += 1
+        circuit.outcomes.clear()
+
+    def _prune(self, circuit: _Circuit, now: float, policy: CircuitPolicy) -> None:
+        while circuit.outcomes and now - circuit.outcomes[0][0] > policy.window_seconds:
+            circuit.outcomes.popleft()
+
+
+circuit_breaker = CircuitBreaker()
@@ -1,7 +1,199 @@
+import asyncio
+import logging
+import threading
 import time
-from typing import Any, Dict, Optional
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
 
 import httpx
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from core.database import mongodb
+
+from .http_clients import async_http_clients, http_clients
+from .mongo_indexes import mongo_indexes
+
+logger = logging.getLogger(__name__)
+
+# (access_token, expires_at as epoch seconds)
+Token = Tuple[Optional[str], float]
+
+
+class DeepvueTokenStore:
+    """
+    Deepvue access tokens shared by every DeepvueAuth of the process, and
+    through the `deepvue_tokens` collection by every worker.
+
+    Tokens are refreshed REFRESH_MARGIN_SECONDS before they expire. A Mongo
+    lease makes sure a single worker calls /v1/authorize at a time while the
+    others keep using the current token or wait for the new one.
+    """
+
+    REFRESH_MARGIN_SECONDS = 10 * 60
+    LEASE_SECONDS = 30
+    POLL_INTERVAL_SECONDS = 0.2
+
+    def __init__(self):
+        self._tokens: Dict[str, Token] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._owner = uuid.uuid4().hex
+
+    def peek(self, client_id: str) -> Optional[str]:
+        """The process-local token if it needs no refresh, without any I/O"""
+        token, expires_at = self._tokens.get(client_id, (None, 0.0))
+        if token and time.time() < expires_at - self.REFRESH_MARGIN_SECONDS:
+            return token
+        return None
+
+    def get(self, client_id: str, fetch: Callable[[], Token]) -> Optional[str]:
+        token, expires_at = self._tokens.get(client_id, (None, 0.0))
+        now = time.time()
+        if token and now < expires_at - self.REFRESH_MARGIN_SECONDS:
+            return token
+
+        lock = self._client_lock(client_id)
+        if token and now < expires_at:
+            # Still usable: refresh early if nobody else is, never wait for it
+            if lock.acquire(blocking=False):
+                try:
+                    return self._refresh(client_id, fetch, token) or token
+                except httpx.HTTPError as e:
+                    logger.warning("Early Deepvue token refresh failed: %s", e)
+                    return token
+                finally:
+                    lock.release()
+            return token
+
+        with lock:
+            token, expires_at = self._tokens.get(client_id, (None, 0.0))
+            if token and time.time() < expires_at - self.REFRESH_MARGIN_SECONDS:
+                return token
+            return self._refresh(client_id, fetch, token)
+
+    def invalidate(self, client_id: str, token: str) -> None:
+        """Forget a token the API rejected, unless it has already been replaced"""
+        with self._lock:
+            if self._tokens.get(client_id, (None,))[0] == token:
+                del self._tokens[client_id]
+        try:
+            mongodb.deepvue_tokens.update_one(
+                {"_id": client_id, "access_token": token},
+                {"$unset": {"access_token": ""}},
+            )
+        except PyMongoError:
+            pass
+
+    def _client_lock(self, client_id: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(client_id, threading.Lock())
+
+    def _refresh(
+        self, client_id: str, fetch: Callable[[], Token], current: Optional[str]
+    ) -> Optional[str]:
+        """Adopt a newer shared token, or fetch one under the Mongo lease"""
+        try:
+            mongo_indexes.ensure("deepvue_tokens")
+            deadline = time.monotonic() + self.LEASE_SECONDS
+            while True:
+                shared = self._load_shared(client_id)
+                if shared and shared[0] != current:
+                    self._tokens[client_id] = shared
+                    return shared[0]
+                if self._claim(client_id):
+                    break
+                if current or time.monotonic() >= deadline:
+                    # Another worker is refreshing; keep the current token
+                    return current
+                time.sleep(self.POLL_INTERVAL_SECONDS)
+        except PyMongoError as e:
+            logger.warning("Deepvue token store unavailable: %s", e)
+            return self._fetch(client_id, fetch)
+
+        try:
+            # The previous lease holder may have finished just before our claim
+            shared = self._load_shared(client_id)
+            if shared and shared[0] != current:
+                self._tokens[client_id] = shared
+                return shared[0]
+            return self._fetch(client_id, fetch, share=True)
+        except PyMongoError:
+            return self._fetch(client_id, fetch)
+        finally:
+            self._release(client_id)
+
+    def _fetch(
+        self, client_id: str, fetch: Callable[[], Token], share: bool = False
+    ) -> Optional[str]:
+        token, expires_at = fetch()
+        if not token:
+            return None
+        self._tokens[client_id] = (token, expires_at)
+        if share:
+            try:
+                mongodb.deepvue_tokens.update_one(
+                    {"_id": client_id},
+                    {
+                        "$set": {
+                            "access_token": token,
+                            "expires_at": datetime.utcfromtimestamp(expires_at),
+                        }
+                    },
+                )
+            except PyMongoError as e:
+                logger.warning("Could not share Deepvue token: %s", e)
+        return token
+
+    def _load_shared(self, client_id: str) -> Optional[Token]:
+        doc = mongodb.deepvue_tokens.find_one(
+            {"_id": client_id}, {"access_token": 1, "expires_at": 1}
+        )
+        if not doc or not doc.get("access_token"):
+            return None
+        expires_at = (doc["expires_at"] - datetime(1970, 1, 1)).total_seconds()
+        if time.time() >= expires_at - self.REFRESH_MARGIN_SECONDS:
+            return None
+        return doc["access_token"], expires_at
+
+    def _claim(self, client_id: str) -> bool:
+        now = datetime.utcnow()
+        try:
+            mongodb.deepvue_tokens.find_one_and_update(
+                {
+                    "_id": client_id,
+                    "$or": [
+                        {"lease_expires_at": {"$exists": False}},
+                        {"lease_expires_at": {"$lt": now}},
+                    ],
+                },
+                {
+                    "$set": {
+                        "lease_owner": self._owner,
+                        "lease_expires_at": now
+                        + timedelta(seconds=self.LEASE_SECONDS),
+                    }
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            return True
+        except DuplicateKeyError:
+            # The document exists and another worker holds the lease
+            return False
+
+    def _release(self, client_id: str) -> None:
+        try:
+            mongodb.deepvue_tokens.update_one(
+                {"_id": client_id, "lease_owner": self._owner},
+                {"$unset": {"lease_owner": "", "lease_expires_at": ""}},
+            )
+        except PyMongoError:
+            pass
+
+
+token_store = DeepvueTokenStore()
 
 
 class DeepvueAuth:
@@ -13,14 +205,14 @@ class DeepvueAuth:
         self._access_token: Optional[str] = None
         self._token_expiry: Optional[int] = None
 
-    def authenticate(self) -> bool:
+    def _fetch_token(self) -> Token:
         url = f"{self.BASE_URL}/v1/authorize"
         data = {
             "client_id": self.client_id,
             "client_secret": self.client_secret,
         }
 
-        resp = httpx.post(url, data=data)
+        resp = http_clients.get(url).post(url, data=data)
         resp.raise_for_status()
         body = resp.json()
 
@@ -33,17 +225,26 @@ class DeepvueAuth:
         else:
             self._token_expiry = int(time.time()) + (23 * 60 * 60)
 
-        return True if self._access_token else False
+        return self._access_token, self._token_expiry
+
+    def authenticate(self) -> bool:
+        """Force a new token, replacing the shared one"""
+        if self._access_token:
+            token_store.invalidate(self.client_id, self._access_token)
+        return self.get_access_token() is not None
 
     def get_access_token(self) -> Optional[str]:
-        if not self._access_token or (
-            self._token_expiry and time.time() >= self._token_expiry
-        ):
-            success = self.authenticate()
-            if not success:
-                return None
+        self._access_token = token_store.get(self.client_id, self._fetch_token)
         return self._access_token
 
+    async def aget_access_token(self) -> Optional[str]:
+        token = token_store.peek(self.client_id)
+        if token:
+            self._access_token = token
+            return token
+        # Refreshing may wait on Mongo and the lease, keep it off the loop
+        return await asyncio.to_thread(self.get_access_token)
+
     def make_request(
         self,
         method: str,
@@ -52,42 +253,115 @@ class DeepvueAuth:
         params: Dict[str, Any] = None,
         json: Dict[str, Any] = None,
     ) -> Dict[str, Any]:
-        token = self.get_access_token()
+        try:
+            token = self.get_access_token()
+        except httpx.HTTPError as e:
+            logger.warning("Deepvue authorization failed: %s", e)
+            token = None
 
         if not token:
-            return {
-                "success": False,
-                "sub_code": "AUTH_FAILED",
-                "message": "Authentication failed, no token received",
-                "data": {},
-            }
+            return self._auth_failed()
 
         url = f"{self.BASE_URL}{endpoint}"
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "x-api-key": self.client_secret,
-            "Content-Type": "application/json",
-        }
 
         try:
-            response = httpx.request(
-                method, url, headers=headers, params=params, json=json
-            )
+            response = self._send(method, url, token, params, json)
+            if response.status_code == 401:
+                # The shared token was revoked or expired early: renew it once
+                token_store.invalidate(self.client_id, token)
+                token = self.get_access_token()
+                if token:
+                    response = self._send(method, url, token, params, json)
             response.raise_for_status()
             result = response.json()
             return result
 
-        except httpx.HTTPStatusError as e:
-            return {
-                "success": False,
-                "sub_code": "HTTP_ERROR",
-                "message": f"HTTP {e.response.status_code}: {e.response.text}",
-                "data": {},
-            }
         except Exception as e:
+            return self._request_failed(e)
+
+    async def amake_request(
+        self,
+        method: str,
+        endpoint: str,
+        *,
+        params: Dict[str, Any] = None,
+        json: Dict[str, Any] = None,
+    ) -> Dict[str, Any]:
+        """make_request over httpx.AsyncClient, see AsyncHTTPClientRegistry"""
+        try:
+            token = await self.aget_access_token()
+        except httpx.HTTPError as e:
+            logger.warning("Deepvue authorization failed: %s", e)
+            token = None
+
+        if not token:
+            return self._auth_failed()
+
+        url = f"{self.BASE_URL}{endpoint}"
+
+        try:
+            response = await self._asend(method, url, token, params, json)
+            if response.status_code == 401:
+                await asyncio.to_thread(token_store.invalidate, self.client_id, token)
+                token = await self.aget_access_token()
+                if token:
+                    response = await self._asend(method, url, token, params, json)
+            response.raise_for_status()
+            return response.json()
+
+        except Exception as e:
+            return self._request_failed(e)
+
+    def _auth_failed(self) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "sub_code": "AUTH_FAILED",
+            "message": "Authentication failed, no token received",
+            "data": {},
+        }
+
+    def _request_failed(self, error: Exception) -> Dict[str, Any]:
+        if isinstance(error, httpx.HTTPStatusError):
             return {
                 "success": False,
-                "sub_code": "REQUEST_FAILED",
-                "message": f"Request failed: {str(e)}",
+                "sub_code": "HTTP_ERROR",
+                "message": f"HTTP {error.response.status_code}: {error.response.text}",
                 "data": {},
             }
+        return {
+            "success": False,
+            "sub_code": "REQUEST_FAILED",
+            "message": f"Request failed: {str(error)}",
+            "data": {},
+        }
+
+    def _headers(self, token: str) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {token}",
+            "x-api-key": self.client_secret,
+            "Content-Type": "application/json",
+        }
+
+    def _send(
+        self,
+        method: str,
+        url: str,
+        token: str,
+        params: Optional[Dict[str, Any]],
+        json: Optional[Dict[str, Any]],
+    ) -> httpx.Response:
+        return http_clients.get(url).request(
+            method, url, headers=self._headers(token), params=params, json=json
+        )
+
+    async def _asend(
+        self,
+        method: str,
+        url: str,
+        token: str,
+        params: Optional[Dict[str, Any]],
+        json: Optional[Dict[str, Any]],
+    ) -> httpx.Response:
+        return await async_http_clients.request(
+            method, url, headers=self._headers(token), params=params, json=json
+        )
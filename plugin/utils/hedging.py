@@ -0,0 +1,277 @@
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, replace
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Deque, Dict, Optional
+
+from django.conf import settings
+
+from plugin.enums import PluginService
+
+from . import cache_metrics as metrics
+from .cache_metrics import cache_metrics
+from .rate_limiter import RateLimited, rate_limiter
+
+if TYPE_CHECKING:
+    from plugin.models import Plugin
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class HedgePolicy:
+    enabled: bool = False
+    # A second request goes out once the first has been running longer than
+    # this percentile of recent latencies, kept within min/max_delay_ms
+    percentile: float = 95
+    min_delay_ms: int = 100
+    max_delay_ms: int = 5000
+    # Calls observed before the first hedge
+    min_samples: int = 20
+    # Hedges earned per call, and how many may be saved up
+    budget_ratio: float = 0.05
+    budget_burst: float = 5
+
+
+DEFAULT_HEDGE_POLICY = HedgePolicy()
+
+# Only idempotent lookups in the interactive quote flow are hedged
+HEDGE_POLICIES: Dict[str, HedgePolicy] = {
+    PluginService.VEHICLE_RC_VERIFICATION: HedgePolicy(enabled=True),
+    PluginService.PAN_VALIDATION: HedgePolicy(enabled=True),
+}
+
+
+def get_hedge_policy(service: str) -> HedgePolicy:
+    """
+    Policy for a service, with optional per-field overrides from
+    settings.PLUGIN_HEDGING, e.g. {"pan_validation": {"percentile": 99}}
+    """
+    policy = HEDGE_POLICIES.get(service, DEFAULT_HEDGE_POLICY)
+    overrides = getattr(settings, "PLUGIN_HEDGING", {}).get(str(service))
+    if overrides:
+        policy = replace(policy, **overrides)
+    return policy
+
+
+# Result of a hedge the rate limiter had no capacity for
+_NOT_SENT = object()
+
+
+class _Stats:
+    def __init__(self, sample_size: int):
+        self.latencies: Deque[float] = deque(maxlen=sample_size)
+        self.budget = 0.0
+        self.calls = 0
+        self.hedges = 0
+        self.wins = 0
+        self.delay: Optional[float] = None
+
+
+def _any_answer(result: Any) -> bool:
+    return True
+
+
+class Hedger:
+    """
+    Hedged provider calls. When a call of a hedged service is still running
+    after the policy's latency percentile, an identical second call is sent
+    and whichever usable answer arrives first is returned. Providers report
+    failures in their response rather than raising, so callers pass
+    `is_usable` to tell a failed response from an answer.
+
+    Each call earns budget_ratio hedges, so hedges add at most that share of
+    upstream load. Hedges also need immediate rate limiter capacity; they are
+    skipped rather than queued. Latencies and budgets are kept per worker
+    process, per provider and service.
+    """
+
+    SAMPLE_SIZE = 200
+    MAX_WORKERS = 64
+
+    def __init__(self):
+        self._stats: Dict[str, _Stats] = defaultdict(
+            lambda: _Stats(self.SAMPLE_SIZE)
+        )
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid = os.getpid()
+
+    def call(
+        self,
+        plugin: "Plugin",
+        fn: Callable[[], Any],
+        is_usable: Callable[[Any], bool] = _any_answer,
+    ) -> Any:
+        key = f"{plugin.provider}:{plugin.service}"
+        delay = self._delay(key, get_hedge_policy(plugin.service))
+        if delay is None:
+            return self._timed(key, fn)
+
+        executor = self._get_executor()
+        primary = executor.submit(self._timed, key, fn)
+        done, _ = wait((primary,), timeout=delay)
+        if done or not self._take_budget(key):
+            return primary.result()
+
+        hedge = executor.submit(self._hedge, plugin, key, fn)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if self._answered(future, is_usable):
+                    if future is hedge:
+                        self._won(plugin, key)
+                    return future.result()
+        # Neither answered: the primary's failure is the one reported
+        return primary.result()
+
+    async def acall(
+        self,
+        plugin: "Plugin",
+        fn: Callable[[], Awaitable[Any]],
+        is_usable: Callable[[Any], bool] = _any_answer,
+    ) -> Any:
+        """call() for coroutines; the losing request is cancelled"""
+        key = f"{plugin.provider}:{plugin.service}"
+        delay = self._delay(key, get_hedge_policy(plugin.service))
+        if delay is None:
+            return await self._atimed(key, fn)
+
+        primary = asyncio.ensure_future(self._atimed(key, fn))
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or not self._take_budget(key):
+                return await primary
+
+            hedge = asyncio.ensure_future(self._ahedge(plugin, key, fn))
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if self._answered(task, is_usable):
+                        if task is hedge:
+                            self._won(plugin, key)
+                        return task.result()
+            return primary.result()
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                key: {
+                    "delay_ms": (
+                        round(stats.delay * 1000) if stats.delay is not None else None
+                    ),
+                    "calls": stats.calls,
+                    "hedges": stats.hedges,
+                    "wins": stats.wins,
+                    "budget": round(stats.budget, 2),
+                }
+                for key, stats in self._stats.items()
+            }
+
+    def _delay(self, key: str, policy: HedgePolicy) -> Optional[float]:
+        """Seconds to wait before hedging, None when the call is not hedged"""
+        if not policy.enabled:
+            return None
+        with self._lock:
+            stats = self._stats[key]
+            stats.calls += 1
+            stats.budget = min(stats.budget + policy.budget_ratio, policy.budget_burst)
+            if len(stats.latencies) < policy.min_samples:
+                return None
+            latencies = sorted(stats.latencies)
+        index = math.ceil(policy.percentile / 100 * len(latencies)) - 1
+        delay_ms = min(
+            max(latencies[max(index, 0)] * 1000, policy.min_delay_ms),
+            policy.max_delay_ms,
+        )
+        stats.delay = delay_ms / 1000
+        return stats.delay
+
+    @staticmethod
+    def _answered(done: Any, is_usable: Callable[[Any], bool]) -> bool:
+        """Whether a finished future or task holds an answer worth returning"""
+        if done.exception() is not None:
+            return False
+        result = done.result()
+        return result is not _NOT_SENT and is_usable(result)
+
+    def _take_budget(self, key: str) -> bool:
+        with self._lock:
+            stats = self._stats[key]
+            if stats.budget < 1:
+                return False
+            stats.budget -= 1
+            return True
+
+    def _won(self, plugin: "Plugin", key: str) -> None:
+        with self._lock:
+            self._stats[key].wins += 1
+        cache_metrics.record(plugin, plugin.service, metrics.HEDGE_WIN)
+
+    def _sent(self, plugin: "Plugin", key: str) -> None:
+        with self._lock:
+            self._stats[key].hedges += 1
+        cache_metrics.record(plugin, plugin.service, metrics.HEDGE)
+
+    def _observe(self, key: str, seconds: float) -> None:
+        with self._lock:
+            self._stats[key].latencies.append(seconds)
+
+    def _timed(self, key: str, fn: Callable[[], Any]) -> Any:
+        started = time.monotonic()
+        try:
+            return fn()
+        finally:
+            self._observe(key, time.monotonic() - started)
+
+    async def _atimed(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        started = time.monotonic()
+        try:
+            return await fn()
+        finally:
+            self._observe(key, time.monotonic() - started)
+
+    def _hedge(self, plugin: "Plugin", key: str, fn: Callable[[], Any]) -> Any:
+        try:
+            with rate_limiter.limit(plugin, max_wait_seconds=0):
+                self._sent(plugin, key)
+                return self._timed(key, fn)
+        except RateLimited:
+            return _NOT_SENT
+
+    async def _ahedge(
+        self, plugin: "Plugin", key: str, fn: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        try:
+            async with rate_limiter.alimit(plugin, max_wait_seconds=0):
+                self._sent(plugin, key)
+                return await self._atimed(key, fn)
+        except RateLimited:
+            return _NOT_SENT
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                # Threads of a parent process do not survive a fork
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.MAX_WORKERS, thread_name_prefix="plugin-hedge"
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+
+hedger = Hedger()
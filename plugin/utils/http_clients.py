@@ -0,0 +1,153 @@
+import asyncio
+import atexit
+import importlib.util
+import os
+import threading
+import weakref
+from typing import Any, Dict
+
+import httpx
+from django.conf import settings
+
+DEFAULT_CLIENT_CONFIG = {
+    "timeout": 30.0,
+    "connect_timeout": 5.0,
+    "max_connections": 100,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 30.0,
+    "http2": True,
+}
+
+# HTTP/2 needs the optional h2 package
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class HTTPClientRegistry:
+    """
+    Long-lived pooled httpx clients, one per origin (scheme, host and port),
+    so provider calls reuse DNS lookups, TCP connections and TLS sessions.
+
+    Limits and timeouts come from settings.PLUGIN_HTTP_CLIENTS, keyed by
+    "default" or by origin, e.g.
+    {"https://production.deepvue.tech": {"max_connections": 50, "timeout": 10}}
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.Client] = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        atexit.register(self.close)
+
+    def get(self, url: str) -> httpx.Client:
+        origin = self._origin(url)
+        client = self._clients.get(origin)
+        if client is not None and self._pid == os.getpid():
+            return client
+
+        with self._lock:
+            if self._pid != os.getpid():
+                # Connections of a parent process must not be shared after fork
+                self._clients = {}
+                self._pid = os.getpid()
+            client = self._clients.get(origin)
+            if client is None:
+                client = self._clients[origin] = self._build(origin)
+            return client
+
+    def close(self) -> None:
+        with self._lock:
+            clients, self._clients = self._clients, {}
+        for client in clients.values():
+            client.close()
+
+    def client_config(self, origin: str) -> Dict[str, Any]:
+        configured = getattr(settings, "PLUGIN_HTTP_CLIENTS", {})
+        return {
+            **DEFAULT_CLIENT_CONFIG,
+            **configured.get("default", {}),
+            **configured.get(origin, {}),
+        }
+
+    def _build(self, origin: str) -> httpx.Client:
+        return httpx.Client(**self._client_options(origin))
+
+    def _client_options(self, origin: str) -> Dict[str, Any]:
+        config = self.client_config(origin)
+        return {
+            "timeout": httpx.Timeout(
+                config["timeout"], connect=config["connect_timeout"]
+            ),
+            "limits": httpx.Limits(
+                max_connections=config["max_connections"],
+                max_keepalive_connections=config["max_keepalive_connections"],
+                keepalive_expiry=config["keepalive_expiry"],
+            ),
+            "http2": bool(config["http2"]) and HTTP2_AVAILABLE,
+        }
+
+    def _origin(self, url: str) -> str:
+        parsed = httpx.URL(url)
+        return f"{parsed.scheme}://{parsed.netloc.decode('ascii')}"
+
+
+class AsyncHTTPClientRegistry(HTTPClientRegistry):
+    """
+    httpx.AsyncClient counterpart of HTTPClientRegistry, configured by the
+    same settings. Async connections belong to the event loop that opened
+    them, so pooled clients are kept per running loop and origin.
+
+    Pooling only pays off when the loop outlives the request, i.e. under
+    ASGI, and is enabled there with settings.PLUGIN_ASYNC_HTTP_POOLING.
+    Under WSGI every async view runs on a loop of its own, so by default each
+    request opens a client and closes it once the response is read.
+    """
+
+    def __init__(self):
+        super().__init__()
+        # event loop -> {origin: client}; entries go away with their loop
+        self._loops = weakref.WeakKeyDictionary()
+
+    @property
+    def pooling(self) -> bool:
+        return getattr(settings, "PLUGIN_ASYNC_HTTP_POOLING", False)
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        """Send a request and read its response"""
+        if self.pooling:
+            return await self.get(url).request(method, url, **kwargs)
+        options = self._client_options(self._origin(url))
+        async with httpx.AsyncClient(**options) as client:
+            return await client.request(method, url, **kwargs)
+
+    def get(self, url: str) -> httpx.AsyncClient:
+        """Pooled client of the running loop; only for long-lived loops"""
+        loop = asyncio.get_running_loop()
+        origin = self._origin(url)
+        with self._lock:
+            if self._pid != os.getpid():
+                self._loops = weakref.WeakKeyDictionary()
+                self._pid = os.getpid()
+            clients = self._loops.setdefault(loop, {})
+            client = clients.get(origin)
+            if client is None:
+                client = clients[origin] = httpx.AsyncClient(
+                    **self._client_options(origin)
+                )
+            return client
+
+    async def aclose(self) -> None:
+        """Close the clients of the running loop, e.g. on ASGI lifespan shutdown"""
+        with self._lock:
+            clients = self._loops.pop(asyncio.get_running_loop(), {})
+        for client in clients.values():
+            await client.aclose()
+
+    def close(self) -> None:
+        # Async clients can only be closed on their own loop; at exit the
+        # sockets are released with the process
+        with self._lock:
+            self._loops = weakref.WeakKeyDictionary()
+
+
+http_clients = HTTPClientRegistry()
+async_http_clients = AsyncHTTPClientRegistry()
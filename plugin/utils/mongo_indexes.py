@@ -0,0 +1,152 @@
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import PyMongoError
+
+from core.database import mongodb
+
+logger = logging.getLogger(__name__)
+
+
+MONGO_INDEXES: Dict[str, List[IndexModel]] = {
+    "plugin_cache": [
+        # Every document carries its own expiry, derived from the service policy
+        IndexModel("expires_at", name="expires_at_ttl", expireAfterSeconds=0),
+        IndexModel(
+            [
+                ("plugin_uid", ASCENDING),
+                ("service", ASCENDING),
+                ("request_hash", ASCENDING),
+            ],
+            name="plugin_service_request_hash",
+            unique=True,
+        ),
+    ],
+    "plugin_cache_inflight": [
+        IndexModel("expires_at", expireAfterSeconds=0),
+    ],
+    "plugin_cache_metrics_daily": [
+        IndexModel(
+            [
+                ("company_id", ASCENDING),
+                ("date", ASCENDING),
+                ("provider", ASCENDING),
+                ("service", ASCENDING),
+            ],
+            unique=True,
+        ),
+    ],
+    "plugin_cache_warmups": [
+        IndexModel("created_at", expireAfterSeconds=7 * 24 * 60 * 60),
+    ],
+    "plugin_rate_limits": [
+        IndexModel("expires_at", expireAfterSeconds=0),
+    ],
+    "deepvue_tokens": [
+        IndexModel("expires_at", expireAfterSeconds=0),
+    ],
+    "motor_policy": [
+        IndexModel("uid"),
+        # next-pending-file
+        IndexModel(
+            [
+                ("meta.company_id", ASCENDING),
+                ("meta.status", ASCENDING),
+                ("meta.processing", ASCENDING),
+            ]
+        ),
+    ],
+    # Quote requests are only read by _id
+    "quote_req": [],
+    "quote_tasks": [
+        IndexModel("id"),
+        IndexModel("request_id"),
+        IndexModel("status"),
+    ],
+}
+
+# TTL indexes of earlier releases that would expire documents behind the
+# back of the current ones; dropped when the collection is ensured
+LEGACY_TTL_INDEXES: Dict[str, List[str]] = {
+    # plugin_cache used to expire every entry 60 minutes after created_at
+    "plugin_cache": ["created_at"],
+}
+
+
+class MongoIndexBootstrap:
+    """
+    Creates the indexes of MONGO_INDEXES lazily, once per collection and process.
+
+    Call `ensure(name)` before the first use of a collection; only the first
+    call talks to Mongo. Failures are logged and retried after
+    RETRY_AFTER_SECONDS instead of failing the request.
+    """
+
+    RETRY_AFTER_SECONDS = 60
+
+    def __init__(self):
+        self._ensured = set()
+        self._failed_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def ensure(self, collection_name: str) -> bool:
+        if collection_name in self._ensured:
+            return True
+
+        with self._lock:
+            if collection_name in self._ensured:
+                return True
+            failed_at = self._failed_at.get(collection_name)
+            if failed_at and time.monotonic() - failed_at < self.RETRY_AFTER_SECONDS:
+                return False
+
+            try:
+                self._create(collection_name)
+            except PyMongoError as e:
+                logger.warning("Could not ensure indexes on %s: %s", collection_name, e)
+                self._failed_at[collection_name] = time.monotonic()
+                return False
+
+            self._failed_at.pop(collection_name, None)
+            self._ensured.add(collection_name)
+            return True
+
+    def ensure_all(self, force: bool = False) -> Dict[str, Optional[List[str]]]:
+        """Ensure every registered collection; index names per collection, None on failure"""
+        if force:
+            with self._lock:
+                self._ensured.clear()
+                self._failed_at.clear()
+
+        result = {}
+        for collection_name, indexes in MONGO_INDEXES.items():
+            ok = self.ensure(collection_name)
+            result[collection_name] = (
+                [index.document["name"] for index in indexes] if ok else None
+            )
+        return result
+
+    def _create(self, collection_name: str) -> None:
+        collection = getattr(mongodb, collection_name)
+        if collection_name in LEGACY_TTL_INDEXES:
+            self._drop_legacy_ttl_indexes(collection_name, collection)
+        indexes = MONGO_INDEXES.get(collection_name, [])
+        if indexes:
+            # create_indexes is a no-op for indexes that already exist
+            collection.create_indexes(indexes)
+
+    def _drop_legacy_ttl_indexes(self, collection_name: str, collection) -> None:
+        fields = LEGACY_TTL_INDEXES[collection_name]
+        for index in collection.list_indexes():
+            keys = list(index["key"])
+            if "expireAfterSeconds" in index and len(keys) == 1 and keys[0] in fields:
+                logger.warning(
+                    "Dropping legacy TTL index %s on %s", index["name"], collection_name
+                )
+                collection.drop_index(index["name"])
+
+
+mongo_indexes = MongoIndexBootstrap()
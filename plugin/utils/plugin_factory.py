@@ -13,6 +13,14 @@ from plugin.services.email_notification import providers as EmailProviders
 from plugin.services.sms_notification import providers as SMSProviders
 from plugin.services.vechile_rc_validation import providers as VehicleRCProviders
 from plugin.services.policy_extraction import providers as PolicyExtractionProviders
+from plugin.services.bankaccount_verification.models import (
+    BankAccountVerificationRequest,
+)
+from plugin.services.driving_license.models import DrivingLicenseVerificationRequest
+from plugin.services.ifsc_lookup.models import IFSCVerificationRequest
+from plugin.services.mobile_to_vehicle_rc.models import MobileToVehicleRCRequest
+from plugin.services.pan_validation.models import PANVerificationRequest
+from plugin.services.vechile_rc_validation.models import VehicleRCVerificationRequest
 
 
 class PluginFactory:
@@ -57,6 +65,23 @@ class PluginFactory:
     }
     #TODO
 
+    # Request models of the services whose `run` takes a single lookup request
+    _request_models = {
+        PluginService.VEHICLE_RC_VERIFICATION: VehicleRCVerificationRequest,
+        PluginService.PAN_VALIDATION: PANVerificationRequest,
+        PluginService.DRIVING_LICENSE_VERIFICATION: DrivingLicenseVerificationRequest,
+        PluginService.IFSC_LOOKUP: IFSCVerificationRequest,
+        PluginService.MOBILE_TO_VEHICLE_RC: MobileToVehicleRCRequest,
+        PluginService.BANK_ACCOUNT_VERIFICATION: BankAccountVerificationRequest,
+    }
+
+    @classmethod
+    def get_request_model(cls, service: PluginService | str):
+        try:
+            return cls._request_models[PluginService(service)]
+        except (KeyError, ValueError):
+            raise ValueError(f"No request model found for {service}")
+
     @classmethod
     def get_provider_class(
         cls, provider: PluginProvider | str, service: PluginService | str
@@ -0,0 +1,89 @@
+from typing import Any, Dict, Tuple
+
+from django.conf import settings
+
+from plugin.models import Plugin
+
+from .memory_cache import LRUCache
+from .plugin_factory import PluginFactory
+
+# Fields a provider instance is built from
+CONFIG_FIELDS = (
+    "provider",
+    "service",
+    "username",
+    "password",
+    "api_key",
+    "client_id",
+    "client_secret",
+)
+
+
+def _fingerprint(plugin: Plugin) -> Tuple:
+    return tuple(getattr(plugin, field) for field in CONFIG_FIELDS)
+
+
+class PluginRegistry:
+    """
+    Process-local cache of Plugin rows by uid and of the provider instances
+    built from them, so the request path skips the Plugin query and the
+    provider (and DeepvueAuth) construction.
+
+    Entries of a plugin are dropped by the post_save/post_delete signals of
+    the worker that changed it. Other workers keep serving the old plugin,
+    credentials included, until their entry expires: for up to TTL_SECONDS
+    (PLUGIN_REGISTRY_TTL_SECONDS) after the change. The TTL is kept short as
+    that is the only bound on the window; a few seconds still saves the
+    Plugin query for all but one request of a busy plugin. Providers are
+    rebuilt whenever the plugin they are asked for differs from the one they
+    were built from, so a freshly loaded plugin never runs with stale
+    credentials. Cached plugins are shared between threads and must not be
+    modified.
+    """
+
+    TTL_SECONDS = 5
+    MAX_ENTRIES = 1024
+
+    def __init__(self):
+        max_entries = getattr(settings, "PLUGIN_REGISTRY_MAX_ENTRIES", self.MAX_ENTRIES)
+        self.ttl_seconds = getattr(
+            settings, "PLUGIN_REGISTRY_TTL_SECONDS", self.TTL_SECONDS
+        )
+        self._plugins = LRUCache(max_entries)
+        # uid -> (fingerprint of the plugin, provider instance)
+        self._providers = LRUCache(max_entries)
+
+    def get_plugin(self, uid: str) -> Plugin:
+        """Plugin by uid; raises Plugin.DoesNotExist like Plugin.objects.get"""
+        plugin = self._plugins.get(uid)
+        if plugin is None:
+            plugin = Plugin.objects.get(uid=uid)
+            self._plugins.set(uid, plugin, self.ttl_seconds)
+        return plugin
+
+    def get_provider(self, plugin: Plugin) -> Any:
+        fingerprint = _fingerprint(plugin)
+        entry = self._providers.get(plugin.uid)
+        if entry is not None and entry[0] == fingerprint:
+            return entry[1]
+
+        provider_class = PluginFactory.get_provider_class(
+            plugin.provider, plugin.service
+        )
+        provider = provider_class(plugin)
+        self._providers.set(plugin.uid, (fingerprint, provider), self.ttl_seconds)
+        return provider
+
+    def invalidate(self, uid: str) -> None:
+        self._plugins.delete(uid)
+        self._providers.delete(uid)
+
+    def clear(self) -> None:
+        self._plugins.clear()
+        self._providers.clear()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {"plugins": self._plugins.stats(), "providers": self._providers.stats()}
+
+
+plugin_registry = PluginRegistry()
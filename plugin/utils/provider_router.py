@@ -0,0 +1,103 @@
+import math
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from .circuit_breaker import circuit_breaker
+
+if TYPE_CHECKING:
+    from plugin.models import Plugin
+
+
+class _Score:
+    def __init__(self):
+        self.latency_ms: Optional[float] = None
+        self.error_rate = 0.0
+        self.updated_at = 0.0
+        self.calls = 0
+
+
+class ProviderRouter:
+    """
+    Ranks the plugins a company configured for a service by the recent health
+    of their providers.
+
+    Upstream calls feed an exponentially weighted latency and error rate per
+    (service, provider). Plugins are tried in order of expected time to a
+    good answer, latency / success rate; providers never measured come first
+    so they get a score, providers with an open circuit come last. Error
+    rates fade between calls so a provider that failed for a while gets
+    traffic again. Scores are kept per worker process.
+    """
+
+    ALPHA = 0.2
+    ERROR_HALF_LIFE_SECONDS = 60
+    MIN_SUCCESS_RATE = 0.05
+    UNKNOWN_LATENCY_MS = 5000
+
+    def __init__(self):
+        self._scores: Dict[Tuple[str, str], _Score] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, plugin: "Plugin", failed: bool, elapsed_seconds: float) -> None:
+        key = (plugin.service, plugin.provider)
+        now = time.monotonic()
+        with self._lock:
+            score = self._scores.setdefault(key, _Score())
+            error_rate = self._error_rate(score, now)
+            score.error_rate = error_rate + self.ALPHA * (float(failed) - error_rate)
+            if not failed:
+                # Failures are often fast, they must not make a provider look quick
+                latency_ms = elapsed_seconds * 1000
+                if score.latency_ms is None:
+                    score.latency_ms = latency_ms
+                else:
+                    score.latency_ms += self.ALPHA * (latency_ms - score.latency_ms)
+            score.updated_at = now
+            score.calls += 1
+
+    def rank(self, plugins: List["Plugin"]) -> List["Plugin"]:
+        now = time.monotonic()
+        with self._lock:
+            costs = [
+                self._cost(self._scores.get((plugin.service, plugin.provider)), now)
+                for plugin in plugins
+            ]
+        order = sorted(
+            range(len(plugins)),
+            key=lambda i: (circuit_breaker.is_open(plugins[i].provider), costs[i]),
+        )
+        return [plugins[i] for i in order]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                f"{service}:{provider}": {
+                    "latency_ms": (
+                        round(score.latency_ms)
+                        if score.latency_ms is not None
+                        else None
+                    ),
+                    "error_rate": round(self._error_rate(score, now), 4),
+                    "calls": score.calls,
+                }
+                for (service, provider), score in self._scores.items()
+            }
+
+    def _error_rate(self, score: _Score, now: float) -> float:
+        age = now - score.updated_at
+        return score.error_rate * math.pow(0.5, age / self.ERROR_HALF_LIFE_SECONDS)
+
+    def _cost(self, score: Optional[_Score], now: float) -> float:
+        if score is None:
+            return 0.0
+        latency_ms = score.latency_ms
+        if latency_ms is None:
+            # Only failures so far
+            latency_ms = self.UNKNOWN_LATENCY_MS
+        success_rate = max(1 - self._error_rate(score, now), self.MIN_SUCCESS_RATE)
+        return latency_ms / success_rate
+
+
+provider_router = ProviderRouter()
@@ -0,0 +1,275 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from django.conf import settings
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+
+from core.database import mongodb
+from plugin.enums import PluginProvider
+
+from .mongo_indexes import mongo_indexes
+
+if TYPE_CHECKING:
+    from plugin.models import Plugin
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    # Sustained calls per second and how many may go out back to back
+    rate_per_second: Optional[float] = None
+    burst: int = 1
+    # Calls in flight at once, across every worker using the plugin
+    max_in_flight: Optional[int] = None
+    # How long a call waits for a token and a slot before giving up
+    max_wait_seconds: float = 30.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.rate_per_second or self.max_in_flight)
+
+
+NO_RATE_LIMIT = RateLimit()
+
+# Limits apply per plugin, i.e. per set of provider credentials
+RATE_LIMITS: Dict[str, RateLimit] = {
+    PluginProvider.DEEPVUE: RateLimit(rate_per_second=10, burst=10, max_in_flight=10),
+    PluginProvider.UNISEN: RateLimit(rate_per_second=2, burst=2, max_in_flight=2),
+}
+
+
+def get_rate_limit(provider: str) -> RateLimit:
+    """
+    Limit for a provider, with optional per-field overrides from
+    settings.PLUGIN_RATE_LIMITS, e.g. {"deepvue": {"rate_per_second": 25}}
+    """
+    limit = RATE_LIMITS.get(provider, NO_RATE_LIMIT)
+    overrides = getattr(settings, "PLUGIN_RATE_LIMITS", {}).get(str(provider))
+    if overrides:
+        limit = replace(limit, **overrides)
+    return limit
+
+
+class RateLimited(Exception):
+    def __init__(self, plugin_uid: str, max_wait_seconds: float):
+        super().__init__(
+            f"Rate limit of plugin {plugin_uid} exceeded, "
+            f"no capacity within {max_wait_seconds:g}s"
+        )
+        self.plugin_uid = plugin_uid
+
+
+class PluginRateLimiter:
+    """
+    Token bucket and in-flight limit per Plugin.uid, shared by all workers.
+
+    The bucket is kept in `plugin_rate_limits` in its GCRA form: a single
+    "theoretical arrival time" advanced by one interval per call, updated
+    atomically in one round trip. In-flight calls hold one of max_in_flight
+    leased slot documents in `plugin_rate_slots`; leases expire on their own
+    if a worker dies mid-call. Callers wait for capacity instead of sending
+    requests the provider would reject. Mongo errors fail open.
+    """
+
+    LEASE_SECONDS = 60
+    MIN_POLL_SECONDS = 0.02
+    MAX_POLL_SECONDS = 0.5
+
+    def __init__(self):
+        self._slots_created = set()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def limit(self, plugin: "Plugin", max_wait_seconds: Optional[float] = None):
+        limit = self._limit_for(plugin, max_wait_seconds)
+        if not limit.enabled:
+            yield
+            return
+
+        started = time.monotonic()
+        slot = None
+        if limit.max_in_flight:
+            while True:
+                slot, wait = self._try_slot(plugin.uid, limit)
+                if slot or not wait:
+                    break
+                time.sleep(self._pause(plugin.uid, started, wait, limit))
+        try:
+            if limit.rate_per_second:
+                while True:
+                    wait = self._try_token(plugin.uid, limit)
+                    if not wait:
+                        break
+                    time.sleep(self._pause(plugin.uid, started, wait, limit))
+            yield
+        finally:
+            if slot:
+                self._release_slot(*slot)
+
+    @asynccontextmanager
+    async def alimit(self, plugin: "Plugin", max_wait_seconds: Optional[float] = None):
+        """limit() for coroutines: waits on the loop, Mongo calls in threads"""
+        limit = self._limit_for(plugin, max_wait_seconds)
+        if not limit.enabled:
+            yield
+            return
+
+        started = time.monotonic()
+        slot = None
+        if limit.max_in_flight:
+            while True:
+                slot, wait = await asyncio.to_thread(self._try_slot, plugin.uid, limit)
+                if slot or not wait:
+                    break
+                await asyncio.sleep(self._pause(plugin.uid, started, wait, limit))
+        try:
+            if limit.rate_per_second:
+                while True:
+                    wait = await asyncio.to_thread(self._try_token, plugin.uid, limit)
+                    if not wait:
+                        break
+                    await asyncio.sleep(self._pause(plugin.uid, started, wait, limit))
+            yield
+        finally:
+            if slot:
+                await asyncio.to_thread(self._release_slot, *slot)
+
+    def _limit_for(
+        self, plugin: "Plugin", max_wait_seconds: Optional[float]
+    ) -> RateLimit:
+        limit = get_rate_limit(plugin.provider)
+        if max_wait_seconds is not None:
+            limit = replace(limit, max_wait_seconds=max_wait_seconds)
+        return limit
+
+    def _pause(self, plugin_uid: str, started: float, wait: float, limit: RateLimit):
+        waited = time.monotonic() - started
+        if waited + wait > limit.max_wait_seconds:
+            raise RateLimited(plugin_uid, limit.max_wait_seconds)
+        return min(max(wait, self.MIN_POLL_SECONDS), self.MAX_POLL_SECONDS)
+
+    def _try_token(self, plugin_uid: str, limit: RateLimit) -> float:
+        """Take a token: 0 when granted, else the seconds until one is available"""
+        interval_ms = 1000.0 / limit.rate_per_second
+        tolerance_ms = interval_ms * (max(limit.burst, 1) - 1)
+        now = datetime.utcnow()
+        now_ms = time.time() * 1000
+        try:
+            mongo_indexes.ensure("plugin_rate_limits")
+            doc = mongodb.plugin_rate_limits.find_one_and_update(
+                {"_id": plugin_uid},
+                [
+                    # tat: epoch ms at which the bucket is full again
+                    {
+                        "$set": {
+                            "base": {"$max": [{"$ifNull": ["$tat", now_ms]}, now_ms]}
+                        }
+                    },
+                    {
+                        "$set": {
+                            "granted": {
+                                "$lte": [
+                                    {"$subtract": ["$base", now_ms]},
+                                    tolerance_ms,
+                                ]
+                            }
+                        }
+                    },
+                    {
+                        "$set": {
+                            "tat": {
+                                "$cond": [
+                                    "$granted",
+                                    {"$add": ["$base", interval_ms]},
+                                    "$base",
+                                ]
+                            },
+                            "expires_at": now
+                            + timedelta(
+                                milliseconds=interval_ms + tolerance_ms + 60000
+                            ),
+                        }
+                    },
+                ],
+                projection={"tat": 1, "granted": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # Concurrent first use of the bucket, try again right away
+            return self.MIN_POLL_SECONDS
+        except PyMongoError as e:
+            logger.warning("Plugin rate limiter unavailable: %s", e)
+            return 0.0
+
+        if doc.get("granted"):
+            return 0.0
+        ready_in_ms = doc["tat"] - tolerance_ms - now_ms
+        return max(ready_in_ms / 1000, self.MIN_POLL_SECONDS)
+
+    def _try_slot(
+        self, plugin_uid: str, limit: RateLimit
+    ) -> Tuple[Optional[Tuple[str, str]], float]:
+        """((slot id, lease token), 0) once leased, else (None, seconds to wait)"""
+        slot_ids = [f"{plugin_uid}:{i}" for i in range(limit.max_in_flight)]
+        now = datetime.utcnow()
+        lease = uuid.uuid4().hex
+        try:
+            self._create_slots(plugin_uid, slot_ids)
+            doc = mongodb.plugin_rate_slots.find_one_and_update(
+                {
+                    "_id": {"$in": slot_ids},
+                    "$or": [
+                        {"lease_expires_at": {"$exists": False}},
+                        {"lease_expires_at": {"$lt": now}},
+                    ],
+                },
+                {
+                    "$set": {
+                        "lease": lease,
+                        "lease_expires_at": now + timedelta(seconds=self.LEASE_SECONDS),
+                    }
+                },
+                projection={"_id": 1},
+            )
+        except PyMongoError as e:
+            logger.warning("Plugin rate limiter unavailable: %s", e)
+            return None, 0.0
+        if doc is None:
+            return None, self.MIN_POLL_SECONDS * 5
+        return (doc["_id"], lease), 0.0
+
+    def _create_slots(self, plugin_uid: str, slot_ids: list) -> None:
+        marker = (plugin_uid, len(slot_ids))
+        if marker in self._slots_created:
+            return
+        try:
+            mongodb.plugin_rate_slots.insert_many(
+                [{"_id": slot_id, "plugin_uid": plugin_uid} for slot_id in slot_ids],
+                ordered=False,
+            )
+        except BulkWriteError:
+            pass  # Created by another worker
+        with self._lock:
+            self._slots_created.add(marker)
+
+    def _release_slot(self, slot_id: str, lease: str) -> None:
+        try:
+            mongodb.plugin_rate_slots.update_one(
+                {"_id": slot_id, "lease": lease},
+                {"$unset": {"lease": "", "lease_expires_at": ""}},
+            )
+        except PyMongoError:
+            pass  # The lease expires on its own
+
+
+rate_limiter = PluginRateLimiter()
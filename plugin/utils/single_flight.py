@@ -0,0 +1,284 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set
+
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from core.database import mongodb
+
+from .mongo_indexes import mongo_indexes
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _AsyncCall:
+    def __init__(self):
+        self.done = asyncio.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent identical provider calls into a single upstream request.
+
+    Threads of the same process wait on the leader's result. Other workers see
+    the leader's marker in `plugin_cache_inflight` and poll the shared cache
+    until the leader has written the response (or the marker disappears).
+    Coroutines use ado()/arefresh_in_background(), where the tasks of one
+    event loop wait on the leader task instead of a thread.
+    """
+
+    MARKER_TTL_SECONDS = 60
+    POLL_INTERVAL_SECONDS = 0.25
+    REFRESH_WORKERS = 4
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        # (event loop, key) -> call; only touched from the loop's own thread
+        self._async_calls: Dict[tuple, _AsyncCall] = {}
+        self._refresh_tasks: Set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+        self._owner = uuid.uuid4().hex
+        self._refresh_executor = ThreadPoolExecutor(
+            max_workers=self.REFRESH_WORKERS, thread_name_prefix="plugin-cache-refresh"
+        )
+
+    def do(
+        self,
+        key: tuple,
+        fn: Callable[[], Any],
+        load_shared: Callable[[], Optional[Any]],
+    ) -> Any:
+        """
+        Run `fn` once per `key` across threads and workers. `load_shared` is
+        used by waiting workers to pick up the leader's cached result.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+
+        if not is_leader:
+            if call.done.wait(self.MARKER_TTL_SECONDS):
+                if call.error is not None:
+                    raise call.error
+                if call.result is not None:
+                    return call.result
+            return fn()
+
+        try:
+            call.result = self._run_leader(key, fn, load_shared)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def refresh_in_background(self, key: tuple, fn: Callable[[], Any]) -> None:
+        """
+        Schedule `fn` on the refresh pool unless the same key is already being
+        fetched by this process or, through its marker, by another worker.
+        """
+        with self._lock:
+            if key in self._calls:
+                return
+            call = self._calls[key] = _Call()
+        self._refresh_executor.submit(self._refresh, key, call, fn)
+
+    def _refresh(self, key: tuple, call: _Call, fn: Callable[[], Any]) -> None:
+        marker_id = ":".join(str(part) for part in key)
+        try:
+            if self._claim(marker_id):
+                try:
+                    call.result = fn()
+                finally:
+                    self._release(marker_id)
+        except Exception as e:
+            logger.warning("Background cache refresh failed for %s: %s", marker_id, e)
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def _run_leader(
+        self,
+        key: tuple,
+        fn: Callable[[], Any],
+        load_shared: Callable[[], Optional[Any]],
+    ) -> Any:
+        marker_id = ":".join(str(part) for part in key)
+
+        if not self._claim(marker_id):
+            result = self._wait_for_remote(marker_id, load_shared)
+            if result is not None:
+                return result
+            return fn()
+
+        try:
+            return fn()
+        finally:
+            self._release(marker_id)
+
+    def _claim(self, marker_id: str) -> bool:
+        now = datetime.utcnow()
+        marker = {
+            "owner": self._owner,
+            "expires_at": now + timedelta(seconds=self.MARKER_TTL_SECONDS),
+        }
+        try:
+            mongo_indexes.ensure("plugin_cache_inflight")
+            mongodb.plugin_cache_inflight.insert_one({"_id": marker_id, **marker})
+            return True
+        except DuplicateKeyError:
+            # Take over markers left behind by a crashed worker
+            taken = mongodb.plugin_cache_inflight.find_one_and_update(
+                {"_id": marker_id, "expires_at": {"$lt": now}},
+                {"$set": marker},
+            )
+            return taken is not None
+        except PyMongoError:
+            # Coalescing is best-effort, never block the call on Mongo
+            return True
+
+    def _release(self, marker_id: str) -> None:
+        try:
+            mongodb.plugin_cache_inflight.delete_one(
+                {"_id": marker_id, "owner": self._owner}
+            )
+        except PyMongoError:
+            pass
+
+    def _wait_for_remote(
+        self, marker_id: str, load_shared: Callable[[], Optional[Any]]
+    ) -> Optional[Any]:
+        deadline = time.monotonic() + self.MARKER_TTL_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(self.POLL_INTERVAL_SECONDS)
+            result = load_shared()
+            if result is not None:
+                return result
+            try:
+                if not mongodb.plugin_cache_inflight.find_one({"_id": marker_id}):
+                    return load_shared()
+            except PyMongoError:
+                return None
+        return None
+
+    async def ado(
+        self,
+        key: tuple,
+        fn: Callable[[], Awaitable[Any]],
+        load_shared: Callable[[], Awaitable[Optional[Any]]],
+    ) -> Any:
+        """do() for coroutines; Mongo marker I/O runs in worker threads"""
+        call_key = (asyncio.get_running_loop(), key)
+        call = self._async_calls.get(call_key)
+        if call is not None:
+            try:
+                await asyncio.wait_for(call.done.wait(), self.MARKER_TTL_SECONDS)
+            except asyncio.TimeoutError:
+                return await fn()
+            if call.error is not None:
+                raise call.error
+            if call.result is not None:
+                return call.result
+            return await fn()
+
+        call = self._async_calls[call_key] = _AsyncCall()
+        try:
+            call.result = await self._arun_leader(key, fn, load_shared)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._async_calls.pop(call_key, None)
+            call.done.set()
+
+    def arefresh_in_background(
+        self, key: tuple, fn: Callable[[], Awaitable[Any]]
+    ) -> None:
+        """refresh_in_background() for coroutines, run as a task of the running loop"""
+        loop = asyncio.get_running_loop()
+        call_key = (loop, key)
+        if call_key in self._async_calls:
+            return
+        call = self._async_calls[call_key] = _AsyncCall()
+        task = loop.create_task(self._arefresh(call_key, call, fn))
+        # The loop only keeps weak references to its tasks
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
+
+    async def _arefresh(
+        self, call_key: tuple, call: _AsyncCall, fn: Callable[[], Awaitable[Any]]
+    ) -> None:
+        marker_id = ":".join(str(part) for part in call_key[1])
+        try:
+            if await asyncio.to_thread(self._claim, marker_id):
+                try:
+                    call.result = await fn()
+                finally:
+                    await asyncio.to_thread(self._release, marker_id)
+        except Exception as e:
+            logger.warning("Background cache refresh failed for %s: %s", marker_id, e)
+        finally:
+            self._async_calls.pop(call_key, None)
+            call.done.set()
+
+    async def _arun_leader(
+        self,
+        key: tuple,
+        fn: Callable[[], Awaitable[Any]],
+        load_shared: Callable[[], Awaitable[Optional[Any]]],
+    ) -> Any:
+        marker_id = ":".join(str(part) for part in key)
+
+        if not await asyncio.to_thread(self._claim, marker_id):
+            result = await self._await_remote(marker_id, load_shared)
+            if result is not None:
+                return result
+            return await fn()
+
+        try:
+            return await fn()
+        finally:
+            await asyncio.to_thread(self._release, marker_id)
+
+    async def _await_remote(
+        self, marker_id: str, load_shared: Callable[[], Awaitable[Optional[Any]]]
+    ) -> Optional[Any]:
+        deadline = time.monotonic() + self.MARKER_TTL_SECONDS
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.POLL_INTERVAL_SECONDS)
+            result = await load_shared()
+            if result is not None:
+                return result
+            try:
+                marker = await asyncio.to_thread(
+                    mongodb.plugin_cache_inflight.find_one, {"_id": marker_id}
+                )
+            except PyMongoError:
+                return None
+            if not marker:
+                return await load_shared()
+        return None
+
+
+single_flight = SingleFlight()
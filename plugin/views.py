@@ -1,6 +1,9 @@
 # views.py
+import json
 
+from asgiref.sync import sync_to_async
 from django.db import IntegrityError
+from django.http import Http404, StreamingHttpResponse
 from drf_yasg.utils import swagger_auto_schema
 from pydantic import ValidationError
 from rest_framework import status
@@ -9,7 +12,11 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from core.views import PermissionScopedViewSet, module_permission
+from core.views import (
+    AsyncPermissionScopedViewSet,
+    PermissionScopedViewSet,
+    module_permission,
+)
 from permission.enums import Module, Operation
 from plugin.enums import PluginProvider, PluginService
 from plugin.services.aadhaar_verification.models import (
@@ -87,10 +94,21 @@ from plugin.services.pan_eligibility.serializers import (
     PANEligibilityResponseSerializer,
 )
 
+from plugin.utils.batch_verification import BatchResult, BatchVerifier
+from plugin.utils.cache_metrics import cache_metrics
+from plugin.utils.cache_service import cache_service
+from plugin.utils.cache_warmup import get_warmup_job, start_warmup_job
+from plugin.utils.circuit_breaker import circuit_breaker
+from plugin.utils.hedging import hedger
 from plugin.utils.plugin_factory import PluginFactory
+from plugin.utils.plugin_registry import plugin_registry
+from plugin.utils.provider_router import provider_router
 
 from .models import Plugin
+from .parsers import BatchJSONParser, RequestBodyTooLarge
 from .serializers import (
+    BatchVerificationRequestSerializer,
+    CacheWarmupRequestSerializer,
     PluginMaskedSerializer,
     PluginSerializer,
     PluginServiceSerializer,
@@ -221,6 +239,154 @@ class PluginViewSet(PermissionScopedViewSet):
         serializer = ProviderConfigSerializer(available_providers, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @swagger_auto_schema(
+        operation_summary="Plugin Cache Metrics",
+        operation_description="Cache hit ratio, upstream latency and spend per provider and service for the company. `days` limits the daily rollup (default 7).",
+        responses={200: "Cache metrics"},
+    )
+    @action(detail=False, methods=["get"], url_path="cache-metrics")
+    @module_permission(op=Operation.READ)
+    def cache_metrics(self, request, *args, **kwargs):
+        company = request.user.company if request.user.is_authenticated else None
+        if not company:
+            return Response(
+                {"error": "Company not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        try:
+            days = min(max(int(request.query_params.get("days", 7)), 1), 90)
+        except ValueError:
+            return Response(
+                {"error": "days must be an integer"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(
+            {
+                "daily": cache_metrics.daily(company.pk, days),
+                # Totals of the worker serving this request since it started
+                "process": cache_metrics.snapshot(company.pk),
+                "l1": cache_service.l1_stats(),
+                "circuits": circuit_breaker.snapshot(),
+                "hedging": hedger.snapshot(),
+                "routing": provider_router.snapshot(),
+                "registry": plugin_registry.stats(),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    @swagger_auto_schema(
+        operation_summary="Warm Plugin Cache",
+        operation_description="Run a batch of lookups (RC, PAN, DL or IFSC) through the plugin in the background so later requests are served from cache. Body: `requests` (list of at most 1000 request objects by default), optional `max_workers` and `rate_per_second`. Progress is saved as the job runs; larger batches are run with the `warm_plugin_cache` management command.",
+        request_body=CacheWarmupRequestSerializer,
+        responses={202: "Warm-up job accepted", 400: "Bad Request"},
+    )
+    @action(detail=True, methods=["post"], url_path="cache/warm")
+    @module_permission(op=Operation.UPDATE)
+    def warm_cache(self, request, *args, **kwargs):
+        plugin = self.get_object()
+        serializer = CacheWarmupRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data["requests"]
+
+        try:
+            job_id = start_warmup_job(
+                plugin,
+                items,
+                max_workers=serializer.validated_data.get("max_workers"),
+                rate_per_second=serializer.validated_data.get("rate_per_second"),
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            {"job_id": job_id, "status": "running", "total": len(items)},
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+    @swagger_auto_schema(
+        operation_summary="Get Plugin Cache Warm-up Status",
+        responses={200: "Warm-up job", 404: "Job not found"},
+    )
+    @action(
+        detail=True, methods=["get"], url_path="cache/warm/(?P<job_id>[0-9a-f]+)"
+    )
+    @module_permission(op=Operation.READ)
+    def warm_cache_status(self, request, job_id=None, *args, **kwargs):
+        plugin = self.get_object()
+        job = get_warmup_job(job_id, plugin)
+        if not job:
+            return Response(
+                {"error": "Warm-up job not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(job, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_summary="Batch Verification",
+        operation_description="Verify a batch of requests (RC, PAN, DL, IFSC, bank account or mobile-to-RC) with the plugin. Duplicates are verified once, cached results are served in bulk and the rest is fanned out to the provider. Body: `requests` (list of request objects), optional `max_concurrency`. Results are returned in input order (at most 500 requests). With `?stream=true` up to 20000 requests (a body of at most 16 MB, parsed before streaming starts) are accepted and one NDJSON line is written per item as it completes, followed by a summary line. `cached` tells whether an item was answered from the plugin cache.",
+        request_body=BatchVerificationRequestSerializer,
+        responses={200: "Batch results", 400: "Bad Request", 413: "Body too large"},
+    )
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path="batch",
+        parser_classes=[BatchJSONParser],
+    )
+    @module_permission(op=Operation.CREATE)
+    def batch(self, request, *args, **kwargs):
+        plugin = self.get_object()
+        # request.data holds the whole list: refuse large bodies up front, and
+        # the parser stops reading those without or with a wrong Content-Length
+        max_bytes = BatchVerifier.MAX_BODY_BYTES
+        too_large = Response(
+            {"error": f"Body larger than {max_bytes} bytes"},
+            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        )
+        if int(request.META.get("CONTENT_LENGTH") or 0) > max_bytes:
+            return too_large
+        try:
+            data = request.data
+        except RequestBodyTooLarge:
+            return too_large
+        serializer = BatchVerificationRequestSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data["requests"]
+
+        stream = request.query_params.get("stream") in ("1", "true")
+        max_items = (
+            BatchVerifier.STREAM_MAX_BATCH_SIZE
+            if stream
+            else BatchVerifier.MAX_BATCH_SIZE
+        )
+        if len(items) > max_items:
+            return Response(
+                {"error": f"At most {max_items} requests per batch"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            verifier = BatchVerifier(
+                plugin, serializer.validated_data.get("max_concurrency")
+            )
+            if stream:
+                return StreamingHttpResponse(
+                    self._ndjson_batch(verifier, items),
+                    content_type="application/x-ndjson",
+                )
+            result = verifier.run(items)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(result.to_dict(), status=status.HTTP_200_OK)
+
+    def _ndjson_batch(self, verifier, items):
+        result = BatchResult()
+        for line in verifier.stream(items, result):
+            yield json.dumps(line, default=str) + "\n"
+        summary = result.to_dict()
+        summary.pop("results")
+        yield json.dumps({"summary": summary}) + "\n"
+
     @swagger_auto_schema(
         operation_summary="Get Plugin with Masked Credentials",
         operation_description="Retrieve plugin configuration with sensitive fields masked for form prefilling",
@@ -309,7 +475,7 @@ class VehicleRCVerificationView(PermissionScopedViewSet):
     )
     def create(self, request, *args, **kwargs):
         try:
-            plugin = Plugin.objects.get(uid=kwargs.get("uid"))
+            plugin = plugin_registry.get_plugin(kwargs.get("uid"))
         except Plugin.DoesNotExist:
             return Response(
                 {"error": "Plugin not found"}, status=status.HTTP_404_NOT_FOUND
@@ -317,10 +483,7 @@ class VehicleRCVerificationView(PermissionScopedViewSet):
         try:
 
             req = VehicleRCVerificationRequest(**request.data)
-            provider_class = PluginFactory.get_provider_class(
-                plugin.provider, plugin.service
-            )
-            provider = provider_class(plugin)
+            provider = plugin_registry.get_provider(plugin)
 
             resp = provider.run(plugin, req)
 
@@ -361,10 +524,7 @@ class AadhaarVerificationViewSet(PermissionScopedViewSet):
         try:
             req_model = AadhaarOTPGenerateRequest(**request.data)
 
-            provider_class = PluginFactory.get_provider_class(
-                plugin.provider, plugin.service
-            )
-            provider = provider_class(plugin)
+            provider = plugin_registry.get_provider(plugin)
 
             resp_model: AadhaarOTPGenerateResponse = provider.generate_otp(
                 plugin, req_model
@@ -397,10 +557,7 @@ class AadhaarVerificationViewSet(PermissionScopedViewSet):
         try:
             req_model = AadhaarOTPVerifyRequest(**request.data)
 
-            provider_class = PluginFactory.get_provider_class(
-                plugin.provider, plugin.service
-            )
-            provider = provider_class(plugin)
+            provider = plugin_registry.get_provider(plugin)
 
             resp_model: AadhaarVerificationResponse = provider.verify_otp(
                 plugin, req_model
@@ -440,10 +597,7 @@ class DrivingLicenseVerificationViewSet(PermissionScopedViewSet):
         try:
             req = DrivingLicenseVerificationRequest(**request.data)
 
-            provider_class = PluginFactory.get_provider_class(
-                plugin.provider, plugin.service
-            )
-            provider = provider_class(plugin)
+            provider = plugin_registry.get_provider(plugin)
 
             resp = provider.run(plugin, req)
 
@@ -481,10 +635,7 @@ class PANVerificationViewSet(PermissionScopedViewSet):
         try:
             req = PANVerificationRequest(**request.data)
 
-            provider_class = PluginFactory.get_provider_class(
-                plugin.provider, plugin.service
-            )
-            provider = provider_class(plugin)
+            provider = plugin_registry.get_provider(plugin)
 
             resp = provider.run(plugin, req)
 
@@ -524,10 +675,7 @@ class MobileToVehicleRCViewSet(PermissionScopedViewSet):
 
             req = MobileToVehicleRCRequest(**request.data)
 
-            provider_class = PluginFactory.get_provider_class(
-                plugin.provider, plugin.service
-            )
-            provider = provider_class(plugin)
+            provider = plugin_registry.get_provider(plugin)
 
             resp = provider.run(plugin, req)
 
@@ -565,10 +713,7 @@ class BankAccountVerificationViewSet(PermissionScopedViewSet):
         try:
             req = BankAccountVerificationRequest(**request.data)
 
-            provider_class = PluginFactory.get_provider_class(
-                plugin.provider, plugin.service
-            )
-            provider = provider_class(plugin)
+            provider = plugin_registry.get_provider(plugin)
 
             resp = provider.run(plugin, req)
 
@@ -603,10 +748,7 @@ class IfscLookUpViewSet(PermissionScopedViewSet):
         try:
             req = IFSCVerificationRequest(**request.data)
 
-            provider_class = PluginFactory.get_provider_class(
-                plugin.provider, plugin.service
-            )
-            provider = provider_class(plugin)
+            provider = plugin_registry.get_provider(plugin)
 
             resp = provider.run(plugin, req)
 
@@ -616,6 +758,132 @@ class IfscLookUpViewSet(PermissionScopedViewSet):
             return Response({"errors": ve.detail}, status=status.HTTP_400_BAD_REQUEST)
 
 
+class AsyncPluginVerificationViewSet(AsyncPermissionScopedViewSet):
+    """
+    Async variants of the verification endpoints. Providers are awaited
+    through `arun`, so a worker keeps serving other requests while upstream
+    calls are in flight.
+    """
+
+    modules = [Module.PLUGIN]
+    queryset = Plugin.objects.all()
+    lookup_field = "uid"
+
+    async def _verify(self, request, request_model):
+        try:
+            plugin = await sync_to_async(self.get_object)()
+        except (Plugin.DoesNotExist, Http404):
+            return Response(
+                {"error": "Plugin not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        try:
+            req = request_model(**request.data)
+        except ValidationError as ve:
+            return Response({"errors": ve.errors()}, status=status.HTTP_400_BAD_REQUEST)
+
+        provider = plugin_registry.get_provider(plugin)
+
+        resp = await provider.arun(plugin, req)
+
+        return Response(resp.model_dump(), status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_summary="Verify Vehicle RC (async)",
+        operation_description="Verify the vehicle registration certificate (RC) using the provided RC number.",
+        request_body=VehicleRCVerificationRequestSerializer,
+        responses={
+            200: VehicleRCVerificationResponseSerializer,
+            400: "Bad Request",
+            404: "Plugin not found",
+        },
+    )
+    @module_permission(op=Operation.CREATE)
+    @action(detail=True, methods=["post"], url_path="vehicle-rc", url_name="verify-rc")
+    async def verify_vehicle_rc(self, request, *args, **kwargs):
+        return await self._verify(request, VehicleRCVerificationRequest)
+
+    @swagger_auto_schema(
+        operation_summary="Verify Driving License (async)",
+        operation_description="Submit DL number + DOB → internally calls POST (submit) + GET (details) and returns final DL details.",
+        request_body=DrivingLicenseVerificationRequestSerializer,
+        responses={
+            200: DrivingLicenseVerificationResponseSerializer,
+            400: "Bad Request",
+            404: "Plugin not found",
+        },
+    )
+    @module_permission(op=Operation.CREATE)
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path="driving-license/verify",
+        url_name="verify-dl",
+    )
+    async def verify_driving_license(self, request, *args, **kwargs):
+        return await self._verify(request, DrivingLicenseVerificationRequest)
+
+    @swagger_auto_schema(
+        operation_summary="Verify PAN (async)",
+        operation_description="Validate PAN number using Deepvue PAN+ API",
+        request_body=PANVerificationRequestSerializer,
+        responses={
+            200: PANVerificationResponseSerializer,
+            400: "Bad Request",
+            404: "Plugin not found",
+        },
+    )
+    @module_permission(op=Operation.CREATE)
+    @action(detail=True, methods=["post"], url_path="pan/verify", url_name="verify-pan")
+    async def verify_pan(self, request, *args, **kwargs):
+        return await self._verify(request, PANVerificationRequest)
+
+    @swagger_auto_schema(
+        operation_summary="Fetch Vehicle RC from Mobile Number (async)",
+        operation_description="Fetch the Vehicle RC numbers linked to a mobile number using Deepvue API",
+        request_body=MobileToVehicleRCRequestSerializer,
+        responses={200: MobileToVehicleRCResponseSerializer},
+    )
+    @module_permission(op=Operation.CREATE)
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path="mobile-to-vehicle-rc",
+        url_name="mobile-to-vehicle-rc",
+    )
+    async def fetch_vehicle_rc(self, request, *args, **kwargs):
+        return await self._verify(request, MobileToVehicleRCRequest)
+
+    @swagger_auto_schema(
+        operation_summary="Bank Account Verification - Penny Drop (async)",
+        operation_description="Verify bank account & IFSC combination via penny drop check using Deepvue API.",
+        request_body=BankAccountVerificationRequestSerializer,
+        responses={200: BankAccountVerificationResponseSerializer},
+    )
+    @module_permission(op=Operation.CREATE)
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path="bank-account-verification",
+        url_name="bank-account-verification",
+    )
+    async def verify_bank_account(self, request, *args, **kwargs):
+        return await self._verify(request, BankAccountVerificationRequest)
+
+    @swagger_auto_schema(
+        operation_summary="IFSC Code Verification (async)",
+        operation_description="Verify IFSC code using Deepvue API.",
+        request_body=IFSCVerificationRequestSerializer,
+        responses={200: IFSCVerificationResponseSerializer},
+    )
+    @module_permission(op=Operation.CREATE)
+    @action(
+        detail=True, methods=["post"], url_path="ifsc-lookup", url_name="ifsc-lookup"
+    )
+    async def verify_ifsc(self, request, *args, **kwargs):
+        return await self._verify(request, IFSCVerificationRequest)
+
+
 class SMSViewSet(PermissionScopedViewSet):
     modules = [Module.PLUGIN]
     queryset = Plugin.objects.all()
@@ -636,15 +904,12 @@ class SMSViewSet(PermissionScopedViewSet):
             req = SMSRequest(**request.data)
 
             try:
-                plugin = Plugin.objects.get(uid=req.plugin_uid)
+                plugin = plugin_registry.get_plugin(req.plugin_uid)
             except Plugin.DoesNotExist:
                 return Response(
                     {"error": "Plugin not found"}, status=status.HTTP_404_NOT_FOUND
                 )
-            provider_class = PluginFactory.get_provider_class(
-                plugin.provider, plugin.service
-            )
-            provider = provider_class(plugin)
+            provider = plugin_registry.get_provider(plugin)
 
             resp = provider.run(plugin, req)
             return Response(resp.dict(), status=status.HTTP_200_OK)
@@ -669,14 +934,13 @@ class EmailViewSet(PermissionScopedViewSet):
         try:
             req = EmailRequest(**request.data)
             try:
-                plugin = Plugin.objects.get(uid=req.plugin_uid)
+                plugin = plugin_registry.get_plugin(req.plugin_uid)
             except Plugin.DoesNotExist:
                 return Response(
                     {"error": "Plugin not found"}, status=status.HTTP_404_NOT_FOUND
                 )
 
-            provider_class = PluginFactory.get_provider_class(plugin.provider, plugin.service)
-            provider = provider_class(plugin)
+            provider = plugin_registry.get_provider(plugin)
 
             resp = provider.run(plugin, req)
             return Response(resp.dict(), status=status.HTTP_200_OK)
@@ -700,14 +964,13 @@ class PANEligibilityViewSet(PermissionScopedViewSet):
         try:
             req = PANEligibilityRequest(**request.data)
             try:
-                plugin = Plugin.objects.get(uid=req.plugin_uid)
+                plugin = plugin_registry.get_plugin(req.plugin_uid)
             except Plugin.DoesNotExist:
                 return Response(
                     {"error": "Plugin not found"}, status=status.HTTP_404_NOT_FOUND
                 )
 
-            provider_class = PluginFactory.get_provider_class(plugin.provider, plugin.service)
-            provider = provider_class(plugin)
+            provider = plugin_registry.get_provider(plugin)
 
             resp = provider.run(plugin, req)
             return Response(resp.dict(), status=status.HTTP_200_OK)
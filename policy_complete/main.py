@@ -1,10 +1,15 @@
-from fastapi import FastAPI, BackgroundTasks
+from fastapi import FastAPI
 import logging
 import asyncio
 
 from models import StartCompanyProcessingRequest
-from services import process_company_files_with_acquired_lock  # Fixed import
-from locks import get_company_lock, try_acquire_company_lock_immediately, check_company_processing_status
+from services import close_extraction_client
+from locks import (
+    check_company_processing_status,
+    company_lock_stats,
+    release_company_locks,
+)
+from scheduler import scheduler
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -12,29 +17,24 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Policy Extraction Microservice", version="1.0.0")
 
+@app.on_event("startup")
+async def startup():
+    scheduler.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await scheduler.stop()
+    await release_company_locks()
+    await close_extraction_client()
+
 # ====================== API ENDPOINTS ======================
 
 @app.post("/start-company-processing")
-async def start_company_processing(request: StartCompanyProcessingRequest, background_tasks: BackgroundTasks):
+async def start_company_processing(request: StartCompanyProcessingRequest):
     """Start pull-based processing for a company (race-condition-free)"""
     
-    # Atomically try to acquire company lock immediately
-    acquired, company_lock = await try_acquire_company_lock_immediately(request.company_id)  # Fixed function name
-    
-    if not acquired:
-        return {
-            "status": "already_processing",
-            "message": f"Company {request.company_id} is already being processed"
-        }
-    
-    # Lock acquired - start background processing with the acquired lock
-    background_tasks.add_task(process_company_files_with_acquired_lock, request, company_lock)  # Fixed function call
-    
-    return {
-        "status": "started",
-        "company_id": request.company_id,
-        "message": "Pull-based processing started"
-    }
+    # The scheduler takes the company lock and queues the job in its lane
+    return await scheduler.submit(request)
 
 @app.get("/status/{company_id}")
 async def get_company_status(company_id: str):
@@ -42,9 +42,15 @@ async def get_company_status(company_id: str):
     is_processing = await check_company_processing_status(company_id)  # Fixed to use correct function
     return {
         "company_id": company_id,
-        "is_processing": is_processing
+        "is_processing": is_processing,
+        "queue": scheduler.company_status(company_id)
     }
 
+@app.get("/status")
+async def get_scheduler_status():
+    """Worker usage and queue depth of every company being processed, and company lock usage"""
+    return {**scheduler.stats(), "locks": company_lock_stats()}
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -0,0 +1,260 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from models import StartCompanyProcessingRequest, ProcessingLane
+from locks import CompanyLease, try_acquire_company_lock_immediately
+from services import (
+    COMPANY_MAX_WORKERS,
+    EXTRACTION_MAX_CONCURRENCY,
+    get_next_pending_file,
+    process_file,
+)
+
+logger = logging.getLogger(__name__)
+
+# Lanes in priority order: a worker only serves bulk jobs when no
+# interactive job can take it
+LANES = (ProcessingLane.INTERACTIVE, ProcessingLane.BULK)
+
+# On shutdown, how long files being processed get to finish before their
+# workers are cancelled; Django keeps cancelled files claimed until the
+# claim goes stale
+EXTRACTION_SHUTDOWN_SECONDS = float(os.getenv("EXTRACTION_SHUTDOWN_SECONDS", "120"))
+
+# ====================== COMPANY JOBS ======================
+
+class CompanyJob:
+    """Pull-based processing of one company's pending files"""
+
+    def __init__(self, request: StartCompanyProcessingRequest, company_lock: CompanyLease):
+        self.request = request
+        self.company_lock = company_lock
+        self.lane = request.lane
+        self.weight = request.weight
+        self.max_workers = request.max_workers or COMPANY_MAX_WORKERS
+        self.deficit = 0.0
+        self.in_flight = 0
+        self.processed = 0
+        self.failed = 0
+        self.remaining: Optional[int] = None
+        self.drained = False
+        self.started_at = time.time()
+
+    @property
+    def company_id(self) -> str:
+        return self.request.company_id
+
+    def can_run(self) -> bool:
+        return not self.drained and self.in_flight < self.max_workers
+
+    def status(self) -> dict:
+        return {
+            "company_id": self.company_id,
+            "lane": self.lane,
+            "weight": self.weight,
+            "max_workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "queued": self.remaining,
+            "processed": self.processed,
+            "failed": self.failed,
+            "running_for_seconds": round(time.time() - self.started_at, 1),
+        }
+
+# ====================== SCHEDULER ======================
+
+class ExtractionScheduler:
+    """
+    Central scheduler for company extraction jobs.
+
+    A fixed pool of workers (the global budget) pulls files one at a time
+    from the company chosen by deficit round robin: every visit tops up a
+    company's deficit by its weight and each file costs one, so companies in
+    the same lane share the workers in proportion to their weight whatever
+    their backlog. Interactive jobs are always picked before bulk ones, and
+    no company runs more than its max_workers files at once.
+    """
+
+    def __init__(self, max_workers: int = EXTRACTION_MAX_CONCURRENCY):
+        self.max_workers = max_workers
+        self._jobs: Dict[str, CompanyJob] = {}
+        self._rings: Dict[ProcessingLane, Deque[str]] = {lane: deque() for lane in LANES}
+        self._changed: Optional[asyncio.Condition] = None
+        self._workers: List[asyncio.Task] = []
+        self._busy = 0
+        self._stopping = False
+
+    def start(self):
+        """Start the worker pool on the running event loop"""
+        if self._workers or self._stopping:
+            return
+        self._changed = asyncio.Condition()
+        self._workers = [
+            asyncio.create_task(self._worker(worker_id))
+            for worker_id in range(self.max_workers)
+        ]
+        logger.info(f"Extraction scheduler started with {self.max_workers} workers")
+
+    async def stop(self, timeout: float = EXTRACTION_SHUTDOWN_SECONDS):
+        """Stop picking up files, let the ones in flight finish, then stop the workers"""
+        if not self._workers:
+            return
+        async with self._changed:
+            self._stopping = True
+            self._changed.notify_all()
+            try:
+                await asyncio.wait_for(
+                    self._changed.wait_for(lambda: self._busy == 0), timeout
+                )
+            except asyncio.TimeoutError:
+                logger.warning(f"Cancelling {self._busy} files still being processed after {timeout:g}s")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, request: StartCompanyProcessingRequest) -> dict:
+        """
+        Queue processing of a company's pending files.
+
+        Returns:
+            dict: "started", or "already_processing" when the company has a job
+        """
+        self.start()
+        if self._stopping:
+            return {
+                "status": "unavailable",
+                "message": "Extraction service is shutting down"
+            }
+        async with self._changed:
+            if self._resume(request.company_id):
+                return self._already_processing(request.company_id)
+
+        # The lease may go to Mongo: claim it without holding up the workers
+        acquired, company_lock = await try_acquire_company_lock_immediately(request.company_id)
+        if not acquired:
+            return self._already_processing(request.company_id)
+
+        async with self._changed:
+            # Holding the lease, no other submit can have queued the company
+            job = CompanyJob(request, company_lock)
+            self._jobs[job.company_id] = job
+            self._rings[job.lane].append(job.company_id)
+            self._changed.notify_all()
+
+        logger.info(f"Queued company {request.company_id} in {job.lane} lane")
+        return {
+            "status": "started",
+            "company_id": request.company_id,
+            "message": "Pull-based processing started"
+        }
+
+    def _resume(self, company_id: str) -> bool:
+        """Whether the company has a job; called with the condition held"""
+        job = self._jobs.get(company_id)
+        if not job:
+            return False
+        # Files uploaded while the job was finishing are picked up too
+        job.drained = False
+        self._changed.notify_all()
+        return True
+
+    @staticmethod
+    def _already_processing(company_id: str) -> dict:
+        return {
+            "status": "already_processing",
+            "message": f"Company {company_id} is already being processed"
+        }
+
+    def company_status(self, company_id: str) -> Optional[dict]:
+        job = self._jobs.get(company_id)
+        return job.status() if job else None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "busy_workers": self._busy,
+            "lanes": {
+                lane: [self._jobs[company_id].status() for company_id in ring]
+                for lane, ring in self._rings.items()
+            },
+        }
+
+    def _pick(self) -> Optional[CompanyJob]:
+        """Next job to pull a file for, by lane priority then deficit round robin"""
+        if self._stopping:
+            return None
+        for lane in LANES:
+            ring = self._rings[lane]
+            # One pass tops up every deficit, the second finds a job with credit
+            for _ in range(2 * len(ring)):
+                job = self._jobs[ring[0]]
+                if not job.can_run():
+                    ring.rotate(-1)
+                elif job.deficit < 1:
+                    job.deficit += job.weight
+                    ring.rotate(-1)
+                else:
+                    job.deficit -= 1
+                    return job
+        return None
+
+    async def _worker(self, worker_id: int):
+        while True:
+            async with self._changed:
+                job = self._pick()
+                while job is None:
+                    await self._changed.wait()
+                    job = self._pick()
+                job.in_flight += 1
+                self._busy += 1
+
+            processed = None
+            try:
+                processed = await self._run_one(job)
+            except Exception as e:
+                logger.error(f"Worker {worker_id} failed for company {job.company_id}: {str(e)}")
+            finally:
+                async with self._changed:
+                    job.in_flight -= 1
+                    self._busy -= 1
+                    if processed is None:
+                        # No pending file left, or Django is unreachable
+                        job.drained = True
+                    elif processed:
+                        job.processed += 1
+                    else:
+                        job.failed += 1
+                    if job.drained and job.in_flight == 0:
+                        self._finish(job)
+                    self._changed.notify_all()
+
+    async def _run_one(self, job: CompanyJob) -> Optional[bool]:
+        if job.company_lock.lost:
+            # Another replica took the company over, let it carry on
+            return None
+        request = job.request
+        pending_file = await get_next_pending_file(
+            request.django_base_url,
+            request.company_id,
+            request.jwt_token
+        )
+        if not pending_file:
+            return None
+        job.remaining = pending_file.remaining
+        return await process_file(request, pending_file)
+
+    def _finish(self, job: CompanyJob):
+        del self._jobs[job.company_id]
+        self._rings[job.lane].remove(job.company_id)
+        if job.company_lock.locked():
+            job.company_lock.release()
+        logger.info(
+            f"Completed processing for company {job.company_id}, "
+            f"processed {job.processed} files, {job.failed} failed"
+        )
+
+scheduler = ExtractionScheduler()
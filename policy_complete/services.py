@@ -1,6 +1,7 @@
 import httpx
 import logging
 import asyncio
+import os
 from typing import Optional
 
 from models import (
@@ -18,7 +19,6 @@ from models import (
     PolicyType,
     InsuredType
 )
-from locks import get_company_lock
 from utils import (
     break_vehicle_number,
     clean_amount,
@@ -33,6 +33,13 @@ from utils import (
 
 logger = logging.getLogger(__name__)
 
+# ====================== CONCURRENCY ======================
+
+# Files of one company processed at the same time, unless the request says otherwise
+COMPANY_MAX_WORKERS = int(os.getenv("COMPANY_MAX_WORKERS", "4"))
+# Files processed at the same time across all companies
+EXTRACTION_MAX_CONCURRENCY = int(os.getenv("EXTRACTION_MAX_CONCURRENCY", "16"))
+
 # ====================== PROVIDER MAPPING ======================
 
 PROVIDER_MAP = {
@@ -161,6 +168,24 @@ async def update_file_status(django_base_url: str, update_data: UpdateFileStatus
         )
         response.raise_for_status()
 
+# ====================== HTTP CLIENT ======================
+
+_extraction_client: Optional[httpx.AsyncClient] = None
+
+def get_extraction_client() -> httpx.AsyncClient:
+    """Shared client for extraction calls, so connections are reused across files"""
+    global _extraction_client
+    if _extraction_client is None or _extraction_client.is_closed:
+        _extraction_client = httpx.AsyncClient(timeout=Novoup.TIMEOUT)
+    return _extraction_client
+
+async def close_extraction_client():
+    """Close the shared extraction client on shutdown"""
+    global _extraction_client
+    if _extraction_client is not None:
+        await _extraction_client.aclose()
+        _extraction_client = None
+
 # ====================== FILE HANDLING SERVICES ======================
 
 async def download_file(file_url: str) -> tuple:
@@ -182,10 +207,15 @@ class AbstractPolicyExtractionProvider:
         """Extract policy data from the provided request"""
         raise NotImplementedError
 
+    async def arun(self, request: PolicyExtractionRequest) -> PolicyExtractionResponse:
+        """Non-blocking run(); providers with an async client override this"""
+        return await asyncio.to_thread(self.run, request)
+
 class Novoup(AbstractPolicyExtractionProvider):
     """Novoup policy extraction provider implementation"""
     
     URL = "https://coral-app-aqae8.ondigitalocean.app/api/providers/extract"
+    TIMEOUT = 30.0
 
     def __init__(self):
         super().__init__()
@@ -193,101 +223,123 @@ class Novoup(AbstractPolicyExtractionProvider):
     def run(self, request: PolicyExtractionRequest) -> PolicyExtractionResponse:
         """Extract policy data using Novoup API"""
         try:
-            with httpx.Client(timeout=30.0) as client:
+            with httpx.Client(timeout=self.TIMEOUT) as client:
                 response = client.post(
                     self.URL,
                     files={"pdf": request.file},
                 )
                 response.raise_for_status()
 
-            provider_id = response.json()["providerID"]
-            extracted_data = response.json().get("extractedData", {})
-            extract = NovoupExtractionResponse(**extracted_data)
-            provider_info = PROVIDER_MAP.get(provider_id, {})
-
-            obj = PolicyExtractionObject(
-                insurer=provider_info.get("insurer"),
-                product=provider_info.get("product"),
-                product_type=(
-                    ProductType.PRIVATE
-                    if provider_info.get("product_sub_type")
-                    in [ProductSubType.PC, ProductSubType.TW]
-                    else ProductType.COMMERCIAL
-                ),
-                product_sub_type=provider_info.get("product_sub_type"),
-                product_category=extract.product_category,
-                policy_category=extract.calc_policy_category(provider_info),
-                policy_type=extract.calc_policy_type(provider_info),
-                vehicle_registration_state=vehicle_number_to_state(extract.vehicle_number),
-                make=extract.make,
-                model=extract.model,
-                registration_number_1=break_vehicle_number(extract.vehicle_number)[0] if break_vehicle_number(extract.vehicle_number) else None,
-                registration_number_2=break_vehicle_number(extract.vehicle_number)[1] if break_vehicle_number(extract.vehicle_number) else None,
-                registration_number_3=break_vehicle_number(extract.vehicle_number)[2] if break_vehicle_number(extract.vehicle_number) else None,
-                registration_number_4=break_vehicle_number(extract.vehicle_number)[3] if break_vehicle_number(extract.vehicle_number) else None,
-                vehicle_registration_date=extract.registration_date,
-                make_year=extract.manufacturing_year,
-                vehicle_fuel_type=extract.vehicle_fuel_type,
-                vehicle_engine_number=extract.engine_number,
-                vehicle_chassis_number=extract.chassis_number,
-                vehicle_seating_capacity=extract.seating_capacity,
-                vehicle_cc=extract.engine_capacity_cc,
-                insured_type=(
-                    InsuredType.INDIVIDUAL
-                    if extract.business_type
-                    and extract.business_type.lower() == "individual"
-                    else None
-                ),
-                insured_name=extract.customer_name,
-                insured_address=extract.customer_address,
-                insured_mobile=clean_phone(extract.customer_phone),
-                insured_email=clean_email(extract.customer_email),
-                vehicle_rta=vehicle_number_to_rta(extract.vehicle_number, extract.rto_code),
-                vehicle_idv=clean_amount(extract.vehicle_idv),
-                last_policy_available=extract.last_policy_available,
-                last_insurer=clean_insurer(extract.previous_insurer_name),
-                last_policy_number=extract.previous_policy_number,
-                last_policy_to=extract.previous_policy_end_date or extract.prev_policy_expiry,
-                last_policy_ncb_percent=clean_ncb(extract.previous_ncb),
-                vehicle_gvw=clean_vehicle_gvw(extract.gross_vehicle_weight),
-                # Policy details
-                policy_number=extract.policy_number,
-                issue_date=extract.issue_date,
-                od_start_date=extract.od_start_date,
-                od_end_date=extract.od_end_date,
-                tp_start_date=extract.tp_start_date,
-                tp_end_date=extract.tp_end_date,
-                sum_insured=clean_amount(extract.sum_insured),
-                basic_od_premium=clean_amount(extract.basic_od_premium),
-                total_od_premium=clean_amount(extract.total_od_premium),
-                total_od_add_on_premium=clean_amount(extract.total_od_add_on_premium),
-                basic_tp_premium=clean_amount(extract.basic_tp_premium),
-                total_tp_premium=clean_amount(extract.total_tp_premium),
-                total_tp_add_on_premium=clean_amount(extract.total_tp_add_on_premium),
-                net_premium=clean_amount(extract.net_premium),
-                taxes=clean_amount(extract.taxes),
-                taxes_rate=clean_ncb(extract.taxes_rate),
-                gross_discount=clean_amount(extract.gross_discount),
-                total_premium=clean_amount(extract.total_premium),
-                ncb=clean_ncb(extract.ncb),
-                broker_name=extract.broker_name,
-                broker_email=clean_email(extract.broker_email),
-                broker_code=extract.broker_code,
-            )
+            return self.build_response(response.json())
             
-            return PolicyExtractionResponse(
-                is_success=True,
-                message="Policy extracted successfully",
-                response=obj
+        except Exception as e:
+            return self.failed_response(e)
+
+    async def arun(self, request: PolicyExtractionRequest) -> PolicyExtractionResponse:
+        """Extract policy data using Novoup API without blocking the event loop"""
+        try:
+            client = get_extraction_client()
+            response = await client.post(
+                self.URL,
+                files={"pdf": request.file},
             )
+            response.raise_for_status()
+
+            return self.build_response(response.json())
             
         except Exception as e:
-            logger.error(f"Novoup extraction failed: {str(e)}")
-            return PolicyExtractionResponse(
-                is_success=False,
-                message=f"Policy extraction failed: {str(e)}",
-                response=PolicyExtractionObject()
-            )
+            return self.failed_response(e)
+
+    def build_response(self, body: dict) -> PolicyExtractionResponse:
+        """Map a Novoup extraction result to a PolicyExtractionResponse"""
+        provider_id = body["providerID"]
+        extracted_data = body.get("extractedData", {})
+        extract = NovoupExtractionResponse(**extracted_data)
+        provider_info = PROVIDER_MAP.get(provider_id, {})
+
+        obj = PolicyExtractionObject(
+            insurer=provider_info.get("insurer"),
+            product=provider_info.get("product"),
+            product_type=(
+                ProductType.PRIVATE
+                if provider_info.get("product_sub_type")
+                in [ProductSubType.PC, ProductSubType.TW]
+                else ProductType.COMMERCIAL
+            ),
+            product_sub_type=provider_info.get("product_sub_type"),
+            product_category=extract.product_category,
+            policy_category=extract.calc_policy_category(provider_info),
+            policy_type=extract.calc_policy_type(provider_info),
+            vehicle_registration_state=vehicle_number_to_state(extract.vehicle_number),
+            make=extract.make,
+            model=extract.model,
+            registration_number_1=break_vehicle_number(extract.vehicle_number)[0] if break_vehicle_number(extract.vehicle_number) else None,
+            registration_number_2=break_vehicle_number(extract.vehicle_number)[1] if break_vehicle_number(extract.vehicle_number) else None,
+            registration_number_3=break_vehicle_number(extract.vehicle_number)[2] if break_vehicle_number(extract.vehicle_number) else None,
+            registration_number_4=break_vehicle_number(extract.vehicle_number)[3] if break_vehicle_number(extract.vehicle_number) else None,
+            vehicle_registration_date=extract.registration_date,
+            make_year=extract.manufacturing_year,
+            vehicle_fuel_type=extract.vehicle_fuel_type,
+            vehicle_engine_number=extract.engine_number,
+            vehicle_chassis_number=extract.chassis_number,
+            vehicle_seating_capacity=extract.seating_capacity,
+            vehicle_cc=extract.engine_capacity_cc,
+            insured_type=(
+                InsuredType.INDIVIDUAL
+                if extract.business_type
+                and extract.business_type.lower() == "individual"
+                else None
+            ),
+            insured_name=extract.customer_name,
+            insured_address=extract.customer_address,
+            insured_mobile=clean_phone(extract.customer_phone),
+            insured_email=clean_email(extract.customer_email),
+            vehicle_rta=vehicle_number_to_rta(extract.vehicle_number, extract.rto_code),
+            vehicle_idv=clean_amount(extract.vehicle_idv),
+            last_policy_available=extract.last_policy_available,
+            last_insurer=clean_insurer(extract.previous_insurer_name),
+            last_policy_number=extract.previous_policy_number,
+            last_policy_to=extract.previous_policy_end_date or extract.prev_policy_expiry,
+            last_policy_ncb_percent=clean_ncb(extract.previous_ncb),
+            vehicle_gvw=clean_vehicle_gvw(extract.gross_vehicle_weight),
+            # Policy details
+            policy_number=extract.policy_number,
+            issue_date=extract.issue_date,
+            od_start_date=extract.od_start_date,
+            od_end_date=extract.od_end_date,
+            tp_start_date=extract.tp_start_date,
+            tp_end_date=extract.tp_end_date,
+            sum_insured=clean_amount(extract.sum_insured),
+            basic_od_premium=clean_amount(extract.basic_od_premium),
+            total_od_premium=clean_amount(extract.total_od_premium),
+            total_od_add_on_premium=clean_amount(extract.total_od_add_on_premium),
+            basic_tp_premium=clean_amount(extract.basic_tp_premium),
+            total_tp_premium=clean_amount(extract.total_tp_premium),
+            total_tp_add_on_premium=clean_amount(extract.total_tp_add_on_premium),
+            net_premium=clean_amount(extract.net_premium),
+            taxes=clean_amount(extract.taxes),
+            taxes_rate=clean_ncb(extract.taxes_rate),
+            gross_discount=clean_amount(extract.gross_discount),
+            total_premium=clean_amount(extract.total_premium),
+            ncb=clean_ncb(extract.ncb),
+            broker_name=extract.broker_name,
+            broker_email=clean_email(extract.broker_email),
+            broker_code=extract.broker_code,
+        )
+        
+        return PolicyExtractionResponse(
+            is_success=True,
+            message="Policy extracted successfully",
+            response=obj
+        )
+
+    def failed_response(self, e: Exception) -> PolicyExtractionResponse:
+        logger.error(f"Novoup extraction failed: {str(e)}")
+        return PolicyExtractionResponse(
+            is_success=False,
+            message=f"Policy extraction failed: {str(e)}",
+            response=PolicyExtractionObject()
+        )
 
 # ====================== CORE PROCESSING SERVICES ======================
 
@@ -302,9 +354,9 @@ async def extract_policy_data(file_url: str) -> dict:
             file=("policy.pdf", file_bytes, content_type)
         )
         
-        # Use Novoup provider for extraction
+        # Use Novoup provider for extraction, without blocking the event loop
         provider = Novoup()
-        result = provider.run(payload)
+        result = await provider.arun(payload)
         
         if result.is_success:
             return {
@@ -324,112 +376,33 @@ async def extract_policy_data(file_url: str) -> dict:
             "error": "Policy data extraction failed: Client error '404 Not Found' for given URL"
         }
 
-async def process_company_files_with_acquired_lock(request_data: StartCompanyProcessingRequest, company_lock: asyncio.Lock):
-    """
-    Race-condition-free processing function with already-acquired lock.
-    The lock is already acquired before this function is called.
-    """
+async def process_file(request_data: StartCompanyProcessingRequest, pending_file: PendingFileResponse) -> bool:
+    """Extract and report one claimed file, returns whether its status was updated"""
+    logger.info(f"Processing file: {pending_file.mongo_id}")
+    
+    # Extract policy data from the file
+    result = await extract_policy_data(pending_file.file_url)
+    
+    # Prepare update data for Django API
+    update_data = UpdateFileStatusRequest(
+        mongo_id=pending_file.mongo_id,
+        success=result["success"],
+        extracted_data=result.get("data") if result["success"] else None,
+        error=result.get("error") if not result["success"] else None
+    )
+    
+    # Update file status in Django
     try:
-        logger.info(f"Starting pull-based processing for company {request_data.company_id}")
-        processed_count = 0
-        
-        while True:
-            # Get next pending file from Django API
-            pending_file = await get_next_pending_file(
-                request_data.django_base_url, 
-                request_data.company_id, 
-                request_data.jwt_token
-            )
-            
-            if not pending_file:
-                logger.info(f"No more pending files for company {request_data.company_id}")
-                break
-            
-            logger.info(f"Processing file: {pending_file.mongo_id}")
-            
-            # Extract policy data from the file
-            result = await extract_policy_data(pending_file.file_url)
-            
-            # Prepare update data for Django API
-            update_data = UpdateFileStatusRequest(
-                mongo_id=pending_file.mongo_id,
-                success=result["success"],
-                extracted_data=result.get("data") if result["success"] else None,
-                error=result.get("error") if not result["success"] else None
-            )
-            
-            # Update file status in Django
-            try:
-                await update_file_status(
-                    request_data.django_base_url, 
-                    update_data, 
-                    request_data.jwt_token
-                )
-                processed_count += 1
-                logger.info(f"Successfully processed: {pending_file.mongo_id}")
-            except Exception as e:
-                logger.error(f"Failed to update status for {pending_file.mongo_id}: {str(e)}")
-        
-        logger.info(f"Completed processing for company {request_data.company_id}, processed {processed_count} files")
-        
+        await update_file_status(
+            request_data.django_base_url, 
+            update_data, 
+            request_data.jwt_token
+        )
+        logger.info(f"Successfully processed: {pending_file.mongo_id}")
+        return True
     except Exception as e:
-        logger.error(f"Fatal error in processing company {request_data.company_id}: {str(e)}")
-    finally:
-        # Always release the lock when done (success or failure)
-        if company_lock.locked():
-            company_lock.release()
-            logger.info(f"Released lock for company {request_data.company_id}")
-
-async def process_company_files(request_data: StartCompanyProcessingRequest):
-    """
-    Legacy processing function - pulls files from Django API and processes them.
-    Uses company-specific locks to prevent concurrent processing.
-    (This is kept for backward compatibility)
-    """
-    company_lock = await get_company_lock(request_data.company_id)
-    
-    async with company_lock:
-        logger.info(f"Starting pull-based processing for company {request_data.company_id}")
-        processed_count = 0
-        
-        while True:
-            # Get next pending file from Django API
-            pending_file = await get_next_pending_file(
-                request_data.django_base_url, 
-                request_data.company_id, 
-                request_data.jwt_token
-            )
-            
-            if not pending_file:
-                logger.info(f"No more pending files for company {request_data.company_id}")
-                break
-            
-            logger.info(f"Processing file: {pending_file.mongo_id}")
-            
-            # Extract policy data from the file
-            result = await extract_policy_data(pending_file.file_url)
-            
-            # Prepare update data for Django API
-            update_data = UpdateFileStatusRequest(
-                mongo_id=pending_file.mongo_id,
-                success=result["success"],
-                extracted_data=result.get("data") if result["success"] else None,
-                error=result.get("error") if not result["success"] else None
-            )
-            
-            # Update file status in Django
-            try:
-                await update_file_status(
-                    request_data.django_base_url, 
-                    update_data, 
-                    request_data.jwt_token
-                )
-                processed_count += 1
-                logger.info(f"Successfully processed: {pending_file.mongo_id}")
-            except Exception as e:
-                logger.error(f"Failed to update status for {pending_file.mongo_id}: {str(e)}")
-        
-        logger.info(f"Completed processing for company {request_data.company_id}, processed {processed_count} files")
+        logger.error(f"Failed to update status for {pending_file.mongo_id}: {str(e)}")
+        return False
 
 # ====================== HEALTH CHECK SERVICE ======================
 
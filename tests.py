@@ -0,0 +1,480 @@
+import asyncio
+import unittest
+from collections import Counter
+from unittest import mock
+
+import httpx
+from pymongo.errors import PyMongoError
+
+import main
+
+from locks import CompanyLockRegistry, LocalLeaseStore
+from models import (
+    PendingFileResponse,
+    PolicyExtractionRequest,
+    ProcessingLane,
+    StartCompanyProcessingRequest,
+)
+from scheduler import CompanyJob, ExtractionScheduler
+from services import Novoup
+
+# ====================== HELPERS ======================
+
+def _request(company_id: str, **kwargs) -> StartCompanyProcessingRequest:
+    return StartCompanyProcessingRequest(
+        company_id=company_id, django_base_url="http://django", **kwargs
+    )
+
+def _queue(scheduler: ExtractionScheduler, company_id: str, **kwargs) -> CompanyJob:
+    job = CompanyJob(_request(company_id, **kwargs), mock.Mock(lost=False))
+    scheduler._jobs[company_id] = job
+    scheduler._rings[job.lane].append(company_id)
+    return job
+
+def _other_replica():
+    """Leases claimed inside are claimed as another replica would"""
+    return mock.patch("locks.INSTANCE_ID", "other-host:1")
+
+class _FlakyLeaseStore(LocalLeaseStore):
+    """Local lease store that fails like an unreachable Mongo while `down`"""
+
+    def __init__(self):
+        super().__init__()
+        self.down = False
+        self.release_delay = 0.0
+
+    async def claim(self, company_id, owner, lease_seconds):
+        if self.down:
+            raise PyMongoError("unreachable")
+        return await super().claim(company_id, owner, lease_seconds)
+
+    async def renew(self, company_id, owner, lease_seconds):
+        if self.down:
+            raise PyMongoError("unreachable")
+        return await super().renew(company_id, owner, lease_seconds)
+
+    async def release(self, company_id, owner):
+        await asyncio.sleep(self.release_delay)
+        await super().release(company_id, owner)
+
+# ====================== SCHEDULER ======================
+
+class DeficitRoundRobinTests(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = ExtractionScheduler(max_workers=4)
+
+    def _picks(self, count: int) -> Counter:
+        return Counter(self.scheduler._pick().company_id for _ in range(count))
+
+    def test_companies_share_workers_by_weight(self):
+        _queue(self.scheduler, "a", weight=2)
+        _queue(self.scheduler, "b", weight=1)
+        _queue(self.scheduler, "c", weight=1)
+
+        self.assertEqual(self._picks(40), {"a": 20, "b": 10, "c": 10})
+
+    def test_interactive_lane_goes_first(self):
+        _queue(self.scheduler, "bulk", lane=ProcessingLane.BULK, weight=10)
+        _queue(self.scheduler, "single", lane=ProcessingLane.INTERACTIVE)
+
+        self.assertEqual(self._picks(5), {"single": 5})
+
+    def test_company_is_capped_at_max_workers(self):
+        busy = _queue(self.scheduler, "busy", max_workers=2, weight=10)
+        _queue(self.scheduler, "other")
+        busy.in_flight = 2
+
+        self.assertEqual(self._picks(3), {"other": 3})
+
+    def test_drained_jobs_are_skipped(self):
+        _queue(self.scheduler, "done").drained = True
+
+        self.assertIsNone(self.scheduler._pick())
+
+class SubmitTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.scheduler = ExtractionScheduler(max_workers=1)
+        self.release_files = asyncio.Event()
+
+        async def no_pending_file(*args):
+            await self.release_files.wait()
+            return None
+
+        patcher = mock.patch("scheduler.get_next_pending_file", no_pending_file)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def asyncTearDown(self):
+        self.release_files.set()
+        await self.scheduler.stop()
+
+    async def test_lease_is_claimed_outside_the_condition(self):
+        company_lock = mock.Mock(lost=False)
+
+        async def claim(company_id):
+            self.assertFalse(self.scheduler._changed.locked())
+            return True, company_lock
+
+        with mock.patch("scheduler.try_acquire_company_lock_immediately", claim):
+            result = await self.scheduler.submit(_request("a"))
+
+        self.assertEqual(result["status"], "started")
+        self.assertIs(self.scheduler._jobs["a"].company_lock, company_lock)
+
+    async def test_queued_company_is_not_claimed_again(self):
+        claim = mock.AsyncMock(return_value=(True, mock.Mock(lost=False)))
+        with mock.patch("scheduler.try_acquire_company_lock_immediately", claim):
+            await self.scheduler.submit(_request("a"))
+            result = await self.scheduler.submit(_request("a"))
+
+        self.assertEqual(result["status"], "already_processing")
+        claim.assert_awaited_once()
+
+    async def test_company_held_elsewhere_is_not_queued(self):
+        claim = mock.AsyncMock(return_value=(False, mock.Mock()))
+        with mock.patch("scheduler.try_acquire_company_lock_immediately", claim):
+            result = await self.scheduler.submit(_request("a"))
+
+        self.assertEqual(result["status"], "already_processing")
+        self.assertIsNone(self.scheduler.company_status("a"))
+
+class ResubmitTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.store = _FlakyLeaseStore()
+        # The lease of a finished job is still being released
+        self.store.release_delay = 0.2
+        self.scheduler = ExtractionScheduler(max_workers=1)
+        for name, replacement in (
+            ("locks.get_lease_store", mock.Mock(return_value=self.store)),
+            ("locks.company_locks", CompanyLockRegistry()),
+            ("scheduler.get_next_pending_file", mock.AsyncMock(return_value=None)),
+        ):
+            patcher = mock.patch(name, replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def asyncTearDown(self):
+        await self.scheduler.stop()
+
+    async def _finished(self, company_id: str):
+        while self.scheduler.company_status(company_id):
+            await asyncio.sleep(0.001)
+
+    async def test_company_can_be_resubmitted_right_after_its_job_finished(self):
+        self.assertEqual((await self.scheduler.submit(_request("a")))["status"], "started")
+        await self._finished("a")
+
+        result = await self.scheduler.submit(_request("a"))
+
+        self.assertEqual(result["status"], "started")
+
+    async def test_company_held_by_another_replica_is_refused(self):
+        await self.store.claim("a", "other-host:1:abcd", 60)
+
+        result = await self.scheduler.submit(_request("a"))
+
+        self.assertEqual(result["status"], "already_processing")
+
+class ShutdownTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.scheduler = ExtractionScheduler(max_workers=2)
+        self.pulled = 0
+        self.finished = 0
+        self.file_started = asyncio.Event()
+        self.file_duration = 0.05
+
+        async def next_pending_file(*args):
+            self.pulled += 1
+            return PendingFileResponse(
+                mongo_id=f"f{self.pulled}", file_url="http://file", file_name="policy.pdf"
+            )
+
+        async def process_file(request, pending_file):
+            self.file_started.set()
+            await asyncio.sleep(self.file_duration)
+            self.finished += 1
+            return True
+
+        for name, replacement in (
+            ("get_next_pending_file", next_pending_file),
+            ("process_file", process_file),
+            ("try_acquire_company_lock_immediately",
+             mock.AsyncMock(return_value=(True, mock.Mock(lost=False)))),
+        ):
+            patcher = mock.patch(f"scheduler.{name}", replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_files_in_flight_finish_and_no_new_ones_start(self):
+        await self.scheduler.submit(_request("a", max_workers=1))
+        await self.file_started.wait()
+
+        await self.scheduler.stop(timeout=1)
+
+        self.assertEqual((self.pulled, self.finished), (1, 1))
+        self.assertEqual(self.scheduler.company_status("a")["processed"], 1)
+
+    async def test_workers_are_cancelled_after_the_timeout(self):
+        self.file_duration = 10
+        await self.scheduler.submit(_request("a", max_workers=1))
+        await self.file_started.wait()
+
+        await asyncio.wait_for(self.scheduler.stop(timeout=0.05), timeout=1)
+
+        self.assertEqual(self.finished, 0)
+        self.assertEqual(self.scheduler.stats()["busy_workers"], 0)
+
+    async def test_submit_is_refused_while_stopping(self):
+        self.scheduler.start()
+        await self.scheduler.stop(timeout=1)
+
+        result = await self.scheduler.submit(_request("a"))
+
+        self.assertEqual(result["status"], "unavailable")
+
+class WorkerCapTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.scheduler = ExtractionScheduler(max_workers=4)
+        self.files = Counter()
+        self.running = Counter()
+        self.peak = Counter()
+
+        async def next_pending_file(base_url, company_id, jwt_token):
+            if self.files[company_id] == 0:
+                return None
+            self.files[company_id] -= 1
+            return PendingFileResponse(
+                mongo_id=f"{company_id}{self.files[company_id]}",
+                file_url="http://file",
+                file_name="policy.pdf",
+            )
+
+        async def process_file(request, pending_file):
+            for key in (request.company_id, "all"):
+                self.running[key] += 1
+                self.peak[key] = max(self.peak[key], self.running[key])
+            await asyncio.sleep(0.01)
+            for key in (request.company_id, "all"):
+                self.running[key] -= 1
+            return True
+
+        for name, replacement in (
+            ("get_next_pending_file", next_pending_file),
+            ("process_file", process_file),
+            ("try_acquire_company_lock_immediately",
+             mock.AsyncMock(return_value=(True, mock.Mock(lost=False)))),
+        ):
+            patcher = mock.patch(f"scheduler.{name}", replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def asyncTearDown(self):
+        await self.scheduler.stop()
+
+    async def _process(self, *requests):
+        for request in requests:
+            self.files[request.company_id] = 20
+            await self.scheduler.submit(request)
+        while any(self.scheduler.company_status(r.company_id) for r in requests):
+            await asyncio.sleep(0.005)
+
+    async def test_company_runs_at_most_max_workers_files(self):
+        await self._process(_request("a", max_workers=2))
+
+        self.assertEqual(self.peak["a"], 2)
+        self.assertEqual(self.files["a"], 0)
+
+    async def test_companies_share_the_global_cap(self):
+        await self._process(
+            _request("a", max_workers=3),
+            _request("b", max_workers=3),
+            _request("c", max_workers=3),
+        )
+
+        self.assertEqual(self.peak["all"], 4)
+        self.assertLessEqual(max(self.peak[c] for c in "abc"), 3)
+        self.assertEqual(sum(self.files.values()), 0)
+
+# ====================== EXTRACTION ======================
+
+class NonBlockingExtractionTests(unittest.IsolatedAsyncioTestCase):
+    async def test_health_answers_while_an_extraction_is_in_flight(self):
+        extraction_started = asyncio.Event()
+        release_extraction = asyncio.Event()
+
+        async def slow_extraction(request):
+            extraction_started.set()
+            await release_extraction.wait()
+            return httpx.Response(503)
+
+        extraction_client = httpx.AsyncClient(
+            transport=httpx.MockTransport(slow_extraction)
+        )
+        self.addAsyncCleanup(extraction_client.aclose)
+        with mock.patch("services.get_extraction_client", return_value=extraction_client):
+            payload = PolicyExtractionRequest(
+                file=("policy.pdf", b"%PDF-1", "application/pdf")
+            )
+            extraction = asyncio.create_task(Novoup().arun(payload))
+            await asyncio.wait_for(extraction_started.wait(), timeout=1)
+
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://test"
+            ) as client:
+                health = await asyncio.wait_for(client.get("/health"), timeout=1)
+
+            self.assertEqual(health.status_code, 200)
+            self.assertFalse(extraction.done())
+            release_extraction.set()
+            result = await extraction
+
+        self.assertFalse(result.is_success)
+
+# ====================== COMPANY LOCKS ======================
+
+# Heartbeats every 10ms
+@mock.patch("locks.COMPANY_LOCK_LEASE_SECONDS", 0.03)
+class CompanyLeaseTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.store = _FlakyLeaseStore()
+        patcher = mock.patch("locks.get_lease_store", return_value=self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Registries of this replica and of another one sharing the store
+        self.local = CompanyLockRegistry()
+        self.remote = CompanyLockRegistry()
+
+    async def _beats(self, count: int = 3):
+        await asyncio.sleep(0.01 * count + 0.005)
+
+    async def test_heartbeat_keeps_the_lease(self):
+        company_lock = self.local.get("a")
+        self.assertTrue(await company_lock.try_acquire())
+        await self._beats(5)
+
+        self.assertFalse(company_lock.lost)
+        self.assertEqual(await self.store.holder("a"), company_lock.owner)
+        with _other_replica():
+            self.assertFalse(await self.remote.get("a").try_acquire())
+        self.assertEqual(self.remote.contended_remote, 1)
+        company_lock.release()
+
+    async def test_lease_taken_over_is_lost(self):
+        company_lock = self.local.get("a")
+        await company_lock.try_acquire()
+        self.store._leases["a"]["owner"] = "other-replica"
+        await self._beats()
+
+        self.assertTrue(company_lock.lost)
+        company_lock.release()
+
+    async def test_release_frees_the_company(self):
+        company_lock = self.local.get("a")
+        await company_lock.try_acquire()
+        company_lock.release()
+        # The lease is given back in the background
+        await asyncio.sleep(0.001)
+
+        self.assertIsNone(await self.store.holder("a"))
+        with _other_replica():
+            self.assertTrue(await self.remote.get("a").try_acquire())
+        self.remote.get("a").release()
+
+    async def test_unreachable_store_fails_open_unowned(self):
+        self.store.down = True
+        company_lock = self.local.get("a")
+
+        self.assertTrue(await company_lock.try_acquire())
+        self.assertTrue(company_lock.unowned)
+        await self._beats()
+
+        # Still trying to claim the lease, not given up
+        self.assertTrue(company_lock.unowned)
+        self.assertFalse(company_lock.lost)
+        self.assertEqual(self.local.stats()["unowned"], 1)
+        company_lock.release()
+
+    async def test_lease_is_claimed_once_the_store_recovers(self):
+        self.store.down = True
+        company_lock = self.local.get("a")
+        await company_lock.try_acquire()
+        self.store.down = False
+        await self._beats()
+
+        self.assertFalse(company_lock.unowned)
+        self.assertFalse(company_lock.lost)
+        self.assertEqual(await self.store.holder("a"), company_lock.owner)
+        company_lock.release()
+
+    async def test_unowned_lock_claimed_elsewhere_is_lost(self):
+        self.store.down = True
+        company_lock = self.local.get("a")
+        await company_lock.try_acquire()
+        self.store.down = False
+        await self.store.claim("a", "other-replica", 60)
+        await self._beats()
+
+        self.assertTrue(company_lock.lost)
+        company_lock.release()
+
+    async def test_blocking_acquire_fails_open(self):
+        self.store.down = True
+        company_lock = self.local.get("a")
+
+        await asyncio.wait_for(company_lock.acquire(), timeout=1)
+
+        self.assertTrue(company_lock.unowned)
+        company_lock.release()
+
+class CompanyLockRegistryTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        patcher = mock.patch("locks.get_lease_store", return_value=LocalLeaseStore())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_least_recently_used_locks_go_over_the_cap(self):
+        registry = CompanyLockRegistry(max_entries=2)
+        registry.get("a")
+        registry.get("b")
+        registry.get("a")
+        registry.get("c")
+
+        self.assertIsNone(registry.peek("b"))
+        self.assertIsNotNone(registry.peek("a"))
+        self.assertIsNotNone(registry.peek("c"))
+        self.assertEqual(registry.stats()["evicted"], 1)
+
+    async def test_idle_locks_are_swept(self):
+        registry = CompanyLockRegistry(idle_seconds=0)
+        registry.get("a")
+        registry._swept_at -= registry.SWEEP_INTERVAL_SECONDS
+        registry.get("b")
+
+        self.assertIsNone(registry.peek("a"))
+        # The lock just asked for is never the one dropped
+        self.assertIsNotNone(registry.peek("b"))
+
+    async def test_held_and_waited_locks_are_kept(self):
+        registry = CompanyLockRegistry(max_entries=1, idle_seconds=0)
+        held = registry.get("held")
+        await held.try_acquire()
+        waited = registry.get("waited")
+        # As while a coroutine is blocked in acquire()
+        waited._waiters = 1
+
+        registry.get("other")
+
+        self.assertIs(registry.peek("held"), held)
+        self.assertIs(registry.peek("waited"), waited)
+        self.assertEqual(registry.stats()["evicted"], 0)
+        held.release()
+
+    async def test_peek_does_not_create_locks(self):
+        registry = CompanyLockRegistry()
+
+        self.assertIsNone(registry.peek("a"))
+        self.assertEqual(registry.stats()["size"], 0)
+
+if __name__ == "__main__":
+    unittest.main()